@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 
 from pathlib import Path
 import os
+import tempfile
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -57,6 +58,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'mainapp.admission.AdmissionControlMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -93,6 +95,11 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Wait for the write lock during booking bursts instead of failing
+        'OPTIONS': {'timeout': 20},
+        # File-backed so concurrent booking tests can share the database; kept
+        # out of the source tree
+        'TEST': {'NAME': os.path.join(tempfile.gettempdir(), 'unishowtime-test.sqlite3')},
     }
 }
 
@@ -150,6 +157,111 @@ import os
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Ticket QR codes: 'stateless' renders them on request from a signed ticket
+# token (nothing written to MEDIA_ROOT/qrcodes), 'file' stores a PNG per ticket
+# rendered by the qr_worker command.
+TICKET_QR_MODE = os.environ.get('TICKET_QR_MODE', 'stateless')
+TICKET_QR_CACHE_SIZE = 2048
+
+# Promote waitlisted students on a background thread after seats come back;
+# False runs the promotion inline once the freeing transaction commits.
+WAITLIST_PROMOTE_IN_BACKGROUND = True
+
+# How long (seconds) a booking form's idempotency key replays its first result
+BOOKING_IDEMPOTENCY_TTL = 30 * 60
+
+# Rows per page in the dashboard listings (filter_events, filter_users,
+# admin_logs); clients may ask for fewer with ?limit= but never more.
+LISTING_PAGE_SIZE = 50
+
+# Suggestions returned by the admin user type-ahead (api/users/autocomplete/),
+# picked from at most USER_AUTOCOMPLETE_CANDIDATES matches
+USER_AUTOCOMPLETE_LIMIT = 10
+USER_AUTOCOMPLETE_CANDIDATES = 200
+
+# Rendered event cards (mainapp.fragments) and their hit/miss counters. The
+# local-memory default is per process; set REDIS_URL to share one cache (and
+# one set of counters) between all Gunicorn workers.
+if os.environ.get('REDIS_URL'):
+    CACHES = {'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['REDIS_URL'],
+    }}
+else:
+    CACHES = {'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }}
+EVENT_CARD_CACHE_TIMEOUT = 24 * 60 * 60
+# Ticket counts on event cards are exact up to EVENT_CARD_EXACT_TICKETS and
+# rounded down to a multiple of EVENT_CARD_TICKET_STEP above it ("40+"), so
+# most bookings leave the cached card valid.
+EVENT_CARD_EXACT_TICKETS = 10
+EVENT_CARD_TICKET_STEP = 10
+
+# Rows fetched from the database (and sent to the client) per step of the
+# streaming attendee export
+EXPORT_CHUNK_SIZE = 2000
+
+# The superadmin dashboard's per-department analytics (mainapp.analytics) come
+# from a snapshot stored in the database (shared by all workers) at most
+# DEPARTMENT_ANALYTICS_MAX_AGE seconds old; schedule
+# `manage.py refresh_department_analytics` more often than that so pages never
+# recompute it. False computes them on every page load.
+DEPARTMENT_ANALYTICS_SNAPSHOT = True
+DEPARTMENT_ANALYTICS_MAX_AGE = 15 * 60
+
+# Resized WebP/JPEG variants of event and profile images (mainapp.images).
+# Eager rendering runs on IMAGE_VARIANT_WORKERS background threads after an
+# upload; missing variants are also rendered on first request.
+IMAGE_VARIANTS_EAGER = True
+IMAGE_VARIANT_WORKERS = 2
+IMAGE_VARIANT_QUALITY = 80
+
+# Uploaded images (mainapp.uploads). Uploads stream to temporary files rather
+# than memory; images over IMAGE_UPLOAD_MAX_BYTES or IMAGE_UPLOAD_MAX_PIXELS
+# (read from the header, before decoding) are refused, and ones wider or
+# taller than IMAGE_UPLOAD_MAX_EDGE are shrunk to it before they are stored.
+FILE_UPLOAD_HANDLERS = ['django.core.files.uploadhandler.TemporaryFileUploadHandler']
+IMAGE_UPLOAD_MAX_BYTES = 15 * 1024 * 1024
+IMAGE_UPLOAD_MAX_PIXELS = 40_000_000
+IMAGE_UPLOAD_MAX_EDGE = 2560
+IMAGE_UPLOAD_QUALITY = 85
+
+# "Recommended for you" on the student dashboard (mainapp.recommendations).
+# Scores are recomputed in batch by `manage.py refresh_recommendations` (run
+# from cron); each student keeps their best RECOMMENDATIONS_PER_STUDENT, of
+# which the dashboard shows RECOMMENDATIONS_SHOWN. Tickets for events more
+# than RECOMMENDATION_HISTORY_DAYS old are not taken into account.
+RECOMMENDATIONS_PER_STUDENT = 20
+RECOMMENDATIONS_SHOWN = 6
+RECOMMENDATION_HISTORY_DAYS = 2 * 365
+
+# Booking analytics (mainapp.sales): an event's sell-through curve and
+# heatmap are cached until its next booking or edit, for at most
+# SALES_CACHE_TIMEOUT seconds. The all-events overview on the superadmin
+# dashboard is only computed by `manage.py refresh_sales_overview`; schedule
+# it as often as the dashboard should update (e.g. every 15 minutes).
+SALES_CACHE_TIMEOUT = 60 * 60
+
+# Sell-out forecasts on the admin dashboard (mainapp.forecasts), stored by
+# `manage.py forecast_sell_outs` (run from cron). A run recomputes events that
+# sold tickets since their forecast, and the others once their forecast is
+# FORECAST_MAX_AGE seconds old; the dashboard lists FORECASTS_SHOWN events.
+FORECAST_MAX_AGE = 60 * 60
+FORECASTS_SHOWN = 10
+
+# Waiting room for booking endpoints (mainapp.admission). Each event admits
+# ADMISSION_RATE requests per second after an initial burst; the queue state
+# is a SQLite file shared by all Gunicorn workers on the host.
+ADMISSION_CONTROL = True
+ADMISSION_RATE = 20
+ADMISSION_BURST = 100
+ADMISSION_TOKEN_TTL = 10 * 60
+ADMISSION_STATE_PATH = os.environ.get(
+    'ADMISSION_STATE_PATH', os.path.join(tempfile.gettempdir(), 'unishowtime-admission.sqlite3')
+)
+
 
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = 'smtp.gmail.com'
@@ -2,7 +2,9 @@ from django.contrib import admin
 
 
 from django.contrib.auth.admin import UserAdmin
-from .models import CustomUser, Department, Event, Ticket
+from django.db import models
+from .models import CustomUser, Department, Event, Ticket, QRRenderJob, WaitlistEntry
+from .uploads import BoundedImageField
 
 @admin.register(CustomUser)
 class CustomUserAdmin(UserAdmin):
@@ -10,12 +12,14 @@ class CustomUserAdmin(UserAdmin):
     list_display = ('username', 'email', 'role', 'enrollment_no', 'department', 'is_active', 'last_login')
     list_filter = ('role', 'department', 'is_active', 'is_staff')
     search_fields = ('username', 'email', 'enrollment_no')
+    list_select_related = ['department']
     fieldsets = UserAdmin.fieldsets + (
         ('Additional Info', {'fields': ('role', 'department', 'enrollment_no', 'profile_image')}),
     )
     add_fieldsets = UserAdmin.add_fieldsets + (
         ('Additional Info', {'fields': ('role', 'department', 'enrollment_no', 'profile_image')}),
     )
+    formfield_overrides = {models.ImageField: {'form_class': BoundedImageField}}
 
 @admin.register(Department)
 class DepartmentAdmin(admin.ModelAdmin):
@@ -29,15 +33,36 @@ class EventAdmin(admin.ModelAdmin):
     list_filter = ('department', 'date', 'category')
     search_fields = ('title', 'description', 'location')
     autocomplete_fields = ['department', 'created_by']
+    list_select_related = ['department']
     ordering = ['-date']
+    formfield_overrides = {models.ImageField: {'form_class': BoundedImageField}}
+    # Maintained by the booking engine, the waitlist and the image pipeline
+    readonly_fields = ('seats_remaining', 'waitlist_tail', 'waitlist_served', 'image_digest')
     
     def tickets_left(self, obj):
         return obj.tickets_left()
     tickets_left.short_description = 'Tickets Left'
+    tickets_left.admin_order_field = 'seats_remaining'
 
 @admin.register(Ticket)
 class TicketAdmin(admin.ModelAdmin):
-    list_display = ('user', 'event', 'booked_at')
-    list_filter = ('event__department', 'booked_at')
+    list_display = ('user', 'event', 'booked_at', 'qr_status')
+    list_filter = ('event__department', 'booked_at', 'qr_status')
     search_fields = ('user__username', 'user__enrollment_no', 'event__title')
     autocomplete_fields = ['user', 'event']
+    list_select_related = ['user', 'event']
+
+@admin.register(QRRenderJob)
+class QRRenderJobAdmin(admin.ModelAdmin):
+    list_display = ('ticket', 'status', 'attempts', 'created_at', 'updated_at')
+    list_filter = ('status',)
+    raw_id_fields = ['ticket']
+    list_select_related = ['ticket__user', 'ticket__event']
+
+@admin.register(WaitlistEntry)
+class WaitlistEntryAdmin(admin.ModelAdmin):
+    list_display = ('user', 'event', 'position', 'status', 'joined_at', 'promoted_at')
+    list_filter = ('status',)
+    search_fields = ('user__username', 'user__enrollment_no', 'event__title')
+    raw_id_fields = ['user', 'event', 'ticket']
+    list_select_related = ['user', 'event']
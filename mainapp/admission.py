@@ -0,0 +1,201 @@
+"""
+Admission control ("virtual waiting room") for booking endpoints.
+
+During a hot on-sale every booking request would otherwise tie up one of the
+few sync Gunicorn workers until the database gets to it. Instead, the first
+request for an event is given a signed queue token (a cookie) carrying the
+time at which it may proceed. Slots are handed out per event at
+``ADMISSION_RATE`` per second after an initial ``ADMISSION_BURST``.
+
+The schedule lives in a small local SQLite file (``ADMISSION_STATE_PATH``) that
+all workers on the host share, so no Redis is needed. Issuing a token is one
+short write to that file. A request whose token is not due yet is answered
+from the token alone: no file access and no Django database queries. Once
+admitted, a token stays valid for ``ADMISSION_TOKEN_TTL`` seconds so retries
+don't join the back of the line.
+
+Only authenticated POSTs for an existing event are queued; anything else
+goes straight to the view, which redirects or 404s it. Otherwise anonymous
+or cookieless requests would use up slots ahead of real bookings.
+"""
+import math
+import sqlite3
+import threading
+import time
+
+from django.conf import settings
+from django.core import signing
+from django.http import HttpResponse
+from django.template.loader import render_to_string
+
+from .models import Event
+
+SALT = 'mainapp.admission'
+# URL names that go through the waiting room
+CONTROLLED_VIEWS = {'book_ticket'}
+
+_local = threading.local()
+
+
+class QueueToken:
+    def __init__(self, event_id, slot, rate):
+        self.event_id = event_id
+        self.slot = slot
+        self.rate = rate
+
+    def wait(self, now):
+        return max(0.0, self.slot - now)
+
+    def place_in_line(self, now):
+        return math.ceil(self.wait(now) * self.rate)
+
+    def sign(self):
+        return signing.dumps([self.event_id, round(self.slot, 3), self.rate], salt=SALT)
+
+    @classmethod
+    def unsign(cls, value, event_id):
+        """Return the token in ``value`` if it is genuine and for ``event_id``, else None."""
+        if not value:
+            return None
+        try:
+            token_event, slot, rate = signing.loads(value, salt=SALT)
+        except (signing.BadSignature, TypeError, ValueError):
+            return None
+        if token_event != event_id:
+            return None
+        return cls(token_event, slot, rate)
+
+
+def _connection():
+    path = str(settings.ADMISSION_STATE_PATH)
+    connections = getattr(_local, 'connections', None)
+    if connections is None:
+        connections = _local.connections = {}
+    conn = connections.get(path)
+    if conn is None:
+        conn = sqlite3.connect(path, timeout=5, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS admission_queue ('
+            ' event_id INTEGER PRIMARY KEY,'
+            ' tat REAL NOT NULL DEFAULT 0,'
+            ' rate REAL)'
+        )
+        connections[path] = conn
+    return conn
+
+
+def reserve(event_id, now=None):
+    """
+    Reserve the next admission slot of ``event_id`` and return its QueueToken.
+
+    This is the generic cell rate algorithm: ``tat`` is the theoretical
+    arrival time of the next request, and a request may go ahead once it is
+    no more than ``burst / rate`` seconds early.
+    """
+    now = time.time() if now is None else now
+    burst = getattr(settings, 'ADMISSION_BURST', 100)
+    conn = _connection()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        row = conn.execute(
+            'SELECT tat, rate FROM admission_queue WHERE event_id = ?', (event_id,)
+        ).fetchone()
+        tat, rate = row if row else (0.0, None)
+        rate = rate or getattr(settings, 'ADMISSION_RATE', 20)
+        tat = max(tat, now)
+        slot = max(now, tat - burst / rate)
+        conn.execute(
+            'INSERT INTO admission_queue (event_id, tat) VALUES (?, ?) '
+            'ON CONFLICT(event_id) DO UPDATE SET tat = excluded.tat',
+            (event_id, tat + 1 / rate),
+        )
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+    return QueueToken(event_id, slot, rate)
+
+
+def set_rate(event_id, rate=None):
+    """Admit ``rate`` requests per second for ``event_id``; None restores ADMISSION_RATE."""
+    _connection().execute(
+        'INSERT INTO admission_queue (event_id, rate) VALUES (?, ?) '
+        'ON CONFLICT(event_id) DO UPDATE SET rate = excluded.rate',
+        (event_id, rate),
+    )
+
+
+def reset(event_id):
+    """Forget the queue of ``event_id`` (already issued tokens stay valid)."""
+    _connection().execute('UPDATE admission_queue SET tat = 0 WHERE event_id = ?', (event_id,))
+
+
+def token_ttl():
+    return getattr(settings, 'ADMISSION_TOKEN_TTL', 600)
+
+
+def cookie_name(event_id):
+    return f'admission_{event_id}'
+
+
+def waiting_response(request, token, now):
+    wait = math.ceil(token.wait(now))
+    context = {
+        'position': max(1, token.place_in_line(now)),
+        'wait': wait,
+        'method': request.method,
+        'action': request.get_full_path(),
+        # Re-posted unchanged (CSRF token included) once the slot comes up
+        'fields': [(key, value) for key, values in request.POST.lists() for value in values]
+        if request.method == 'POST' else [],
+    }
+    response = HttpResponse(render_to_string('mainapp/waiting_room.html', context), status=503)
+    response['Retry-After'] = str(wait)
+    response['Cache-Control'] = 'no-store'
+    return response
+
+
+class AdmissionControlMiddleware:
+    """Queue requests to CONTROLLED_VIEWS per event; see the module docstring."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        issued = getattr(request, '_admission_token', None)
+        if issued is not None:
+            self.set_cookie(response, issued)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not getattr(settings, 'ADMISSION_CONTROL', True):
+            return None
+        match = request.resolver_match
+        if match is None or match.url_name not in CONTROLLED_VIEWS:
+            return None
+        if request.method != 'POST':
+            return None
+        event_id = view_kwargs.get('event_id')
+        now = time.time()
+
+        token = QueueToken.unsign(request.COOKIES.get(cookie_name(event_id)), event_id)
+        if token is None or now > token.slot + token_ttl():
+            if not request.user.is_authenticated or not Event.objects.filter(pk=event_id).exists():
+                return None
+            token = reserve(event_id, now)
+            request._admission_token = token
+        if token.slot <= now:
+            return None
+        return waiting_response(request, token, now)
+
+    def set_cookie(self, response, token):
+        response.set_cookie(
+            cookie_name(token.event_id),
+            token.sign(),
+            max_age=math.ceil(token.wait(time.time())) + token_ttl(),
+            httponly=True,
+            samesite='Lax',
+            secure=settings.SESSION_COOKIE_SECURE,
+        )
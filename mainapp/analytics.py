@@ -0,0 +1,96 @@
+"""
+Per-department analytics.
+
+``department_rollup()`` computes, for every department at once, its user
+count, event and active-event counts, bookings, attendance rate and top
+event categories. It takes two grouped queries whatever the number of
+departments: one over departments (users counted by annotation), one over
+events grouped by department and category with conditional aggregates for
+the active events, bookings and check-ins. Per-department totals are summed
+from the category groups in Python.
+
+The attendance rate is checked-in tickets over tickets booked for events
+that have already started; it is None until a department has held an event
+with bookings.
+
+The superadmin dashboard reads ``snapshot()``: when
+``DEPARTMENT_ANALYTICS_SNAPSHOT`` is on, the rollup stored in the shared
+``Snapshot`` table (mainapp.snapshots) by the ``refresh_department_analytics``
+command, run on a schedule. A snapshot missing or older than
+``DEPARTMENT_ANALYTICS_MAX_AGE`` seconds is recomputed inline and stored.
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from . import snapshots
+from .models import Department, Event
+
+SNAPSHOT_NAME = 'analytics:departments'
+
+# Categories listed per department, by bookings then events
+TOP_CATEGORIES = 3
+
+
+def _categories_by_department(now, department_ids=None):
+    groups = Event.objects.order_by().values('department_id', 'category').annotate(
+        events=Count('id', distinct=True),
+        active_events=Count('id', filter=Q(date__gte=now), distinct=True),
+        bookings=Count('ticket'),
+        held_bookings=Count('ticket', filter=Q(date__lt=now)),
+        attended=Count('ticket', filter=Q(date__lt=now, ticket__checked_in_at__isnull=False)),
+    )
+    if department_ids is not None:
+        groups = groups.filter(department_id__in=department_ids)
+    by_department = defaultdict(list)
+    for group in groups:
+        by_department[group.pop('department_id')].append(group)
+    return by_department
+
+
+def department_rollup(department_ids=None):
+    """
+    ``[{'id', 'name', 'code', 'users', 'events', 'active_events', 'bookings',
+    'attendance_rate', 'top_categories'}]`` for every department (or those in
+    ``department_ids``), ordered by name.
+    """
+    now = timezone.now()
+    departments = Department.objects.order_by('name').annotate(users=Count('customuser'))
+    if department_ids is not None:
+        departments = departments.filter(id__in=department_ids)
+    categories = _categories_by_department(now, department_ids)
+
+    rollup = []
+    for department in departments.values('id', 'name', 'code', 'users'):
+        groups = categories.get(department['id'], [])
+        totals = {
+            name: sum(group[name] for group in groups)
+            for name in ('events', 'active_events', 'bookings', 'held_bookings', 'attended')
+        }
+        top = sorted(groups, key=lambda group: (-group['bookings'], -group['events'], group['category']))
+        rollup.append({
+            **department,
+            'events': totals['events'],
+            'active_events': totals['active_events'],
+            'bookings': totals['bookings'],
+            'attendance_rate': totals['attended'] / totals['held_bookings'] if totals['held_bookings'] else None,
+            'top_categories': [
+                {'category': group['category'], 'events': group['events'], 'bookings': group['bookings']}
+                for group in top[:TOP_CATEGORIES]
+            ],
+        })
+    return rollup
+
+
+def refresh():
+    """Recompute the rollup and store it as the dashboard snapshot."""
+    return snapshots.store(SNAPSHOT_NAME, {'departments': department_rollup()})
+
+
+def snapshot():
+    """``{'computed_at', 'departments'}``, from the stored snapshot if ``DEPARTMENT_ANALYTICS_SNAPSHOT`` is on."""
+    if not settings.DEPARTMENT_ANALYTICS_SNAPSHOT:
+        return {'computed_at': timezone.now(), 'departments': department_rollup()}
+    return snapshots.load(SNAPSHOT_NAME, settings.DEPARTMENT_ANALYTICS_MAX_AGE) or refresh()
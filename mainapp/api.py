@@ -0,0 +1,287 @@
+"""
+JSON endpoints used by gate devices, dashboard scripts and other non-browser clients.
+
+The ``api/v1/`` listings return plain rows rather than rendered HTML: each
+row is a ``.values()`` projection of the fields asked for with ``?fields=``
+(a comma-separated subset of the resource's ``*_FIELDS``; default
+``*_DEFAULT_FIELDS``), and pages are keyset-paginated like the dashboard
+listings (``?cursor=``, ``?limit=``).
+"""
+import json
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import JsonResponse
+from django.urls import reverse
+from django.views.decorators.http import require_GET, require_POST
+
+from . import analytics, checkin, fragments, search, uploads
+from .models import CustomUser, Event, Ticket
+from .pagination import InvalidCursor, page_size, paginate
+
+STAFF_ROLES = ('admin', 'superadmin')
+
+# Selectable fields of each v1 listing and the column each is read from
+EVENT_FIELDS = {
+    'id': 'id',
+    'title': 'title',
+    'description': 'description',
+    'date': 'date',
+    'location': 'location',
+    'category': 'category',
+    'ticket_price': 'ticket_price',
+    'tickets_left': 'seats_remaining',
+    'department_id': 'department_id',
+    'department': 'department__name',
+    'image_url': 'image',
+}
+EVENT_DEFAULT_FIELDS = ('id', 'title', 'date', 'location', 'category', 'ticket_price', 'tickets_left')
+USER_FIELDS = {
+    'id': 'id',
+    'username': 'username',
+    'email': 'email',
+    'first_name': 'first_name',
+    'last_name': 'last_name',
+    'enrollment_no': 'enrollment_no',
+    'role': 'role',
+    'department_id': 'department_id',
+    'department': 'department__name',
+}
+USER_DEFAULT_FIELDS = ('id', 'username', 'email', 'enrollment_no', 'role')
+TICKET_FIELDS = {
+    'id': 'id',
+    'event_id': 'event_id',
+    'event': 'event__title',
+    'event_date': 'event__date',
+    'user_id': 'user_id',
+    'username': 'user__username',
+    'booked_at': 'booked_at',
+    'checked_in_at': 'checked_in_at',
+}
+TICKET_DEFAULT_FIELDS = ('id', 'event_id', 'user_id', 'booked_at', 'checked_in_at')
+
+# Same orderings (and indexes) as the dashboard listings in views.py
+EVENT_ORDERING = ('-date', '-id')
+USER_ORDERING = ('id',)
+SEARCH_ORDERING = ('-rank', 'id')
+TICKET_ORDERING = ('-id',)
+
+# Columns holding a storage name, served as a URL
+MEDIA_COLUMNS = {'image'}
+
+CHECKIN_STATUS_CODES = {
+    checkin.ADMITTED: 200,
+    checkin.ALREADY_USED: 409,
+    checkin.WRONG_EVENT: 409,
+    checkin.INVALID: 400,
+    checkin.UNKNOWN: 404,
+}
+
+
+def _staff_required(request):
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'authentication required'}, status=401)
+    if request.user.role not in STAFF_ROLES:
+        return JsonResponse({'error': 'forbidden'}, status=403)
+    return None
+
+
+def _login_required(request):
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'authentication required'}, status=401)
+    return None
+
+
+def _id_param(request, name):
+    """The integer query parameter ``name``, or None; ValueError if malformed."""
+    value = request.GET.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f'{name} must be an integer')
+
+
+def _selected_fields(request, available, default):
+    requested = request.GET.get('fields')
+    if not requested:
+        return list(default)
+    names = list(dict.fromkeys(name.strip() for name in requested.split(',') if name.strip()))
+    unknown = [name for name in names if name not in available]
+    if unknown or not names:
+        raise ValueError(f"unknown fields: {', '.join(unknown)}; choose from {', '.join(available)}")
+    return names
+
+
+def _listing(request, queryset, ordering, available, default):
+    """One page of ``queryset`` as ``{'results': [...], 'next_cursor': ...}``."""
+    try:
+        names = _selected_fields(request, available, default)
+    except ValueError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    # The ordering keys are fetched for the cursor even when not asked for
+    columns = {available[name] for name in names} | {key.lstrip('-') for key in ordering}
+    try:
+        page = paginate(queryset.values(*columns), ordering, request.GET.get('cursor'), page_size(request))
+    except InvalidCursor:
+        return JsonResponse({'error': 'invalid cursor'}, status=400)
+
+    def value(row, column):
+        if column in MEDIA_COLUMNS:
+            return default_storage.url(row[column]) if row[column] else None
+        return row[column]
+
+    results = [{name: value(row, available[name]) for name in names} for row in page]
+    return JsonResponse({'results': results, 'next_cursor': page.next_cursor})
+
+
+def _request_data(request):
+    """The JSON object or form fields posted; None if the body is JSON but not an object."""
+    if request.content_type == 'application/json':
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError:
+            return {}
+        return data if isinstance(data, dict) else None
+    return request.POST
+
+
+@require_POST
+def checkin_scan(request):
+    denied = _staff_required(request)
+    if denied:
+        return denied
+
+    data = _request_data(request)
+    if data is None:
+        return JsonResponse({'error': 'expected a JSON object'}, status=400)
+    code = str(data.get('code') or '')
+    gate_event_id = data.get('event_id')
+    try:
+        gate_event_id = int(gate_event_id) if gate_event_id not in (None, '') else None
+    except (TypeError, ValueError):
+        return JsonResponse({'error': 'event_id must be an integer'}, status=400)
+
+    result = checkin.check_in(code, gate_event_id=gate_event_id, staff=request.user)
+    return JsonResponse(result.as_dict(), status=CHECKIN_STATUS_CODES[result.status])
+
+
+@require_GET
+def user_autocomplete(request):
+    denied = _staff_required(request)
+    if denied:
+        return denied
+
+    query = request.GET.get('q', '').strip()
+    if not query:
+        return JsonResponse({'results': []})
+    users = search.search_users(
+        CustomUser.objects.all(), query, candidates=settings.USER_AUTOCOMPLETE_CANDIDATES
+    ).order_by('-rank', 'username')
+    fields = ('id', 'username', 'email', 'enrollment_no', 'first_name', 'last_name', 'role')
+    results = [
+        {
+            'id': user['id'],
+            'username': user['username'],
+            'name': f"{user['first_name']} {user['last_name']}".strip(),
+            'email': user['email'],
+            'enrollment_no': user['enrollment_no'],
+            'role': user['role'],
+            'url': reverse('user_details', args=[user['id']]),
+        }
+        for user in users.values(*fields)[:settings.USER_AUTOCOMPLETE_LIMIT]
+    ]
+    return JsonResponse({'results': results})
+
+
+@require_GET
+def fragment_cache_stats(request):
+    denied = _staff_required(request)
+    if denied:
+        return denied
+    return JsonResponse(fragments.counters())
+
+
+@require_GET
+def upload_stats(request):
+    denied = _staff_required(request)
+    if denied:
+        return denied
+    return JsonResponse(uploads.counters())
+
+
+@require_GET
+def department_analytics(request):
+    denied = _staff_required(request)
+    if denied:
+        return denied
+    return JsonResponse({'departments': analytics.department_rollup()})
+
+
+@require_GET
+def event_list(request):
+    denied = _login_required(request)
+    if denied:
+        return denied
+
+    try:
+        department_id = _id_param(request, 'department')
+    except ValueError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+
+    events = Event.objects.all()
+    ordering = EVENT_ORDERING
+    if request.GET.get('category'):
+        events = events.filter(category=request.GET['category'])
+    if department_id is not None:
+        events = events.filter(department_id=department_id)
+    query = request.GET.get('search', '').strip()
+    if query:
+        events = search.search_events(events, query)
+        ordering = SEARCH_ORDERING
+    return _listing(request, events, ordering, EVENT_FIELDS, EVENT_DEFAULT_FIELDS)
+
+
+@require_GET
+def user_list(request):
+    denied = _staff_required(request)
+    if denied:
+        return denied
+
+    try:
+        department_id = _id_param(request, 'department')
+    except ValueError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+
+    users = CustomUser.objects.all()
+    ordering = USER_ORDERING
+    if request.GET.get('role'):
+        users = users.filter(role=request.GET['role'])
+    if department_id is not None:
+        users = users.filter(department_id=department_id)
+    query = request.GET.get('search', '').strip()
+    if query:
+        users = search.search_users(users, query)
+        ordering = SEARCH_ORDERING
+    return _listing(request, users, ordering, USER_FIELDS, USER_DEFAULT_FIELDS)
+
+
+@require_GET
+def ticket_list(request):
+    denied = _login_required(request)
+    if denied:
+        return denied
+
+    try:
+        event_id = _id_param(request, 'event')
+    except ValueError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+
+    tickets = Ticket.objects.all()
+    # Students only ever see their own tickets
+    if request.user.role not in STAFF_ROLES:
+        tickets = tickets.filter(user=request.user)
+    if event_id is not None:
+        tickets = tickets.filter(event_id=event_id)
+    return _listing(request, tickets, TICKET_ORDERING, TICKET_FIELDS, TICKET_DEFAULT_FIELDS)
@@ -0,0 +1,259 @@
+"""
+Ticket booking engine.
+
+Seats are tracked in ``Event.seats_remaining`` and claimed with a conditional
+``UPDATE ... WHERE seats_remaining > 0`` inside the same transaction as the
+``Ticket`` insert. Either both happen or neither does, so concurrent bookings
+cannot oversell an event and no booking ever has to count the ticket table.
+The same ``UPDATE`` refuses the seat while anyone is on the event's waitlist
+(``waitlist_tail > waitlist_served``): freed seats go to the waitlist in
+order, not to whoever books first.
+"""
+import csv
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, models, transaction
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import stats
+from .models import CustomUser, Event, IdempotencyKey, QRRenderJob, Ticket
+
+BOOKED = 'booked'
+SOLD_OUT = 'sold_out'
+DUPLICATE = 'duplicate'
+
+
+class BookingResult:
+    def __init__(self, status, ticket=None):
+        self.status = status
+        self.ticket = ticket
+        self.replayed = False
+
+    def __repr__(self):
+        return f"<BookingResult {self.status}>"
+
+    @property
+    def ok(self):
+        return self.status == BOOKED
+
+
+def book(event, user, idempotency_key=None):
+    """
+    Book one seat of ``event`` for ``user`` and return a BookingResult.
+
+    With an ``idempotency_key`` the outcome is recorded alongside the booking,
+    and a retry with the same key within ``BOOKING_IDEMPOTENCY_TTL`` returns
+    it (with ``replayed`` set) without attempting the booking again.
+    """
+    if idempotency_key:
+        previous = _replay(user, idempotency_key, event)
+        if previous is not None:
+            return previous
+
+    existing = Ticket.objects.filter(event=event, user=user).first()
+    try:
+        with transaction.atomic():
+            if existing is not None:
+                result = BookingResult(DUPLICATE, existing)
+            else:
+                result = _claim_seat(event, user)
+            if idempotency_key:
+                # Committed together with the booking, so a retry racing this
+                # request fails on (user, key) and replays our result below
+                IdempotencyKey.objects.create(
+                    user=user, key=idempotency_key, event=event,
+                    status=result.status, ticket=result.ticket,
+                )
+    except IntegrityError:
+        if idempotency_key:
+            previous = _replay(user, idempotency_key, event)
+            if previous is not None:
+                return previous
+        # Lost the unique_together race against a parallel request from the
+        # same user; the rollback above already handed the seat back.
+        return BookingResult(DUPLICATE, Ticket.objects.filter(event=event, user=user).first())
+    return result
+
+
+def _claim_seat(event, user):
+    # Writes first: on SQLite a read at the start of the transaction would
+    # make the later write fail with "database is locked" under contention.
+    claimed = Event.objects.filter(
+        pk=event.pk, seats_remaining__gt=0, waitlist_tail__lte=models.F('waitlist_served'),
+    ).update(
+        seats_remaining=models.F('seats_remaining') - 1
+    )
+    if not claimed:
+        return BookingResult(SOLD_OUT)
+    ticket = Ticket(event=event, user=user)
+    # Tells the post_save signal the seat is already taken
+    ticket._seat_claimed = True
+    ticket.save()
+    return BookingResult(BOOKED, ticket)
+
+
+def _replay(user, key, event):
+    """
+    The recorded result for ``key``, or None if it is unknown, has expired,
+    was recorded for another event, or its ticket has since been cancelled.
+    """
+    record = IdempotencyKey.objects.filter(user=user, key=key).select_related('ticket').first()
+    if record is None:
+        return None
+    expired = record.created_at < timezone.now() - timedelta(seconds=idempotency_ttl())
+    # A cancelled ticket leaves ticket NULL (SET_NULL); only SOLD_OUT has none to begin with
+    cancelled = record.status != SOLD_OUT and record.ticket_id is None
+    if expired or cancelled or record.event_id != event.pk:
+        record.delete()
+        return None
+    result = BookingResult(record.status, record.ticket)
+    result.replayed = True
+    return result
+
+
+def idempotency_ttl():
+    return getattr(settings, 'BOOKING_IDEMPOTENCY_TTL', 30 * 60)
+
+
+def purge_idempotency_keys():
+    """Delete idempotency keys older than the TTL; returns how many went."""
+    cutoff = timezone.now() - timedelta(seconds=idempotency_ttl())
+    return IdempotencyKey.objects.filter(created_at__lt=cutoff).delete()[0]
+
+
+def release_seat(event_id):
+    """Give a seat back to ``event_id``, e.g. after a ticket is deleted."""
+    Event.objects.filter(pk=event_id).update(seats_remaining=models.F('seats_remaining') + 1)
+
+
+def take_seat(event_id):
+    """
+    Take a seat of ``event_id`` for a ticket created outside the engine
+    (admin, shell). Unconditional: the ticket exists, so the counter follows
+    it even below zero, as ``recount_seats`` would.
+    """
+    Event.objects.filter(pk=event_id).update(seats_remaining=models.F('seats_remaining') - 1)
+
+
+def recount_seats(events=None):
+    """Rebuild ``seats_remaining`` from the ticket table for ``events`` (default: all)."""
+    if events is None:
+        events = Event.objects.all()
+    booked = Ticket.objects.filter(event=models.OuterRef('pk')).values('event').annotate(
+        n=models.Count('pk')
+    ).values('n')
+    return events.update(
+        seats_remaining=models.F('available_tickets') - Coalesce(models.Subquery(booked), 0)
+    )
+
+
+def create_tickets(event, user_ids):
+    """
+    ``bulk_create`` tickets (and their QR jobs in file mode) for seats the
+    caller has already claimed, inside the caller's transaction.
+    """
+    stateless = getattr(settings, 'TICKET_QR_MODE', 'file') == 'stateless'
+    tickets = Ticket.objects.bulk_create([
+        Ticket(event=event, user_id=pk, qr_status='ready' if stateless else 'pending')
+        for pk in user_ids
+    ])
+    if not stateless:
+        QRRenderJob.objects.bulk_create([QRRenderJob(ticket=ticket) for ticket in tickets])
+    # bulk_create sends no post_save, so count them here
+    stats.tickets_added(event, len(tickets))
+    return tickets
+
+
+def read_enrollment_numbers(fileobj):
+    """Enrollment numbers from a CSV with an ``enrollment_no`` column, or one per line."""
+    rows = list(csv.reader(fileobj))
+    if rows and 'enrollment_no' in [cell.strip().lower() for cell in rows[0]]:
+        column = [cell.strip().lower() for cell in rows[0]].index('enrollment_no')
+        rows = [row[column:column + 1] for row in rows[1:]]
+    return [row[0].strip() for row in rows if row and row[0].strip()]
+
+
+def select_recipients(department=None, role=None, enrollment_nos=None):
+    users = CustomUser.objects.filter(is_active=True)
+    if department is not None:
+        users = users.filter(department=department)
+    if role:
+        users = users.filter(role=role)
+    if enrollment_nos is not None:
+        users = users.filter(enrollment_no__in=enrollment_nos)
+    return users
+
+
+class BulkIssueResult:
+    def __init__(self):
+        self.tickets = []
+        self.promoted = 0
+        self.skipped_existing = 0
+        self.skipped_sold_out = 0
+        self.elapsed = 0.0
+
+    @property
+    def issued(self):
+        return len(self.tickets)
+
+    @property
+    def per_second(self):
+        return self.issued / self.elapsed if self.elapsed else 0.0
+
+
+def issue_bulk(event, users, batch_size=500):
+    """
+    Issue one ticket of ``event`` to every user in the ``users`` queryset who
+    doesn't hold one yet, in capacity-checked batches. Each batch claims its
+    seats with one conditional UPDATE and inserts its tickets with one
+    ``bulk_create`` in the same transaction. Users past the remaining capacity
+    are skipped. QR codes are left to ``qr.render_jobs`` / the qr_worker.
+
+    Free seats are owed to the waitlist first: it is promoted before anything
+    is issued, and no seat is claimed while anyone is still waiting.
+    """
+    # Imported here: mainapp.waitlist imports this module
+    from .waitlist import promote
+
+    started = time.perf_counter()
+    result = BulkIssueResult()
+    result.promoted = promote(event.pk)
+    user_ids = list(users.values_list('pk', flat=True).order_by('pk').distinct())
+    holders = set(Ticket.objects.filter(event=event, user_id__in=user_ids).values_list('user_id', flat=True))
+    result.skipped_existing = len(holders)
+    queue = [pk for pk in user_ids if pk not in holders]
+
+    while queue:
+        batch = queue[:batch_size]
+        seats, tail, served = Event.objects.values_list(
+            'seats_remaining', 'waitlist_tail', 'waitlist_served',
+        ).get(pk=event.pk)
+        wanted = min(len(batch), seats)
+        if wanted <= 0 or tail > served:
+            break
+        with transaction.atomic():
+            claimed = Event.objects.filter(
+                pk=event.pk, seats_remaining__gte=wanted, waitlist_tail__lte=models.F('waitlist_served'),
+            ).update(
+                seats_remaining=models.F('seats_remaining') - wanted
+            )
+            if not claimed:
+                # Individual bookings took seats since we looked; re-read and retry
+                continue
+            chosen = batch[:wanted]
+            # Holding the event row lock, so no booking can slip in between this
+            # check and the insert
+            raced = set(Ticket.objects.filter(event=event, user_id__in=chosen).values_list('user_id', flat=True))
+            tickets = create_tickets(event, [pk for pk in chosen if pk not in raced])
+            if raced:
+                Event.objects.filter(pk=event.pk).update(seats_remaining=models.F('seats_remaining') + len(raced))
+                result.skipped_existing += len(raced)
+        result.tickets.extend(tickets)
+        queue = queue[wanted:]
+
+    result.skipped_sold_out = len(queue)
+    result.elapsed = time.perf_counter() - started
+    return result
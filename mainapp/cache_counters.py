@@ -0,0 +1,19 @@
+"""
+Counters kept in the default cache (hit ratios, upload statistics).
+
+They are shared by all workers when the cache is (``REDIS_URL``), per
+process otherwise, and never expire on their own.
+"""
+from django.core.cache import cache
+
+
+def incr(key, n=1):
+    """Add ``n`` to the counter ``key``, creating it at 0 first."""
+    if not n:
+        return
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key, n)
+    except ValueError:
+        # Evicted between add() and incr()
+        cache.add(key, n, timeout=None)
@@ -0,0 +1,207 @@
+"""
+Gate check-in.
+
+A scan is verified in two steps: the ticket code's HMAC is checked in memory
+(see ``ticket_codes``), then the ticket is marked used with a single
+conditional ``UPDATE ... WHERE checked_in_at IS NULL`` on its primary key. The
+database decides the winner when several gates scan the same ticket at once,
+so a ticket is admitted exactly once.
+
+Each process also keeps a per-event set of tickets it has seen checked in,
+warmed from the ``Ticket`` rows on the first scan for that event, so repeated
+scans of used tickets are answered without a database round trip. Only the
+``SEEN_EVENTS`` most recently scanned events are kept, and an event nobody
+has scanned for ``SEEN_IDLE_SECONDS`` is dropped. A dropped event is warmed
+again from the database on its next scan, so eviction never admits a ticket
+twice.
+"""
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import models
+from django.utils import timezone
+
+from . import ticket_codes
+from .gate_snapshot import write_snapshot
+from .models import Ticket
+
+ADMITTED = 'admitted'
+ALREADY_USED = 'already_used'
+INVALID = 'invalid'
+WRONG_EVENT = 'wrong_event'
+UNKNOWN = 'unknown'
+
+# Events whose used tickets each process keeps in memory
+SEEN_EVENTS = 16
+SEEN_IDLE_SECONDS = 6 * 60 * 60
+
+
+class CheckInResult:
+    def __init__(self, status, ticket_id=None, event_id=None, checked_in_at=None, attendee=None):
+        self.status = status
+        self.ticket_id = ticket_id
+        self.event_id = event_id
+        self.checked_in_at = checked_in_at
+        self.attendee = attendee
+
+    def __repr__(self):
+        return f"<CheckInResult {self.status} ticket={self.ticket_id}>"
+
+    @property
+    def ok(self):
+        return self.status == ADMITTED
+
+    def as_dict(self):
+        return {
+            'status': self.status,
+            'ticket_id': self.ticket_id,
+            'event_id': self.event_id,
+            'checked_in_at': self.checked_in_at.isoformat() if self.checked_in_at else None,
+            'attendee': self.attendee,
+        }
+
+
+class SeenTickets:
+    """
+    Per-process ``{event_id: {ticket_id: checked_in_at}}`` of used tickets,
+    least recently scanned event first.
+    """
+
+    def __init__(self):
+        self._events = OrderedDict()
+        self._scanned = {}
+        self._lock = threading.Lock()
+
+    def _for_event(self, event_id):
+        now = time.monotonic()
+        with self._lock:
+            seen = self._events.get(event_id)
+            if seen is not None:
+                self._events.move_to_end(event_id)
+                self._scanned[event_id] = now
+                return seen
+        rows = Ticket.objects.filter(event_id=event_id, checked_in_at__isnull=False)
+        warmed = dict(rows.values_list('pk', 'checked_in_at'))
+        with self._lock:
+            seen = self._events.setdefault(event_id, warmed)
+            self._events.move_to_end(event_id)
+            self._scanned[event_id] = now
+            self._prune(now)
+        return seen
+
+    def _prune(self, now):
+        while self._events:
+            oldest = next(iter(self._events))
+            if len(self._events) <= SEEN_EVENTS and self._scanned[oldest] >= now - SEEN_IDLE_SECONDS:
+                break
+            del self._events[oldest]
+            del self._scanned[oldest]
+
+    def __len__(self):
+        return len(self._events)
+
+    def get(self, event_id, ticket_id):
+        return self._for_event(event_id).get(ticket_id)
+
+    def add(self, event_id, ticket_id, checked_in_at):
+        seen = self._for_event(event_id)
+        with self._lock:
+            seen[ticket_id] = checked_in_at
+
+    def clear(self):
+        with self._lock:
+            self._events.clear()
+            self._scanned.clear()
+
+
+seen_tickets = SeenTickets()
+
+
+def check_in(code, gate_event_id=None, staff=None):
+    """Validate a scanned ``code`` and admit its ticket at most once."""
+    try:
+        scanned = ticket_codes.decode(code)
+    except ticket_codes.InvalidTicketCode:
+        return CheckInResult(INVALID)
+
+    ticket_id, event_id = scanned.ticket_id, scanned.event_id
+    if gate_event_id is not None and event_id != gate_event_id:
+        return CheckInResult(WRONG_EVENT, ticket_id, event_id)
+
+    used_at = seen_tickets.get(event_id, ticket_id)
+    if used_at is not None:
+        return CheckInResult(ALREADY_USED, ticket_id, event_id, used_at)
+
+    now = timezone.now()
+    admitted = Ticket.objects.filter(pk=ticket_id, event_id=event_id, checked_in_at__isnull=True).update(
+        checked_in_at=now, checked_in_by=staff, updated_at=now
+    )
+    row = Ticket.objects.filter(pk=ticket_id, event_id=event_id).values(
+        'checked_in_at', 'user__username', 'user__enrollment_no'
+    ).first()
+    if row is None:
+        return CheckInResult(UNKNOWN, ticket_id, event_id)
+
+    attendee = {'username': row['user__username'], 'enrollment_no': row['user__enrollment_no']}
+    seen_tickets.add(event_id, ticket_id, row['checked_in_at'])
+    if admitted:
+        return CheckInResult(ADMITTED, ticket_id, event_id, row['checked_in_at'], attendee)
+    return CheckInResult(ALREADY_USED, ticket_id, event_id, row['checked_in_at'], attendee)
+
+
+def export_gate_snapshot(event, fileobj):
+    """Write the offline gate snapshot of ``event``'s unused tickets to ``fileobj``."""
+    ticket_ids = Ticket.objects.filter(event=event, checked_in_at__isnull=True).values_list('pk', flat=True)
+    codes = (ticket_codes.encode(pk, event.pk) for pk in ticket_ids.iterator(chunk_size=5000))
+    return write_snapshot(fileobj, event.pk, codes)
+
+
+def reconcile_offline_scans(rows, staff=None, batch_size=1000):
+    """
+    Apply admitted scans from offline gate logs. ``rows`` are dicts with
+    ``code`` and ``scanned_at`` (ISO 8601). The earliest scan of each ticket
+    wins; tickets that were already checked in are left alone.
+    """
+    counts = {'applied': 0, 'already_checked_in': 0, 'duplicate_scans': 0, 'invalid': 0}
+    earliest = {}
+    for row in rows:
+        if row.get('status', ADMITTED) != ADMITTED:
+            continue
+        try:
+            scanned = ticket_codes.decode(row['code'])
+            scanned_at = datetime.fromisoformat(row['scanned_at'])
+        except (ticket_codes.InvalidTicketCode, KeyError, ValueError):
+            counts['invalid'] += 1
+            continue
+        if timezone.is_naive(scanned_at):
+            scanned_at = timezone.make_aware(scanned_at, dt_timezone.utc)
+        key = (scanned.ticket_id, scanned.event_id)
+        if key in earliest:
+            counts['duplicate_scans'] += 1
+            scanned_at = min(scanned_at, earliest[key])
+        earliest[key] = scanned_at
+
+    keys = list(earliest)
+    for start in range(0, len(keys), batch_size):
+        batch = keys[start:start + batch_size]
+        valid = set(
+            Ticket.objects.filter(pk__in=[ticket_id for ticket_id, _ in batch]).values_list('pk', 'event_id')
+        )
+        counts['invalid'] += sum(1 for key in batch if key not in valid)
+        if not valid:
+            continue
+        # One conditional UPDATE per batch: tickets admitted online meanwhile keep their time
+        applied = Ticket.objects.filter(pk__in=[pk for pk, _ in valid], checked_in_at__isnull=True).update(
+            checked_in_at=models.Case(
+                *[models.When(pk=pk, then=models.Value(earliest[(pk, event_id)])) for pk, event_id in valid],
+                output_field=models.DateTimeField(),
+            ),
+            checked_in_by=staff,
+            updated_at=timezone.now(),
+        )
+        counts['applied'] += applied
+        counts['already_checked_in'] += len(valid) - applied
+    seen_tickets.clear()
+    return counts
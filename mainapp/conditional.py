@@ -0,0 +1,101 @@
+"""
+ETags for conditional GETs of the event pages and listings.
+
+Polling clients used to get a full render of ``event_details``,
+``filter_events`` and ``student_dashboard`` even when nothing had changed.
+Each of those views now computes an ETag from one small query -- the
+``updated_at`` change timestamps of ``Event``, ``Ticket`` and ``Department``
+plus the materialized event and ticket totals (``mainapp.stats``) -- and
+Django's ``condition`` decorator answers ``304 Not Modified`` before the view
+runs its own queries or renders anything.
+
+The totals are part of the tag because a deletion leaves no timestamp
+behind; for the same reason no ``Last-Modified`` is sent, as a date alone
+would keep answering 304 after a cancellation. Seat counters move with
+relative UPDATEs that do not touch ``updated_at``, so the detail tag includes
+them directly.
+
+The tags are per user, as the pages show who is logged in and what they
+booked. The detail tag also covers the CSRF secret, so a cached booking form
+never carries a stale token.
+"""
+import hashlib
+
+from django.db.models import Count, OuterRef, Subquery
+from django.middleware.csrf import get_token
+from django.utils import timezone
+
+from . import stats
+from .models import Department, Event, Recommendation, StatCounter, Ticket, WaitlistEntry
+
+
+def _latest(model, **filters):
+    return Subquery(model.objects.filter(**filters).order_by('-updated_at').values('updated_at')[:1])
+
+
+def _count(model, **filters):
+    rows = model.objects.filter(**filters).order_by()
+    return Subquery(rows.values(*filters).annotate(n=Count('pk')).values('n'))
+
+
+def _tag(request, *parts):
+    user = request.user
+    viewer = (user.pk, user.get_username(), str(getattr(user, 'profile_image', '')))
+    return hashlib.md5(repr((viewer,) + parts).encode()).hexdigest()
+
+
+def _totals(**changes):
+    """The total event/ticket counts annotated with ``changes``, in one query."""
+    totals = StatCounter.objects.filter(scope='total', key='').values('events', 'tickets')
+    row = totals.annotate(**changes).first()
+    if row is None:
+        stats.rebuild()
+        row = totals.annotate(**changes).first()
+    return row
+
+
+def event_listing_etag(request, *args, **kwargs):
+    """Any event, department or ticket change (the cards show seat counts)."""
+    row = _totals(
+        events_changed=_latest(Event), departments_changed=_latest(Department), tickets_changed=_latest(Ticket),
+    )
+    return _tag(request, 'events', tuple(row.values()))
+
+
+def _latest_id(model, **filters):
+    return Subquery(model.objects.filter(**filters).order_by('-id').values('id')[:1])
+
+
+def student_dashboard_etag(request, *args, **kwargs):
+    """Event and department changes, the student's own tickets and recommendations, and the date."""
+    if not request.user.is_authenticated:
+        return None
+    row = _totals(
+        events_changed=_latest(Event), departments_changed=_latest(Department),
+        own_tickets=_count(Ticket, user=request.user), own_tickets_changed=_latest(Ticket, user=request.user),
+        # A refresh replaces the student's rows, so new ids mean new picks
+        own_recommendations=_latest_id(Recommendation, user=request.user),
+    )
+    del row['tickets']
+    return _tag(request, 'student', timezone.localdate().isoformat(), tuple(row.values()))
+
+
+def event_details_etag(request, event_id, *args, **kwargs):
+    columns = ['updated_at', 'seats_remaining', 'waitlist_tail', 'waitlist_served', 'department__updated_at']
+    event = Event.objects.filter(pk=event_id)
+    if request.user.is_authenticated:
+        event = event.annotate(
+            own_ticket=Subquery(Ticket.objects.filter(event=OuterRef('pk'), user=request.user).values('pk')[:1]),
+            own_waitlist_position=Subquery(WaitlistEntry.objects.filter(
+                event=OuterRef('pk'), user=request.user, status='waiting',
+            ).values('position')[:1]),
+        )
+        columns += ['own_ticket', 'own_waitlist_position']
+    row = event.values_list(*columns).first()
+    if row is None:
+        # Let the view answer the 404
+        return None
+    # The page's forms carry a token for this CSRF secret; get_token() makes
+    # sure the secret exists (and its cookie is sent) before it is hashed
+    get_token(request)
+    return _tag(request, 'event', event_id, request.META['CSRF_COOKIE'], row)
@@ -0,0 +1,246 @@
+"""
+Sell-out forecasts for upcoming events.
+
+Reference curves
+    For every held event, the share of its tickets that had been booked by
+    each point of ``GRID_HOURS`` (hours before it started) is its booking
+    curve. ``BookingCurve`` keeps those curves summed per category and
+    department, with the summed fill rate (tickets / capacity). The sums are
+    folded forward: each run adds only the events held since the last one,
+    so the history is never re-read. The last run's time and how many events
+    had been held by then are kept in the ``forecasts:fold`` snapshot; when
+    an event held before then was edited, rescheduled or deleted since, the
+    sums can no longer be corrected in place and are rebuilt.
+
+Forecasts
+    An upcoming event is compared with the average curve of its category and
+    department -- or of its category, or of all events, when fewer than
+    ``MIN_HISTORY`` such events were held. With ``f`` the share usually sold
+    by now and ``prior`` the usual fill rate times its capacity, expected
+    attendance is ``sold + (1 - f) * prior``, capped at capacity: the sales
+    still to come at the usual level, on top of the actual ones. The
+    remaining sales are spread along the reference curve, and the point
+    where they reach capacity is the predicted sell-out time.
+
+    Every event is computed at once as NumPy arrays (events x grid points).
+    Forecasts are stored in ``SellOutForecast``; a run recomputes only the
+    events whose ticket count changed since their forecast, or whose forecast
+    is older than ``FORECAST_MAX_AGE``.
+
+``refresh()`` is run on a schedule by the ``forecast_sell_outs`` command;
+the admin dashboard only reads the stored rows.
+"""
+from datetime import datetime, timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import snapshots
+from .models import BookingCurve, Event, SellOutForecast, Ticket
+
+# Hours before the event starts
+GRID_HOURS = np.array([0, 1, 3, 6, 12, 24, 48, 72, 120, 168, 336, 504, 720, 1440], dtype=np.float64)
+
+# Held events a reference curve needs before it is used
+MIN_HISTORY = 3
+
+FOLD_SNAPSHOT = 'forecasts:fold'
+
+
+def event_curves(event_ids, starts, ticket_events, ticket_times):
+    """
+    Per event, the share of its tickets booked by each point of ``GRID_HOURS``
+    (events x grid points; zeros for events without tickets), and the ticket
+    counts. ``ticket_events`` are positions in ``event_ids``.
+    """
+    hours_before = (starts[ticket_events] - ticket_times) / 3600
+    # Grid points each ticket was booked by: those it was booked at least that many hours before
+    reached = np.searchsorted(GRID_HOURS, hours_before, side='right')
+    counts = np.zeros((len(event_ids), len(GRID_HOURS) + 1), dtype=np.int64)
+    np.add.at(counts, (ticket_events, reached), 1)
+    # Booked by grid point j: tickets whose ``reached`` is above j
+    booked_by = counts[:, ::-1].cumsum(axis=1)[:, ::-1][:, 1:]
+    totals = counts.sum(axis=1)
+    shares = np.divide(booked_by, totals[:, None], out=np.zeros(booked_by.shape), where=totals[:, None] > 0)
+    return shares, totals
+
+
+def fold_curves(now=None, rebuild=False):
+    """Add the events held since the last run to ``BookingCurve``; returns how many were added."""
+    now = now or timezone.now()
+    held_count = Event.objects.filter(date__lt=now).count()
+    through = None if rebuild else folded_through()
+    held = Event.objects.filter(date__lt=now)
+    if through is not None:
+        held = held.filter(date__gte=through)
+    else:
+        rebuild = True
+    events = list(held.order_by('id').values_list('id', 'category', 'department_id', 'available_tickets', 'date'))
+    tickets = Ticket.objects.filter(event__in=held).values_list('event_id', 'booked_at')
+    tickets = tickets.iterator(chunk_size=settings.EXPORT_CHUNK_SIZE)
+    tickets = np.fromiter(
+        ((event_id, moment.timestamp()) for event_id, moment in tickets),
+        dtype=[('event', np.int64), ('at', np.float64)],
+    )
+
+    event_ids = np.array([event[0] for event in events], dtype=np.int64)
+    starts = np.array([event[4].timestamp() for event in events], dtype=np.float64)
+    positions = np.searchsorted(event_ids, tickets['event']).clip(max=max(len(event_ids) - 1, 0))
+    # Tickets of events rescheduled between the two queries are left out
+    known = event_ids[positions] == tickets['event'] if len(event_ids) else np.zeros(len(tickets), bool)
+    shares, totals = event_curves(event_ids, starts, positions[known], tickets['at'][known])
+
+    sums = {}
+    for (_, category, department_id, capacity, _), share, total in zip(events, shares, totals.tolist()):
+        if not total:
+            # Never sold anything: says nothing about how bookings arrive
+            continue
+        count, share_sum, fill = sums.get((category, department_id), (0, 0, 0))
+        if capacity:
+            fill += min(total / capacity, 1)
+        sums[category, department_id] = (count + 1, share_sum + share, fill)
+
+    with transaction.atomic():
+        if rebuild:
+            BookingCurve.objects.all().delete()
+        curves = {(curve.category, curve.department_id): curve for curve in BookingCurve.objects.select_for_update()}
+        for (category, department_id), (count, share_sum, fill) in sums.items():
+            curve = curves.get((category, department_id)) or BookingCurve(
+                category=category, department_id=department_id, shares=[0.0] * len(GRID_HOURS), through=now,
+            )
+            curve.events += count
+            curve.shares = (np.array(curve.shares) + share_sum).tolist()
+            curve.fill += fill
+            curve.through = now
+            curve.save()
+        BookingCurve.objects.update(through=now)
+        snapshots.store(FOLD_SNAPSHOT, {'through': now.isoformat(), 'held': held_count})
+    return len(events)
+
+
+def folded_through():
+    """
+    When the last fold ran, or None if the sums have to be rebuilt: never
+    folded, or an event held before then has changed since.
+    """
+    watermark = snapshots.load(FOLD_SNAPSHOT)
+    if watermark is None:
+        return None
+    through = datetime.fromisoformat(watermark['through'])
+    folded = Event.objects.filter(date__lt=through)
+    # Edited in place (category, capacity, date), or moved in or out of the folded range
+    if folded.filter(updated_at__gte=through).exists() or folded.count() != watermark['held']:
+        return None
+    return through
+
+
+def reference_curves():
+    """``(shares, fill)`` lookups keyed by (category, department), category, and None for all events."""
+    totals = {}
+    for curve in BookingCurve.objects.all():
+        for key in ((curve.category, curve.department_id), curve.category, None):
+            count, shares, fill = totals.get(key, (0, 0, 0))
+            totals[key] = (count + curve.events, shares + np.array(curve.shares), fill + curve.fill)
+    return {
+        key: (shares / count, fill / count)
+        for key, (count, shares, fill) in totals.items() if count >= MIN_HISTORY
+    }
+
+
+def forecast(hours_left, sold, capacity, shares, fill):
+    """
+    Vectorized over events: expected attendance and hours-before-start of the
+    sell-out (NaN if none), given each event's reference ``shares`` (events x
+    grid points) and ``fill`` rate.
+    """
+    rows = np.arange(len(sold))
+    # Share usually sold by now, interpolated between grid points
+    right = np.searchsorted(GRID_HOURS, hours_left).clip(1, len(GRID_HOURS) - 1)
+    left = right - 1
+    weight = ((hours_left - GRID_HOURS[left]) / (GRID_HOURS[right] - GRID_HOURS[left])).clip(0, 1)
+    share_now = shares[rows, left] * (1 - weight) + shares[rows, right] * weight
+
+    expected = np.minimum(sold + (1 - share_now) * fill * capacity, np.maximum(capacity, sold))
+    # Remaining sales spread along the curve, at the grid points still ahead
+    still_to_sell = np.divide(
+        shares - share_now[:, None], (1 - share_now)[:, None],
+        out=np.zeros(shares.shape), where=(1 - share_now)[:, None] > 0,
+    ).clip(0, 1)
+    projected = sold[:, None] + still_to_sell * (expected - sold)[:, None]
+    ahead = GRID_HOURS[None, :] < hours_left[:, None]
+    sells_out = ahead & (projected >= capacity[:, None] - 0.5) & (sold < capacity)[:, None]
+
+    # The earliest grid point at capacity is the one furthest from the start
+    hours_out = np.full(len(sold), np.nan)
+    found = sells_out.any(axis=1)
+    point = len(GRID_HOURS) - 1 - np.argmax(sells_out[:, ::-1], axis=1)
+    # Interpolate from the point before it (or from now)
+    previous = (point + 1).clip(max=len(GRID_HOURS) - 1)
+    previous_is_now = ~ahead[rows, previous] | (point == len(GRID_HOURS) - 1)
+    from_hours = np.where(previous_is_now, hours_left, GRID_HOURS[previous])
+    from_sold = np.where(previous_is_now, sold, projected[rows, previous])
+    to_sold = projected[rows, point]
+    step = np.divide(capacity - from_sold, to_sold - from_sold, out=np.ones(len(sold)), where=to_sold > from_sold)
+    hours_out[found] = (from_hours + (GRID_HOURS[point] - from_hours) * step.clip(0, 1))[found]
+    return expected, hours_out
+
+
+def refresh(now=None):
+    """Fold in newly held events and recompute stale forecasts; returns how many were recomputed."""
+    now = now or timezone.now()
+    fold_curves(now)
+    curves = reference_curves()
+
+    stale = Event.objects.filter(date__gte=now).filter(
+        Q(forecast__isnull=True)
+        | ~Q(forecast__sold=F('available_tickets') - F('seats_remaining'))
+        | Q(forecast__computed_at__lt=now - timedelta(seconds=settings.FORECAST_MAX_AGE))
+    )
+    events = list(stale.values_list('id', 'category', 'department_id', 'available_tickets', 'seats_remaining', 'date'))
+    if not events:
+        return 0
+
+    references = [
+        curves.get((category, department_id)) or curves.get(category) or curves.get(None)
+        for _, category, department_id, _, _, _ in events
+    ]
+    known = np.array([reference is not None for reference in references])
+    capacity = np.array([event[3] for event in events], dtype=np.float64)
+    sold = capacity - np.array([event[4] for event in events], dtype=np.float64)
+    hours_left = np.array([(event[5] - now).total_seconds() / 3600 for event in events])
+    shares = np.array([reference[0] if reference else np.zeros(len(GRID_HOURS)) for reference in references])
+    fill = np.array([reference[1] if reference else 0 for reference in references])
+
+    expected, hours_out = forecast(hours_left, sold, capacity, shares.reshape(-1, len(GRID_HOURS)), fill)
+    # Without any history, the only estimate is what has sold so far
+    expected = np.where(known, expected, sold)
+
+    rows = [
+        SellOutForecast(
+            event_id=event[0],
+            sold=int(event_sold),
+            expected_attendance=int(round(event_expected)),
+            sell_out_at=None if np.isnan(hours) else event[5] - timedelta(hours=hours),
+            computed_at=now,
+        )
+        for event, event_sold, event_expected, hours in zip(
+            events, sold.tolist(), expected.tolist(), hours_out.tolist(),
+        )
+    ]
+    SellOutForecast.objects.bulk_create(
+        rows, batch_size=1000, update_conflicts=True, unique_fields=['event'],
+        update_fields=['sold', 'expected_attendance', 'sell_out_at', 'computed_at'],
+    )
+    return len(rows)
+
+
+def upcoming(limit):
+    """Forecasts of events still ahead, soonest sell-out first, then by expected fill."""
+    return list(
+        SellOutForecast.objects.filter(event__date__gte=timezone.now()).select_related('event').order_by(
+            F('sell_out_at').asc(nulls_last=True), '-expected_attendance',
+        )[:limit]
+    )
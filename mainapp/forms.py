@@ -2,11 +2,12 @@ from django import forms
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
 from django.utils import timezone
 from .models import CustomUser, Event, ROLE_CHOICES
+from .uploads import BoundedImageField
 import datetime
 
 class CustomUserRegisterForm(UserCreationForm):
     email = forms.EmailField(required=True)
-    profile_image = forms.ImageField(required=False, label='Profile Picture')
+    profile_image = BoundedImageField(required=False, label='Profile Picture')
     enrollment_no = forms.CharField(required=False)
     department = forms.ModelChoiceField(queryset=None, required=False)
 
@@ -46,6 +47,7 @@ class CustomLoginForm(AuthenticationForm):
 class EventForm(forms.ModelForm):
     # Add a time field that doesn't exist in the model
     time = forms.TimeField(widget=forms.TimeInput(attrs={'type': 'time'}))
+    image = BoundedImageField(required=False)
     ticket_price = forms.DecimalField(
         max_digits=10,
         decimal_places=2,
@@ -0,0 +1,89 @@
+"""
+Fragment cache for rendered event cards.
+
+The dashboards render the same event cards for every visitor on every hit.
+Each card is now cached under a key made of:
+
+* the event id and ``updated_at``, which every save of the event (and a
+  rename of its department) bumps, so edits never serve a stale card;
+* the viewer's role: staff cards link to "Manage", student cards to
+  "Book Now";
+* the ticket count as shown on the card. It is exact only near sell-out
+  (``EVENT_CARD_EXACT_TICKETS``) and rounded down to ``EVENT_CARD_TICKET_STEP``
+  above it ("40+"), so a booking only changes the key -- and so replaces the
+  card -- when the count crosses one of those display thresholds.
+
+A listing fetches all of its cards with one ``get_many`` and renders only the
+misses. Hits and misses are counted in the cache; ``counters()`` (served at
+``api/cache/fragments/``) reports them with the hit ratio.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from . import cache_counters
+
+STAFF_ROLES = ('admin', 'superadmin')
+
+HITS_KEY = 'fragments:hits'
+MISSES_KEY = 'fragments:misses'
+
+
+def role(user):
+    """The card variant ``user`` sees."""
+    return 'staff' if getattr(user, 'role', None) in STAFF_ROLES else 'student'
+
+
+def tickets_shown(seats):
+    """The ticket count as printed on a card: ``'7'``, or ``'40+'`` above the exact range."""
+    seats = max(seats, 0)
+    if seats <= settings.EVENT_CARD_EXACT_TICKETS:
+        return str(seats)
+    step = settings.EVENT_CARD_TICKET_STEP
+    return f'{seats - seats % step}+'
+
+
+def card_key(event, template, variant):
+    version = event.updated_at.strftime('%Y%m%d%H%M%S%f')
+    return f'event-card:{template}:{event.pk}:{version}:{variant}:{tickets_shown(event.seats_remaining)}'
+
+
+def render_cards(events, template, user):
+    """
+    The cards of ``events`` rendered with ``template``, as one safe string.
+
+    The template gets ``event``, ``staff`` (whether to link to "Manage") and
+    ``tickets_shown``; it must not depend on anything else in the request.
+    """
+    variant = role(user)
+    events = list(events)
+    keys = [card_key(event, template, variant) for event in events]
+    cached = cache.get_many(keys)
+    fresh = {}
+    cards = []
+    for event, key in zip(events, keys):
+        card = cached.get(key)
+        if card is None:
+            card = fresh[key] = render_to_string(template, {
+                'event': event,
+                'staff': variant == 'staff',
+                'tickets_shown': tickets_shown(event.seats_remaining),
+            })
+        cards.append(card)
+    if fresh:
+        cache.set_many(fresh, timeout=settings.EVENT_CARD_CACHE_TIMEOUT)
+    cache_counters.incr(HITS_KEY, len(events) - len(fresh))
+    cache_counters.incr(MISSES_KEY, len(fresh))
+    return mark_safe(''.join(cards))
+
+
+def counters():
+    values = cache.get_many([HITS_KEY, MISSES_KEY])
+    hits, misses = values.get(HITS_KEY, 0), values.get(MISSES_KEY, 0)
+    lookups = hits + misses
+    return {'hits': hits, 'misses': misses, 'hit_ratio': hits / lookups if lookups else None}
+
+
+def reset_counters():
+    cache.delete_many([HITS_KEY, MISSES_KEY])
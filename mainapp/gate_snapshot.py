@@ -0,0 +1,134 @@
+"""
+Offline gate snapshots.
+
+A snapshot lists every still-valid ticket of one event as a sorted array of
+fixed-width 8-byte BLAKE2b digests of its ticket code::
+
+    header  <8s H H I Q Q>  magic, version, digest size, reserved, event id, count
+    body    count * 8 bytes, sorted ascending
+
+Gate devices memory-map the file and binary-search it, so a snapshot for
+50 000 tickets is 400 kB, loads instantly and never gets copied into Python
+objects. The digests are one-way, so a leaked snapshot cannot be turned into
+valid codes.
+
+This module deliberately has no Django imports so it can be copied onto gate
+devices on its own.
+"""
+import csv
+import hashlib
+import mmap
+import os
+import struct
+from datetime import datetime, timezone
+
+MAGIC = b'USTGATE1'
+VERSION = 1
+DIGEST_SIZE = 8
+HEADER = struct.Struct('<8sHHIQQ')
+DIGEST = struct.Struct('>Q')
+
+
+class SnapshotError(ValueError):
+    pass
+
+
+def digest(code):
+    """Digest of a scanned ticket code, as stored in a snapshot."""
+    return hashlib.blake2b(code.strip().upper().encode('ascii'), digest_size=DIGEST_SIZE).digest()
+
+
+def write_snapshot(fileobj, event_id, codes):
+    """Write a snapshot of ``codes`` for ``event_id`` to a binary file object."""
+    digests = sorted({digest(code) for code in codes})
+    fileobj.write(HEADER.pack(MAGIC, VERSION, DIGEST_SIZE, 0, event_id, len(digests)))
+    fileobj.write(b''.join(digests))
+    return len(digests)
+
+
+class GateSnapshot:
+    """Read-only, memory-mapped view of a snapshot file."""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < HEADER.size:
+                raise SnapshotError(f"{path} is too small to be a gate snapshot")
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, digest_size, _, self.event_id, self.count = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION or digest_size != DIGEST_SIZE:
+            self.close()
+            raise SnapshotError(f"{path} is not a version {VERSION} gate snapshot")
+        if size != HEADER.size + self.count * DIGEST_SIZE:
+            self.close()
+            raise SnapshotError(f"{path} is truncated")
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, code):
+        target = DIGEST.unpack(digest(code))[0]
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            value = DIGEST.unpack_from(self._map, HEADER.size + mid * DIGEST_SIZE)[0]
+            if value < target:
+                lo = mid + 1
+            elif value > target:
+                hi = mid
+            else:
+                return True
+        return False
+
+    def close(self):
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class OfflineGate:
+    """
+    Checks scans against a snapshot and appends them to a CSV scan log that
+    ``manage.py reconcile_offline_scans`` uploads once the gate is back online.
+    """
+
+    ADMITTED = 'admitted'
+    ALREADY_USED = 'already_used'
+    INVALID = 'invalid'
+
+    def __init__(self, snapshot_path, log_path, gate='gate'):
+        self.snapshot = GateSnapshot(snapshot_path)
+        self.log_path = log_path
+        self.gate = gate
+        self.used = set()
+        if os.path.exists(log_path):
+            with open(log_path, newline='') as f:
+                self.used = {digest(row['code']) for row in csv.DictReader(f) if row['status'] == self.ADMITTED}
+
+    def scan(self, code):
+        code = code.strip().upper()
+        if code not in self.snapshot:
+            status = self.INVALID
+        elif digest(code) in self.used:
+            status = self.ALREADY_USED
+        else:
+            status = self.ADMITTED
+            self.used.add(digest(code))
+        self._log(code, status)
+        return status
+
+    def _log(self, code, status):
+        new_file = not os.path.exists(self.log_path)
+        with open(self.log_path, 'a', newline='') as f:
+            writer = csv.writer(f)
+            if new_file:
+                writer.writerow(['code', 'scanned_at', 'gate', 'status'])
+            writer.writerow([code, datetime.now(timezone.utc).isoformat(), self.gate, status])
+
+    def close(self):
+        self.snapshot.close()
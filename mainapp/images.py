@@ -0,0 +1,181 @@
+"""
+Resized variants of uploaded images.
+
+Organizers upload full-size photos (often several MB) as ``Event.image`` and
+users upload ``CustomUser.profile_image``; the listings only need a few
+hundred pixels. Each upload gets a SHA-256 digest of its content, kept next
+to it (``Event.image_digest``, ``CustomUser.profile_image_digest``), and its
+variants -- every size in ``VARIANTS`` as WebP and JPEG -- are stored
+content-addressed under ``variants/<digest>/<variant>.<format>``.
+
+Variants are generated
+
+* lazily: the ``image_variant`` view renders a missing variant on first
+  request, finding the original by its digest;
+* eagerly: after an upload commits, a background pool renders them all
+  (``IMAGE_VARIANTS_EAGER``); ``generate_image_variants`` backfills existing
+  uploads.
+
+A variant URL names the content it was made from, so it never changes
+meaning and is served with a one-year ``immutable`` cache lifetime.
+"""
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .models import CustomUser, Event
+
+logger = logging.getLogger(__name__)
+
+# name: (bounding box, crop to fill it exactly)
+VARIANTS = {
+    'card': ((800, 800), False),
+    'avatar': ((192, 192), True),
+}
+# URL extension: (Pillow format, content type)
+FORMATS = {
+    'webp': ('WEBP', 'image/webp'),
+    'jpg': ('JPEG', 'image/jpeg'),
+}
+# Models with variant-backed images: (model, image field, digest field)
+SOURCES = (
+    (Event, 'image', 'image_digest'),
+    (CustomUser, 'profile_image', 'profile_image_digest'),
+)
+
+_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'IMAGE_VARIANT_WORKERS', 2), thread_name_prefix='image-variants'
+)
+
+
+def file_digest(fieldfile):
+    """SHA-256 of an uploaded (or already stored) file's content."""
+    sha = hashlib.sha256()
+    committed = fieldfile._committed
+    source = fieldfile.file if not committed else fieldfile.open('rb')
+    try:
+        source.seek(0)
+        for chunk in source.chunks():
+            sha.update(chunk)
+        source.seek(0)
+    finally:
+        if committed:
+            fieldfile.close()
+    return sha.hexdigest()
+
+
+def update_digest(instance, field, digest_field):
+    """Keep ``instance``'s digest in step with its image; returns True if it changed."""
+    fieldfile = getattr(instance, field)
+    digest = getattr(instance, digest_field)
+    if not fieldfile:
+        new = ''
+    elif fieldfile._committed and digest:
+        # Same stored file as when loaded
+        return False
+    else:
+        new = file_digest(fieldfile)
+    setattr(instance, digest_field, new)
+    return new != digest
+
+
+def variant_name(digest, variant, fmt):
+    return f'variants/{digest[:2]}/{digest}/{variant}.{fmt}'
+
+
+def source_name(digest):
+    """Storage name of an original with this digest, or None."""
+    for model, field, digest_field in SOURCES:
+        name = model.objects.filter(**{digest_field: digest}).exclude(**{field: ''}).values_list(
+            field, flat=True
+        ).first()
+        if name:
+            return name
+    return None
+
+
+def render(source, variant, fmt):
+    """The ``variant`` of image file ``source`` encoded as ``fmt``, as bytes."""
+    size, crop = VARIANTS[variant]
+    pil_format = FORMATS[fmt][0]
+    with Image.open(source) as image:
+        # JPEG can decode straight at a fraction of the size
+        image.draft('RGB', (size[0] * 2, size[1] * 2))
+        image = ImageOps.exif_transpose(image)
+        if pil_format == 'JPEG' or image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if pil_format == 'WEBP' and 'A' in image.getbands() else 'RGB')
+        if crop:
+            image = ImageOps.fit(image, size, Image.LANCZOS)
+        else:
+            image.thumbnail(size, Image.LANCZOS)
+        out = BytesIO()
+        image.save(out, format=pil_format, quality=settings.IMAGE_VARIANT_QUALITY)
+    return out.getvalue()
+
+
+def ensure_variant(digest, variant, fmt):
+    """Storage name of the variant, rendering it first if needed; None if the original is gone."""
+    name = variant_name(digest, variant, fmt)
+    if default_storage.exists(name):
+        return name
+    source = source_name(digest)
+    if source is None:
+        return None
+    with default_storage.open(source, 'rb') as original:
+        data = render(original, variant, fmt)
+    saved = default_storage.save(name, ContentFile(data))
+    if saved != name:
+        # Rendered concurrently by another request; both copies are identical
+        default_storage.delete(saved)
+    return name
+
+
+def ensure_all(digest):
+    for variant in VARIANTS:
+        for fmt in FORMATS:
+            ensure_variant(digest, variant, fmt)
+
+
+def backfill_digests():
+    """Digest stored images that have none yet (uploaded before variants existed); returns the count."""
+    count = 0
+    for model, field, digest_field in SOURCES:
+        rows = model.objects.filter(**{digest_field: '', f'{field}__isnull': False}).exclude(**{field: ''})
+        for instance in rows.only('pk', field).iterator():
+            changes = {digest_field: file_digest(getattr(instance, field))}
+            if model is Event:
+                # Re-render the cached event cards with the variants
+                changes['updated_at'] = timezone.now()
+            model.objects.filter(pk=instance.pk).update(**changes)
+            count += 1
+    return count
+
+
+def all_digests():
+    digests = set()
+    for model, field, digest_field in SOURCES:
+        digests.update(model.objects.exclude(**{digest_field: ''}).values_list(digest_field, flat=True))
+    return sorted(digests)
+
+
+def _ensure_in_background(digest):
+    try:
+        ensure_all(digest)
+    except Exception:
+        logger.exception("Rendering image variants failed for %s", digest)
+    finally:
+        close_old_connections()
+
+
+def schedule(digest):
+    """Render ``digest``'s variants in the background once the current transaction commits."""
+    if digest and settings.IMAGE_VARIANTS_EAGER:
+        transaction.on_commit(lambda: _executor.submit(_ensure_in_background, digest))
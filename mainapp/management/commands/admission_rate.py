@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from mainapp import admission
+
+
+class Command(BaseCommand):
+    help = "Set an event's waiting-room admission rate (requests per second) or reset its queue"
+
+    def add_arguments(self, parser):
+        parser.add_argument('event_id', type=int)
+        parser.add_argument('rate', type=float, nargs='?', help='Omit to restore ADMISSION_RATE')
+        parser.add_argument('--reset', action='store_true', help='Drop the current queue as well')
+
+    def handle(self, *args, **options):
+        event_id = options['event_id']
+        admission.set_rate(event_id, options['rate'])
+        if options['reset']:
+            admission.reset(event_id)
+        rate = options['rate'] or 'the default rate'
+        self.stdout.write(self.style.SUCCESS(f"Event {event_id} now admits {rate} requests per second"))
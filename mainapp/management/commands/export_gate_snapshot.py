@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from mainapp.checkin import export_gate_snapshot
+from mainapp.models import Event
+
+
+class Command(BaseCommand):
+    help = 'Export the offline gate snapshot (valid ticket digests) for one event'
+
+    def add_arguments(self, parser):
+        parser.add_argument('event_id', type=int)
+        parser.add_argument('-o', '--output', help='Output path (default: event_<id>.gate)')
+
+    def handle(self, *args, **options):
+        try:
+            event = Event.objects.get(pk=options['event_id'])
+        except Event.DoesNotExist:
+            raise CommandError(f"Event {options['event_id']} does not exist")
+
+        path = options['output'] or f"event_{event.pk}.gate"
+        with open(path, 'wb') as f:
+            count = export_gate_snapshot(event, f)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {count} valid tickets for '{event}' to {path}"))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from mainapp import forecasts
+
+
+class Command(BaseCommand):
+    help = 'Fold newly held events into the booking curves and recompute stale sell-out forecasts (run from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild', action='store_true',
+            help='Rebuild the booking curves from every held event instead of only the newly held ones',
+        )
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            folded = forecasts.fold_curves(rebuild=True)
+            self.stdout.write(f"Rebuilt booking curves from {folded} held events")
+        recomputed = forecasts.refresh()
+        self.stdout.write(self.style.SUCCESS(f"Recomputed {recomputed} forecasts"))
@@ -0,0 +1,24 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from mainapp import images
+
+
+class Command(BaseCommand):
+    help = 'Digest existing event and profile images and render their missing variants'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help='Render threads; 1 renders inline')
+
+    def handle(self, *args, **options):
+        digested = images.backfill_digests()
+        if digested:
+            self.stdout.write(f"Digested {digested} images")
+        digests = images.all_digests()
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            mapper = pool.map if options['workers'] > 1 else map
+            for done, _ in enumerate(mapper(images.ensure_all, digests), 1):
+                if done % 100 == 0:
+                    self.stdout.write(f"Rendered variants for {done} of {len(digests)} images")
+        self.stdout.write(self.style.SUCCESS(f"Variants ready for {len(digests)} images"))
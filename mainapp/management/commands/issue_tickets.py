@@ -0,0 +1,60 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+
+from mainapp import booking, qr
+from mainapp.models import Department, Event, ROLE_CHOICES
+
+
+class Command(BaseCommand):
+    help = 'Issue tickets for an event to a whole department, role or CSV list of enrollment numbers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('event_id', type=int)
+        parser.add_argument('--department', help='Department code, e.g. FET')
+        parser.add_argument('--role', choices=[choice for choice, _ in ROLE_CHOICES])
+        parser.add_argument('--csv', help='CSV file of enrollment numbers')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Processes used to render QR images')
+
+    def handle(self, *args, **options):
+        try:
+            event = Event.objects.get(pk=options['event_id'])
+        except Event.DoesNotExist:
+            raise CommandError(f"Event {options['event_id']} does not exist")
+        if not (options['department'] or options['role'] or options['csv']):
+            raise CommandError('Give at least one of --department, --role or --csv')
+
+        department = None
+        if options['department']:
+            try:
+                department = Department.objects.get(code=options['department'])
+            except Department.DoesNotExist:
+                raise CommandError(f"Unknown department code {options['department']}")
+        enrollment_nos = None
+        if options['csv']:
+            with open(options['csv'], newline='') as f:
+                enrollment_nos = booking.read_enrollment_numbers(f)
+
+        users = booking.select_recipients(department, options['role'], enrollment_nos)
+        result = booking.issue_bulk(event, users, batch_size=options['batch_size'])
+        if result.promoted:
+            self.stdout.write(f"Promoted {result.promoted} waitlisted students first")
+        self.stdout.write(
+            f"Issued {result.issued} tickets in {result.elapsed:.2f}s ({result.per_second:,.0f}/s); "
+            f"skipped {result.skipped_existing} existing holders and {result.skipped_sold_out} over capacity"
+        )
+
+        if result.tickets and not result.tickets[0].stateless_qr:
+            started = time.perf_counter()
+            with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+                rendered = qr.render_tickets([t.pk for t in result.tickets], executor=pool)
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f"Rendered {rendered} QR codes on {options['workers']} processes in {elapsed:.2f}s "
+                f"({rendered / elapsed if elapsed else 0:,.0f}/s)"
+            )
+        self.stdout.write(self.style.SUCCESS('Done'))
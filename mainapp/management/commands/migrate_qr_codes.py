@@ -0,0 +1,55 @@
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+
+from mainapp.models import QRRenderJob, Ticket
+
+QR_DIR = 'qrcodes'
+
+
+class Command(BaseCommand):
+    help = 'Move existing tickets to stateless QR codes and optionally delete their stored PNGs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--purge', action='store_true',
+                            help=f'Delete the PNG files under MEDIA_ROOT/{QR_DIR}/')
+        parser.add_argument('--dry-run', action='store_true')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        if getattr(settings, 'TICKET_QR_MODE', 'file') != 'stateless':
+            raise CommandError("Set TICKET_QR_MODE = 'stateless' before migrating tickets.")
+
+        dry_run = options['dry_run']
+        batch_size = options['batch_size']
+
+        migrated = 0
+        ids = list(Ticket.objects.exclude(qr_code='').values_list('pk', flat=True))
+        for start in range(0, len(ids), batch_size):
+            batch = ids[start:start + batch_size]
+            if not dry_run:
+                Ticket.objects.filter(pk__in=batch).update(qr_code='', qr_status='ready')
+            migrated += len(batch)
+
+        if not dry_run:
+            Ticket.objects.filter(qr_status='pending').update(qr_status='ready')
+            QRRenderJob.objects.exclude(status='COMPLETED').update(status='COMPLETED')
+
+        deleted = self.purge(dry_run) if options['purge'] else 0
+
+        prefix = '[dry run] ' if dry_run else ''
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}Migrated {migrated} tickets to stateless QR codes, deleted {deleted} PNG files"
+        ))
+
+    def purge(self, dry_run):
+        if not default_storage.exists(QR_DIR):
+            return 0
+        _, files = default_storage.listdir(QR_DIR)
+        deleted = 0
+        for name in files:
+            if name.endswith('.png'):
+                if not dry_run:
+                    default_storage.delete(f'{QR_DIR}/{name}')
+                deleted += 1
+        return deleted
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from mainapp import waitlist
+
+
+class Command(BaseCommand):
+    help = 'Promote waitlisted students for every event that has free seats'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=waitlist.PROMOTION_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        promoted = waitlist.promote_all(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Promoted {promoted} waitlisted students"))
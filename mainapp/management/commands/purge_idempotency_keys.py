@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from mainapp import booking
+
+
+class Command(BaseCommand):
+    help = 'Delete booking idempotency keys older than BOOKING_IDEMPOTENCY_TTL'
+
+    def handle(self, *args, **options):
+        purged = booking.purge_idempotency_keys()
+        self.stdout.write(self.style.SUCCESS(f"Purged {purged} expired idempotency keys"))
@@ -0,0 +1,33 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from mainapp import qr
+
+
+class Command(BaseCommand):
+    help = 'Render pending ticket QR codes in batches using a process pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--sleep', type=float, default=1.0,
+                            help='Seconds to wait when the queue is empty')
+        parser.add_argument('--once', action='store_true',
+                            help='Exit as soon as the queue is drained')
+
+    def handle(self, *args, **options):
+        rendered = 0
+        with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+            while True:
+                handled = qr.process_batch(options['batch_size'], executor=pool)
+                rendered += handled
+                if handled:
+                    self.stdout.write(f"Rendered {handled} QR codes ({rendered} total)")
+                    continue
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+        self.stdout.write(self.style.SUCCESS(f"QR worker finished, {rendered} jobs handled"))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from mainapp import search
+from mainapp.models import CustomUser, Event
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the event and user search indexes (after bulk imports that bypass signals)'
+
+    def handle(self, *args, **options):
+        search.rebuild()
+        search.rebuild_users()
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {Event.objects.count()} events and {CustomUser.objects.count()} users"
+        ))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from mainapp import stats
+
+
+class Command(BaseCommand):
+    help = 'Verify the precomputed dashboard statistics and rebuild them from the base tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='Only report drifted counters; fail if there are any')
+
+    def handle(self, *args, **options):
+        drift = stats.verify()
+        for scope, key, stored, actual in drift:
+            self.stdout.write(f"{scope}:{key or '-'} stored {stored} actual {actual}")
+        if options['check']:
+            if drift:
+                raise CommandError(f"{len(drift)} counters have drifted")
+            self.stdout.write(self.style.SUCCESS("All counters match"))
+            return
+        rows = stats.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Fixed {len(drift)} drifted counters; {rows} counters rebuilt"))
@@ -0,0 +1,26 @@
+import csv
+
+from django.core.management.base import BaseCommand
+
+from mainapp.checkin import reconcile_offline_scans
+
+
+class Command(BaseCommand):
+    help = 'Upload offline gate scan logs (CSV: code, scanned_at, gate, status) and mark tickets as used'
+
+    def add_arguments(self, parser):
+        parser.add_argument('logs', nargs='+', help='Scan log CSV files written by OfflineGate')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        rows = []
+        for path in options['logs']:
+            with open(path, newline='') as f:
+                rows.extend(csv.DictReader(f))
+
+        counts = reconcile_offline_scans(rows, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Applied {counts['applied']} offline check-ins from {len(rows)} scans "
+            f"({counts['already_checked_in']} already checked in, "
+            f"{counts['duplicate_scans']} duplicate scans, {counts['invalid']} invalid)"
+        ))
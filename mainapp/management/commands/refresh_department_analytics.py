@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from mainapp import analytics
+
+
+class Command(BaseCommand):
+    help = 'Recompute the per-department analytics snapshot shown on the superadmin dashboard (run from cron)'
+
+    def handle(self, *args, **options):
+        data = analytics.refresh()
+        self.stdout.write(self.style.SUCCESS(f"Refreshed analytics for {len(data['departments'])} departments"))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from mainapp import recommendations
+
+
+class Command(BaseCommand):
+    help = 'Recompute the "recommended for you" events of every student (run from cron)'
+
+    def handle(self, *args, **options):
+        stored = recommendations.refresh()
+        self.stdout.write(self.style.SUCCESS(f"Stored {stored} recommendations"))
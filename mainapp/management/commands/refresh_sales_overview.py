@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from mainapp import sales
+
+
+class Command(BaseCommand):
+    help = 'Recompute the booking demand overview shown on the superadmin dashboard (run from cron)'
+
+    def handle(self, *args, **options):
+        data = sales.refresh_overview()
+        self.stdout.write(self.style.SUCCESS(f"Refreshed booking demand for {len(data['categories'])} categories"))
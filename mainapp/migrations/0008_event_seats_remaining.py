@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-16 20:53
+
+from django.db import migrations, models
+
+
+def backfill_seats_remaining(apps, schema_editor):
+    Event = apps.get_model('mainapp', 'Event')
+    Ticket = apps.get_model('mainapp', 'Ticket')
+    booked = dict(
+        Ticket.objects.values_list('event').annotate(n=models.Count('pk')).values_list('event', 'n')
+    )
+    for event in Event.objects.only('pk', 'available_tickets'):
+        event.seats_remaining = event.available_tickets - booked.get(event.pk, 0)
+        event.save(update_fields=['seats_remaining'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0007_systemlog_systembackup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='seats_remaining',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_seats_remaining, migrations.RunPython.noop),
+    ]
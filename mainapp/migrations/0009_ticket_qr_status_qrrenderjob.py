@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-16 20:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def mark_rendered_tickets_ready(apps, schema_editor):
+    Ticket = apps.get_model('mainapp', 'Ticket')
+    Ticket.objects.exclude(qr_code='').update(qr_status='ready')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0008_event_seats_remaining'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticket',
+            name='qr_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('ready', 'Ready'), ('failed', 'Failed')], default='pending', max_length=10),
+        ),
+        migrations.CreateModel(
+            name='QRRenderJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('IN_PROGRESS', 'In Progress'), ('COMPLETED', 'Completed'), ('FAILED', 'Failed')], default='PENDING', max_length=20)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('error_message', models.TextField(blank=True, null=True)),
+                ('ticket', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='qr_job', to='mainapp.ticket')),
+            ],
+            options={
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['status', 'id'], name='mainapp_qrr_status_df98c1_idx')],
+            },
+        ),
+        migrations.RunPython(mark_rendered_tickets_ready, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-16 21:01
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0009_ticket_qr_status_qrrenderjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticket',
+            name='checked_in_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='ticket',
+            name='checked_in_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['event', 'checked_in_at'], name='mainapp_tic_event_i_dc5379_idx'),
+        ),
+    ]
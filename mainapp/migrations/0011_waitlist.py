@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-16 21:08
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0010_ticket_check_in'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='waitlist_served',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='waitlist_tail',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='WaitlistEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.BigIntegerField()),
+                ('status', models.CharField(choices=[('waiting', 'Waiting'), ('promoted', 'Promoted'), ('left', 'Left')], default='waiting', max_length=10)),
+                ('joined_at', models.DateTimeField(auto_now_add=True)),
+                ('promoted_at', models.DateTimeField(blank=True, null=True)),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waitlist', to='mainapp.event')),
+                ('ticket', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='mainapp.ticket')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waitlist_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'Waitlist entries',
+                'indexes': [models.Index(fields=['event', 'status', 'position'], name='mainapp_wai_event_i_12795b_idx')],
+                'unique_together': {('event', 'user')},
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0012_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['-date', '-id'], name='event_listing_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='systemlog',
+            index=models.Index(fields=['-timestamp', '-id'], name='systemlog_listing_idx'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+from django.db import migrations
+
+SQLITE_CREATE = [
+    "CREATE VIRTUAL TABLE mainapp_event_fts USING fts5("
+    "title, description, location, department, tokenize='porter unicode61 remove_diacritics 2')",
+    "INSERT INTO mainapp_event_fts (rowid, title, description, location, department) "
+    "SELECT e.id, e.title, e.description, e.location, d.name "
+    "FROM mainapp_event e JOIN mainapp_department d ON d.id = e.department_id",
+]
+
+POSTGRES_CREATE = [
+    "CREATE TABLE mainapp_event_search ("
+    "event_id bigint PRIMARY KEY REFERENCES mainapp_event (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+    "document tsvector NOT NULL)",
+    "CREATE INDEX mainapp_event_search_document ON mainapp_event_search USING GIN (document)",
+    "INSERT INTO mainapp_event_search (event_id, document) "
+    "SELECT e.id, "
+    "setweight(to_tsvector('english', e.title), 'A') || "
+    "setweight(to_tsvector('english', d.name), 'B') || "
+    "setweight(to_tsvector('english', e.location), 'B') || "
+    "setweight(to_tsvector('english', e.description), 'C') "
+    "FROM mainapp_event e JOIN mainapp_department d ON d.id = e.department_id",
+]
+
+DROP = {
+    'sqlite': ["DROP TABLE IF EXISTS mainapp_event_fts"],
+    'postgresql': ["DROP TABLE IF EXISTS mainapp_event_search"],
+}
+
+
+def create_search_index(apps, schema_editor):
+    statements = {'sqlite': SQLITE_CREATE, 'postgresql': POSTGRES_CREATE}
+    for sql in statements.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+def drop_search_index(apps, schema_editor):
+    for sql in DROP.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0013_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,44 @@
+from django.db import migrations
+
+SQLITE_CREATE = [
+    "CREATE VIRTUAL TABLE mainapp_customuser_fts USING fts5("
+    "username, email, enrollment_no, first_name, last_name, "
+    "tokenize='unicode61 remove_diacritics 2', prefix='1 2 3')",
+    "INSERT INTO mainapp_customuser_fts (rowid, username, email, enrollment_no, first_name, last_name) "
+    "SELECT id, username, email, enrollment_no, first_name, last_name FROM mainapp_customuser",
+]
+
+# Matches the UPPER(col::text) LIKE UPPER(...) that Django emits for icontains
+POSTGRES_COLUMNS = ('username', 'email', 'enrollment_no', 'first_name', 'last_name')
+POSTGRES_CREATE = ["CREATE EXTENSION IF NOT EXISTS pg_trgm"] + [
+    f'CREATE INDEX mainapp_customuser_{column}_trgm ON mainapp_customuser '
+    f'USING GIN (UPPER("{column}"::text) gin_trgm_ops)'
+    for column in POSTGRES_COLUMNS
+]
+
+DROP = {
+    'sqlite': ["DROP TABLE IF EXISTS mainapp_customuser_fts"],
+    'postgresql': [f"DROP INDEX IF EXISTS mainapp_customuser_{column}_trgm" for column in POSTGRES_COLUMNS],
+}
+
+
+def create_search_index(apps, schema_editor):
+    statements = {'sqlite': SQLITE_CREATE, 'postgresql': POSTGRES_CREATE}
+    for sql in statements.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+def drop_search_index(apps, schema_editor):
+    for sql in DROP.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0014_event_search_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
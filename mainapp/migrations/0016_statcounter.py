@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0015_user_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(choices=[('total', 'Total'), ('department', 'Department'), ('category', 'Category'), ('role', 'Role'), ('day', 'Event day')], max_length=20)),
+                ('key', models.CharField(blank=True, max_length=50)),
+                ('users', models.BigIntegerField(default=0)),
+                ('events', models.BigIntegerField(default=0)),
+                ('tickets', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'unique_together': {('scope', 'key')},
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0018_change_timestamps'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='profile_image_digest',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='image_digest',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+    ]
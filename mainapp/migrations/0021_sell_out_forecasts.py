@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0020_recommendation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SellOutForecast',
+            fields=[
+                ('event', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='forecast', serialize=False, to='mainapp.event')),
+                ('sold', models.IntegerField()),
+                ('expected_attendance', models.IntegerField()),
+                ('sell_out_at', models.DateTimeField(blank=True, null=True)),
+                ('computed_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='BookingCurve',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category', models.CharField(choices=[('seminar', 'Seminar'), ('concert', 'Concert'), ('stage_event', 'Stage Event'), ('educational', 'Educational'), ('other', 'Other')], max_length=20)),
+                ('events', models.PositiveIntegerField(default=0)),
+                ('shares', models.JSONField(default=list)),
+                ('fill', models.FloatField(default=0)),
+                ('through', models.DateTimeField()),
+                ('department', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='mainapp.department')),
+            ],
+            options={
+                'unique_together': {('category', 'department')},
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0021_sell_out_forecasts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Snapshot',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('data', models.JSONField()),
+                ('computed_at', models.DateTimeField()),
+            ],
+        ),
+    ]
@@ -1,10 +1,7 @@
 from django.db import models
+from django.conf import settings
 from django.contrib.auth.models import AbstractUser, PermissionsMixin
 from django.utils import timezone
-from django.core.files import File
-from io import BytesIO
-import qrcode
-import json
 import os
 import datetime
 
@@ -17,6 +14,7 @@ ROLE_CHOICES = (
 class Department(models.Model):
     name = models.CharField(max_length=100, unique=True)
     code = models.CharField(max_length=10, unique=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         verbose_name_plural = "Departments"
@@ -33,10 +31,23 @@ class CustomUser(AbstractUser, PermissionsMixin):
     enrollment_no = models.CharField(max_length=20, unique=True, null=True, blank=True)
     department = models.ForeignKey(Department, on_delete=models.SET_NULL, null=True, blank=True)
     profile_image = models.ImageField(upload_to='profiles/', blank=True, null=True)
+    profile_image_digest = models.CharField(max_length=64, blank=True, db_index=True)
 
     def __str__(self):
         return f"{self.username} ({self.role})"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # What mainapp.stats last counted this user under
+        instance._loaded_stats = instance.stats_buckets()
+        return instance
+
+    def stats_buckets(self):
+        if 'role' not in self.__dict__:
+            return None
+        return (self.department_id, self.role)
+
     @property
     def is_event_admin(self):
         return self.role == 'admin'
@@ -59,50 +70,283 @@ class Event(models.Model):
     date = models.DateTimeField()
     location = models.CharField(max_length=200)
     image = models.ImageField(upload_to='event_images/', null=True, blank=True)
+    # SHA-256 of the image's content; names its resized variants (mainapp.images)
+    image_digest = models.CharField(max_length=64, blank=True, db_index=True)
     available_tickets = models.IntegerField(default=0)
+    # Denormalized seat counter, claimed atomically by mainapp.booking
+    seats_remaining = models.IntegerField(default=0)
+    # Waitlist sequence numbers: last one handed out and last one promoted
+    waitlist_tail = models.BigIntegerField(default=0)
+    waitlist_served = models.BigIntegerField(default=0)
     ticket_price = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
     department = models.ForeignKey(Department, on_delete=models.CASCADE, related_name='events')
     created_by = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='created_events')
     category = models.CharField(max_length=20, choices=CATEGORY_CHOICES, default='other')
+    # Bumped on every save (and when the department is renamed); counter
+    # UPDATEs leave it alone. Versions the cached event cards and the ETags
+    # in mainapp.conditional.
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    # Only ever changed with relative UPDATEs, never written back from memory
+    COUNTER_FIELDS = ('seats_remaining', 'waitlist_tail', 'waitlist_served')
+
+    class Meta:
+        # Keyset pagination order of the dashboard event listing
+        indexes = [models.Index(fields=['-date', '-id'], name='event_listing_idx')]
     
     def __str__(self):
         return self.title
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_available_tickets = instance.__dict__.get('available_tickets')
+        # What mainapp.stats last counted this event under
+        instance._loaded_stats = instance.stats_buckets()
+        return instance
+
+    def stats_buckets(self):
+        if 'date' not in self.__dict__:
+            return None
+        return (self.department_id, self.category, timezone.localdate(self.date) if self.date else None)
+
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            self.seats_remaining = self.available_tickets
+            super().save(*args, **kwargs)
+            self._loaded_available_tickets = self.available_tickets
+            return
+
+        # Never write the counters back from a stale in-memory copy; they are
+        # only ever changed with relative UPDATEs so concurrent bookings stick.
+        if kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name not in self.COUNTER_FIELDS
+            ]
+        loaded = getattr(self, '_loaded_available_tickets', None)
+        capacity_saved = 'available_tickets' in kwargs['update_fields']
+        # Set before saving so post_save receivers can see it
+        self._capacity_raised = capacity_saved and loaded is not None and self.available_tickets > loaded
+        super().save(*args, **kwargs)
+
+        if capacity_saved and loaded is not None and self.available_tickets != loaded:
+            Event.objects.filter(pk=self.pk).update(
+                seats_remaining=models.F('seats_remaining') + (self.available_tickets - loaded)
+            )
+            self.refresh_from_db(fields=['seats_remaining'])
+        if capacity_saved:
+            self._loaded_available_tickets = self.available_tickets
+
     def tickets_left(self):
-        return self.available_tickets - self.ticket_set.count()
+        return self.seats_remaining
 
     @property
     def is_free(self):
         return self.ticket_price == 0
 
+    @property
+    def open_for_booking(self):
+        """Free seats and nobody waiting for them; otherwise seats go to the waitlist first."""
+        return self.seats_remaining > 0 and self.waitlist_tail <= self.waitlist_served
+
 class Ticket(models.Model):
+    QR_STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('ready', 'Ready'),
+        ('failed', 'Failed'),
+    )
+
     event = models.ForeignKey(Event, on_delete=models.CASCADE)
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
     booked_at = models.DateTimeField(auto_now_add=True)
     qr_code = models.ImageField(upload_to='qrcodes/', blank=True)
+    qr_status = models.CharField(max_length=10, choices=QR_STATUS_CHOICES, default='pending')
+    checked_in_at = models.DateTimeField(null=True, blank=True)
+    checked_in_by = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         unique_together = ('event', 'user')
+        indexes = [models.Index(fields=['event', 'checked_in_at'])]
 
     def __str__(self):
         return f"{self.user.enrollment_no} | {self.event.title}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The event whose seat this ticket holds; see mainapp.signals
+        instance._loaded_event_id = instance.__dict__.get('event_id')
+        return instance
+
     def save(self, *args, **kwargs):
         if not self.booked_at:
             self.booked_at = timezone.now()
-        if not self.qr_code:
-            data = {
-                "username": self.user.username,
-                "enrollment_no": self.user.enrollment_no,
-                "event": self.event.title,
-                "date": str(self.event.date) if self.event.date else "Not scheduled",
-                "booked_at": self.booked_at.strftime("%Y-%m-%d %H:%M:%S")
-            }
-            qr_img = qrcode.make(json.dumps(data))
-            canvas = BytesIO()
-            qr_img.save(canvas, format='PNG')
-            self.qr_code.save(f"qr_{self.user.username}_{self.event.id}.png", File(canvas), save=False)
-            super().save(*args, **kwargs)
+        if self.qr_code or (self._state.adding and self.stateless_qr):
+            self.qr_status = 'ready'
+        adding = self._state.adding
+        super().save(*args, **kwargs)
+        # QR images are rendered by the qr_worker command, not in the request
+        if adding and not self.qr_code and not self.stateless_qr:
+            QRRenderJob.objects.create(ticket=self)
+
+    @property
+    def stateless_qr(self):
+        return getattr(settings, 'TICKET_QR_MODE', 'file') == 'stateless'
+
+    @property
+    def qr_ready(self):
+        if self.stateless_qr:
+            return True
+        return self.qr_status == 'ready' and bool(self.qr_code)
+
+class QRRenderJob(models.Model):
+    STATUS_CHOICES = (
+        ('PENDING', 'Pending'),
+        ('IN_PROGRESS', 'In Progress'),
+        ('COMPLETED', 'Completed'),
+        ('FAILED', 'Failed'),
+    )
+
+    ticket = models.OneToOneField(Ticket, on_delete=models.CASCADE, related_name='qr_job')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    error_message = models.TextField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [models.Index(fields=['status', 'id'])]
+
+    def __str__(self):
+        return f"QR job {self.pk} - {self.status}"
+
+class IdempotencyKey(models.Model):
+    """The outcome of a booking request, replayed when the same key is retried."""
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='+')
+    key = models.CharField(max_length=64)
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='+')
+    status = models.CharField(max_length=20)
+    ticket = models.ForeignKey(Ticket, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        unique_together = ('user', 'key')
+
+    def __str__(self):
+        return f"{self.key} - {self.status}"
+
+class WaitlistEntry(models.Model):
+    STATUS_CHOICES = (
+        ('waiting', 'Waiting'),
+        ('promoted', 'Promoted'),
+        ('left', 'Left'),
+    )
+
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='waitlist')
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='waitlist_entries')
+    # Sequence number within the event; waiting entries are always the
+    # contiguous range (event.waitlist_served, event.waitlist_tail]
+    position = models.BigIntegerField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='waiting')
+    joined_at = models.DateTimeField(auto_now_add=True)
+    promoted_at = models.DateTimeField(null=True, blank=True)
+    ticket = models.ForeignKey(Ticket, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+
+    class Meta:
+        unique_together = ('event', 'user')
+        indexes = [models.Index(fields=['event', 'status', 'position'])]
+        verbose_name_plural = "Waitlist entries"
+
+    def __str__(self):
+        return f"{self.user} waiting for {self.event} (#{self.position})"
+
+    @property
+    def place_in_line(self):
+        """1-based place among waiting entries, without counting rows."""
+        if self.status != 'waiting':
+            return None
+        return self.position - self.event.waitlist_served
+
+class Recommendation(models.Model):
+    """An upcoming event picked for a student by mainapp.recommendations."""
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='+')
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='+')
+    # 1 is the best match
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+
+    class Meta:
+        # Also the index the dashboard's top-N read walks
+        unique_together = ('user', 'rank')
+
+    def __str__(self):
+        return f"{self.event} for {self.user} (#{self.rank})"
+
+class BookingCurve(models.Model):
+    """Sell-through curves of held events summed per category and department (mainapp.forecasts)."""
+    category = models.CharField(max_length=20, choices=Event.CATEGORY_CHOICES)
+    department = models.ForeignKey(Department, on_delete=models.CASCADE, related_name='+')
+    events = models.PositiveIntegerField(default=0)
+    # Per point of mainapp.forecasts.GRID_HOURS, the summed share of each
+    # event's tickets that had been booked that many hours before it started
+    shares = models.JSONField(default=list)
+    # Summed tickets / capacity
+    fill = models.FloatField(default=0)
+    # Events held before this are included
+    through = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('category', 'department')
+
+    def __str__(self):
+        return f"{self.category} / {self.department_id} ({self.events} events)"
+
+class SellOutForecast(models.Model):
+    """Expected attendance and sell-out time of an upcoming event, from mainapp.forecasts."""
+    event = models.OneToOneField(Event, on_delete=models.CASCADE, primary_key=True, related_name='forecast')
+    # Tickets sold when the forecast was made; a different count marks it stale
+    sold = models.IntegerField()
+    expected_attendance = models.IntegerField()
+    # None when the event is not expected to sell out (or already has)
+    sell_out_at = models.DateTimeField(null=True, blank=True)
+    computed_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Forecast for {self.event_id}: {self.expected_attendance}"
+
+class Snapshot(models.Model):
+    """A precomputed dashboard payload, stored by mainapp.snapshots."""
+    name = models.CharField(max_length=50, primary_key=True)
+    data = models.JSONField()
+    computed_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.name} @ {self.computed_at:%Y-%m-%d %H:%M}"
+
+class StatCounter(models.Model):
+    """Precomputed dashboard counts, kept current by mainapp.stats."""
+    SCOPE_CHOICES = (
+        ('total', 'Total'),
+        ('department', 'Department'),
+        ('category', 'Category'),
+        ('role', 'Role'),
+        ('day', 'Event day'),
+    )
+
+    scope = models.CharField(max_length=20, choices=SCOPE_CHOICES)
+    key = models.CharField(max_length=50, blank=True)
+    users = models.BigIntegerField(default=0)
+    events = models.BigIntegerField(default=0)
+    tickets = models.BigIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('scope', 'key')
+
+    def __str__(self):
+        return f"{self.scope}:{self.key}"
 
 class SystemLog(models.Model):
     LOG_LEVELS = (
@@ -128,6 +372,7 @@ class SystemLog(models.Model):
 
     class Meta:
         ordering = ['-timestamp']
+        indexes = [models.Index(fields=['-timestamp', '-id'], name='systemlog_listing_idx')]
 
     def __str__(self):
         return f"{self.timestamp} - {self.level} - {self.event}"
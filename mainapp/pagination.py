@@ -0,0 +1,130 @@
+"""
+Keyset (cursor) pagination for the dashboard partial endpoints.
+
+Offset pagination makes the database walk and discard every row before the
+requested page, so page N costs N times page 1. Here a page is instead
+"the next ``page_size`` rows after the last one you saw", expressed as a
+``WHERE`` on an indexed, unique ordering key (always ending in ``id``). Every
+page is then one index range scan of ``page_size + 1`` rows.
+
+The cursor handed to the client is the signed ordering-key values of the last
+row on the page; a tampered cursor is rejected before reaching the database.
+"""
+import datetime
+import uuid
+from decimal import Decimal
+
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+
+SALT = 'mainapp.pagination'
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class Page:
+    def __init__(self, items, next_cursor):
+        self.items = items
+        self.next_cursor = next_cursor
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+def page_size(request=None):
+    """``LISTING_PAGE_SIZE``, or the smaller ``limit`` the client asked for."""
+    size = settings.LISTING_PAGE_SIZE
+    if request is not None:
+        try:
+            size = min(size, max(1, int(request.GET.get('limit', size))))
+        except ValueError:
+            pass
+    return size
+
+
+def _key_fields(ordering):
+    return [(name.lstrip('-'), name.startswith('-')) for name in ordering]
+
+
+def _after(keys, values):
+    """Q for rows strictly after ``values`` in the ``keys`` ordering."""
+    condition = Q()
+    for i, (name, descending) in enumerate(keys):
+        tie = {keys[j][0]: values[j] for j in range(i)}
+        tie[f"{name}__{'lt' if descending else 'gt'}"] = values[i]
+        condition |= Q(**tie)
+    return condition
+
+
+def _model_field(model, name):
+    try:
+        return model._meta.get_field(name)
+    except FieldDoesNotExist:
+        # An annotation such as a search rank; its value must be JSON-serializable
+        return None
+
+
+def _cursor_value(value):
+    """``value`` as JSON that ``Field.to_python`` reads back without loss."""
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, (Decimal, uuid.UUID)):
+        return str(value)
+    return value
+
+
+def encode_cursor(row, ordering):
+    """Cursor after ``row``: a model instance or a ``.values()`` dict."""
+    if isinstance(row, dict):
+        values = [row[name] for name, _ in _key_fields(ordering)]
+    else:
+        values = [getattr(row, name) for name, _ in _key_fields(ordering)]
+    return signing.dumps([_cursor_value(value) for value in values], salt=SALT, compress=True)
+
+
+def decode_cursor(cursor, model, ordering):
+    try:
+        raw = signing.loads(cursor, salt=SALT)
+    except signing.BadSignature:
+        raise InvalidCursor(cursor)
+    keys = _key_fields(ordering)
+    if not isinstance(raw, list) or len(raw) != len(keys):
+        raise InvalidCursor(cursor)
+    values = []
+    for (name, _), value in zip(keys, raw):
+        field = _model_field(model, name)
+        try:
+            values.append(value if field is None else field.to_python(value))
+        except ValidationError:
+            raise InvalidCursor(cursor)
+    return values
+
+
+def paginate(queryset, ordering, cursor=None, size=None):
+    """
+    Return the ``Page`` of ``queryset`` after ``cursor`` in ``ordering``.
+
+    ``ordering`` must be unique (end in ``'id'`` or ``'-id'``) and should be
+    backed by an index so that every page is a range scan. It may name
+    annotations on ``queryset`` as well as model fields. A ``.values()``
+    queryset must select every ordering key.
+    """
+    size = size or settings.LISTING_PAGE_SIZE
+    queryset = queryset.order_by(*ordering)
+    if cursor:
+        values = decode_cursor(cursor, queryset.model, ordering)
+        queryset = queryset.filter(_after(_key_fields(ordering), values))
+    rows = list(queryset[:size + 1])
+    next_cursor = encode_cursor(rows[size - 1], ordering) if len(rows) > size else None
+    return Page(rows[:size], next_cursor)
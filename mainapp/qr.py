@@ -0,0 +1,169 @@
+"""
+QR code rendering for tickets.
+
+With ``TICKET_QR_MODE = 'stateless'`` nothing is stored: the QR encodes the
+ticket's signed code (see ``ticket_codes``) and the ``qr_image`` view renders
+it on request, backed by an in-process LRU cache and long-lived HTTP caching.
+
+With ``TICKET_QR_MODE = 'file'`` rendering is kept out of the booking request:
+a ticket is committed with ``qr_status='pending'`` and a ``QRRenderJob``, and
+the ``qr_worker`` management command renders pending jobs in batches. Jobs
+left in progress by a worker that died are claimed again once
+``CLAIM_TIMEOUT`` has passed, up to ``MAX_ATTEMPTS`` in all.
+``ensure_ticket_qr`` renders on demand when a student opens a ticket before
+the worker has reached it.
+"""
+import hashlib
+from datetime import timedelta
+from functools import lru_cache
+from io import BytesIO
+
+import qrcode
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import DatabaseError, models, transaction
+from django.utils import timezone
+
+from . import ticket_codes
+from .models import QRRenderJob, Ticket
+
+MAX_ATTEMPTS = 3
+# A claimed job not finished within this long is assumed to have lost its worker
+CLAIM_TIMEOUT = timedelta(minutes=10)
+# Bump when the rendered image changes so cached ETags stop matching
+RENDER_VERSION = '2'
+
+
+def ticket_token(ticket):
+    """Signed, URL-safe token identifying ``ticket``; also the QR content."""
+    return ticket_codes.code_for_ticket(ticket)
+
+
+def unsign_token(token):
+    """Return ``(ticket_id, event_id)`` for ``token`` or raise ``InvalidTicketCode``."""
+    code = ticket_codes.decode(token)
+    return code.ticket_id, code.event_id
+
+
+def token_etag(token):
+    return hashlib.sha256(f"{RENDER_VERSION}:{token}".encode()).hexdigest()[:32]
+
+
+def ticket_payload(ticket):
+    return ticket_token(ticket)
+
+
+def render_png(data):
+    """Encode ``data`` at the lowest QR version that fits and return the PNG bytes."""
+    code = qrcode.QRCode(version=None, error_correction=qrcode.constants.ERROR_CORRECT_M)
+    code.add_data(data)
+    code.make(fit=True)
+    canvas = BytesIO()
+    code.make_image().save(canvas, format='PNG')
+    return canvas.getvalue()
+
+
+@lru_cache(maxsize=getattr(settings, 'TICKET_QR_CACHE_SIZE', 1024))
+def render_token_png(token):
+    return render_png(token)
+
+
+def store_ticket_qr(ticket, png):
+    ticket.qr_code.save(f"qr_{ticket.user.username}_{ticket.event_id}.png", ContentFile(png), save=False)
+    ticket.qr_status = 'ready'
+    Ticket.objects.filter(pk=ticket.pk).update(
+        qr_code=ticket.qr_code.name, qr_status='ready', updated_at=timezone.now()
+    )
+    QRRenderJob.objects.filter(ticket_id=ticket.pk).update(status='COMPLETED', updated_at=timezone.now())
+
+
+def ensure_ticket_qr(ticket):
+    """Make sure ``ticket`` has a rendered QR image, rendering it inline if needed."""
+    if not ticket.qr_ready:
+        store_ticket_qr(ticket, render_png(ticket_payload(ticket)))
+    return ticket
+
+
+def claim_jobs(batch_size, ticket_ids=None):
+    """
+    Mark up to ``batch_size`` pending jobs (optionally only those of
+    ``ticket_ids``) as in progress and return them. Jobs in progress for
+    longer than ``CLAIM_TIMEOUT`` are claimed again, or failed once they
+    have used up ``MAX_ATTEMPTS``.
+    """
+    stale = models.Q(status='IN_PROGRESS', updated_at__lt=timezone.now() - CLAIM_TIMEOUT)
+    pending = QRRenderJob.objects.select_for_update(skip_locked=True).filter(models.Q(status='PENDING') | stale)
+    if ticket_ids is not None:
+        pending = pending.filter(ticket_id__in=ticket_ids)
+    try:
+        with transaction.atomic():
+            abandoned = QRRenderJob.objects.filter(stale, attempts__gte=MAX_ATTEMPTS)
+            if ticket_ids is not None:
+                abandoned = abandoned.filter(ticket_id__in=ticket_ids)
+            abandoned_tickets = list(abandoned.values_list('ticket_id', flat=True))
+            if abandoned_tickets:
+                abandoned.update(status='FAILED', error_message='Worker stopped', updated_at=timezone.now())
+                Ticket.objects.filter(pk__in=abandoned_tickets).update(qr_status='failed', updated_at=timezone.now())
+            jobs = list(pending.order_by('id')[:batch_size])
+            QRRenderJob.objects.filter(pk__in=[job.pk for job in jobs]).update(
+                status='IN_PROGRESS',
+                attempts=models.F('attempts') + 1,
+                updated_at=timezone.now(),
+            )
+    except DatabaseError:
+        # Another worker holds the lock (SQLite has no SKIP LOCKED); try again later.
+        return []
+    return list(
+        QRRenderJob.objects.filter(pk__in=[job.pk for job in jobs])
+        .select_related('ticket__user', 'ticket__event')
+    )
+
+
+def process_batch(batch_size=50, executor=None):
+    """
+    Render one batch of pending QR codes. PNG encoding runs on ``executor``
+    (e.g. a ProcessPoolExecutor) when given, otherwise inline. Returns the
+    number of jobs handled.
+    """
+    jobs = claim_jobs(batch_size)
+    if jobs:
+        render_jobs(jobs, executor)
+    return len(jobs)
+
+
+def render_tickets(ticket_ids, executor=None, batch_size=200):
+    """Claim and render the pending QR jobs of ``ticket_ids``; returns the number rendered."""
+    rendered = 0
+    for start in range(0, len(ticket_ids), batch_size):
+        jobs = claim_jobs(batch_size, ticket_ids=ticket_ids[start:start + batch_size])
+        rendered += render_jobs(jobs, executor)
+    return rendered
+
+
+def render_jobs(jobs, executor=None):
+    """Render and store the QR images of already claimed ``jobs``."""
+    payloads = [ticket_payload(job.ticket) for job in jobs]
+    if executor is not None:
+        futures = [executor.submit(render_png, payload) for payload in payloads]
+    else:
+        futures = None
+
+    rendered = 0
+    for index, job in enumerate(jobs):
+        try:
+            png = futures[index].result() if futures else render_png(payloads[index])
+            if not job.ticket.qr_ready:
+                store_ticket_qr(job.ticket, png)
+            else:
+                QRRenderJob.objects.filter(pk=job.pk).update(status='COMPLETED')
+            rendered += 1
+        except Exception as e:
+            failed = job.attempts >= MAX_ATTEMPTS
+            QRRenderJob.objects.filter(pk=job.pk).update(
+                status='FAILED' if failed else 'PENDING',
+                error_message=str(e),
+                updated_at=timezone.now(),
+            )
+            if failed:
+                Ticket.objects.filter(pk=job.ticket_id).update(qr_status='failed', updated_at=timezone.now())
+    return rendered
@@ -0,0 +1,187 @@
+"""
+"Recommended for you" on the student dashboard.
+
+``refresh()`` scores every upcoming event for every active student in one
+batch (the ``refresh_recommendations`` command, run on a schedule) and keeps
+each student's best ``RECOMMENDATIONS_PER_STUDENT`` in ``Recommendation``;
+``for_student()`` then reads a top-N list in one indexed query.
+
+An event's score for a student adds up, weighted by ``WEIGHTS``:
+
+* department: 1 if the event is run by the student's department;
+* category: the share of the student's tickets in the event's category;
+* co-attendance: how much students with a similar ticket history booked
+  the event, scaled so the student's best match is 1.
+
+Everything is computed with NumPy. With ``A`` the students x ticketed-events
+matrix (each student's row scaled to unit length) and ``B`` the students x
+upcoming-events bookings, co-attendance is ``A Aᵀ B`` -- student similarity
+times what the similar students booked. It is evaluated as ``A (Aᵀ B)`` so
+the students x students matrix is never built: ``Aᵀ B`` is a small
+events x upcoming-events co-booking matrix, accumulated over blocks of
+``CHUNK`` students, and a second pass multiplies each block of ``A`` by it.
+Memory is bounded by the block size whatever the number of students.
+
+Events the student already booked are never recommended, nor are events
+that score 0 (nothing known about the student links them to it). Tickets
+for events older than ``RECOMMENDATION_HISTORY_DAYS`` are ignored.
+"""
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from .models import CustomUser, Event, Recommendation, Ticket
+
+WEIGHTS = {'department': 1.0, 'category': 2.0, 'co_attendance': 3.0}
+
+# Students scored per block
+CHUNK = 1000
+
+CATEGORIES = [code for code, _ in Event.CATEGORY_CHOICES]
+
+
+def _positions(ids, values):
+    """Positions of ``values`` in the sorted array ``ids``, and which of them are there."""
+    positions = np.searchsorted(ids, values)
+    found = positions < len(ids)
+    found[found] = ids[positions[found]] == values[found]
+    return positions, found
+
+
+def _load(now):
+    """Active students, upcoming events and the tickets that make up the history, as arrays."""
+    cutoff = now - timedelta(days=settings.RECOMMENDATION_HISTORY_DAYS)
+    students = np.array(
+        CustomUser.objects.filter(role='student', is_active=True).order_by('id').values_list('id', 'department_id'),
+        dtype=np.float64,
+    ).reshape(-1, 2)
+    upcoming = np.array(
+        Event.objects.filter(date__gte=now).order_by('id').values_list('id', 'department_id'), dtype=np.int64,
+    ).reshape(-1, 2)
+    tickets = np.array(
+        Ticket.objects.filter(user__role='student', event__date__gte=cutoff).order_by('user_id').values_list(
+            'user_id', 'event_id',
+        ),
+        dtype=np.int64,
+    ).reshape(-1, 2)
+    # Read last, so it covers every event in the queries above
+    categories = dict(Event.objects.filter(date__gte=cutoff).values_list('id', 'category'))
+    return students, upcoming, categories, tickets
+
+
+def _blocks(students, upcoming, categories, tickets):
+    """Yield ``(user ids, scores)``, scores being students x upcoming events, per block of students."""
+    student_ids = students[:, 0].astype(np.int64)
+    # NaN (no department) never equals an event's department
+    student_departments = students[:, 1]
+    upcoming_ids, upcoming_departments = upcoming[:, 0], upcoming[:, 1]
+
+    # Tickets of inactive students (and of students who joined since) drop out
+    ticket_students, found = _positions(student_ids, tickets[:, 0])
+    tickets, ticket_students = tickets[found], ticket_students[found]
+    event_ids, ticket_events = np.unique(tickets[:, 1], return_inverse=True)
+    ticket_upcoming, is_upcoming = _positions(upcoming_ids, tickets[:, 1])
+
+    category_codes = {category: i for i, category in enumerate(CATEGORIES)}
+    ticket_categories = np.array(
+        [category_codes[categories.get(event_id, 'other')] for event_id in event_ids.tolist()], dtype=np.int64,
+    )[ticket_events]
+    upcoming_one_hot = np.eye(len(CATEGORIES), dtype=np.float32)[
+        [category_codes[categories.get(event_id, 'other')] for event_id in upcoming_ids.tolist()]
+    ].T
+
+    # Gives each student's row of A unit length
+    counts = np.bincount(ticket_students, minlength=len(student_ids))
+    row_scale = np.divide(1.0, np.sqrt(counts), out=np.zeros(len(student_ids)), where=counts > 0).astype(np.float32)
+
+    starts = range(0, len(student_ids), CHUNK)
+    # Tickets are ordered by student, so each block's tickets are one slice
+    bounds = np.searchsorted(ticket_students, [*starts, len(student_ids)])
+
+    def block(n):
+        lo, hi = starts[n], min(starts[n] + CHUNK, len(student_ids))
+        rows = slice(bounds[n], bounds[n + 1])
+        local = ticket_students[rows] - lo
+        history = np.zeros((hi - lo, len(event_ids)), dtype=np.float32)
+        history[local, ticket_events[rows]] = row_scale[ticket_students[rows]]
+        booked = np.zeros((hi - lo, len(upcoming_ids)), dtype=np.float32)
+        upcoming_rows = is_upcoming[rows]
+        booked[local[upcoming_rows], ticket_upcoming[rows][upcoming_rows]] = 1
+        category_counts = np.zeros((hi - lo, len(CATEGORIES)), dtype=np.float32)
+        np.add.at(category_counts, (local, ticket_categories[rows]), 1)
+        return lo, hi, history, booked, category_counts
+
+    # Pass 1: Aᵀ B, each ticketed event's co-bookings with each upcoming one
+    co_booked = np.zeros((len(event_ids), len(upcoming_ids)), dtype=np.float32)
+    for n in range(len(starts)):
+        _, _, history, booked, _ = block(n)
+        co_booked += history.T @ booked
+
+    # Pass 2: the scores
+    for n in range(len(starts)):
+        lo, hi, history, booked, category_counts = block(n)
+        same_department = (student_departments[lo:hi, None] == upcoming_departments[None, :]).astype(np.float32)
+        totals = category_counts.sum(axis=1, keepdims=True)
+        category_share = np.divide(category_counts, totals, out=np.zeros_like(category_counts), where=totals > 0)
+        co_attendance = history @ co_booked
+        best = co_attendance.max(axis=1, initial=0, keepdims=True)
+        co_attendance = np.divide(co_attendance, best, out=np.zeros_like(co_attendance), where=best > 0)
+
+        scores = (
+            WEIGHTS['department'] * same_department
+            + WEIGHTS['category'] * (category_share @ upcoming_one_hot)
+            + WEIGHTS['co_attendance'] * co_attendance
+        )
+        scores[booked > 0] = 0
+        yield student_ids[lo:hi], scores
+
+
+def _top(user_ids, scores, upcoming_ids, limit):
+    """``Recommendation`` rows for the ``limit`` best-scoring events of each student."""
+    limit = min(limit, scores.shape[1])
+    if not limit:
+        return []
+    best = np.argpartition(-scores, limit - 1, axis=1)[:, :limit]
+    best_scores = np.take_along_axis(scores, best, axis=1)
+    # Highest score first, the sooner-created event on ties
+    order = np.lexsort((best, -best_scores), axis=1)
+    best = np.take_along_axis(best, order, axis=1)
+    best_scores = np.take_along_axis(best_scores, order, axis=1)
+    rows = []
+    for user_id, events, event_scores in zip(user_ids.tolist(), best, best_scores):
+        rank = 0
+        for column, score in zip(events.tolist(), event_scores.tolist()):
+            if score > 0:
+                rank += 1
+                rows.append(Recommendation(
+                    user_id=user_id, event_id=int(upcoming_ids[column]), rank=rank, score=score,
+                ))
+    return rows
+
+
+def refresh():
+    """Recompute every student's recommendations; returns the number of rows stored."""
+    now = timezone.now()
+    students, upcoming, categories, tickets = _load(now)
+    stored = 0
+    Recommendation.objects.filter(~Q(user__role='student') | Q(user__is_active=False)).delete()
+    for user_ids, scores in _blocks(students, upcoming, categories, tickets):
+        rows = _top(user_ids, scores, upcoming[:, 0], settings.RECOMMENDATIONS_PER_STUDENT)
+        with transaction.atomic():
+            Recommendation.objects.filter(user_id__in=user_ids.tolist()).delete()
+            Recommendation.objects.bulk_create(rows, batch_size=1000)
+        stored += len(rows)
+    return stored
+
+
+def for_student(user, limit):
+    """The student's top ``limit`` recommended events still ahead and not yet booked, in one query."""
+    picks = Recommendation.objects.filter(
+        ~Exists(Ticket.objects.filter(user=user, event=OuterRef('event'))),
+        user=user, event__date__gte=timezone.now(),
+    )
+    return [pick.event for pick in picks.select_related('event__department').order_by('rank')[:limit]]
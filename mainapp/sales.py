@@ -0,0 +1,204 @@
+"""
+Booking analytics: how fast events sell and which categories fill up.
+
+Booking timestamps are pulled in bulk (``values_list(...).iterator()``
+straight into NumPy arrays, as seconds since the epoch) and everything is
+computed on the arrays:
+
+* ``event_sales(event)``: the event's cumulative sell-through curve
+  (``CURVE_POINTS`` samples from its first to its last booking), the hours
+  it took to sell ``MILESTONES`` of its capacity, and an hour-of-day by
+  weekday heatmap of its bookings;
+* ``overview()``: per category, events, capacity, tickets sold, fill rate,
+  share of events sold out and the median hours to sell half the seats,
+  plus the heatmap of all bookings. Sorting the tickets by (event, time)
+  once gives every event's half-way booking by index arithmetic.
+
+Heatmaps are in local time (``TIME_ZONE``); the UTC offset is looked up once
+per distinct hour rather than per booking.
+
+``event_sales`` is cached per event, keyed by the event's ``updated_at``
+and its ticket count and latest booking time (one aggregate query), so any
+booking or cancellation recomputes it; it backs the admin event page. ``overview`` reads every booking, so it is never computed in a
+page request: the ``refresh_sales_overview`` command (run on a schedule)
+stores it as a shared snapshot (mainapp.snapshots) and the superadmin
+dashboard reads that.
+"""
+import datetime
+import math
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from . import snapshots
+from .models import Event, Ticket
+
+CURVE_POINTS = 24
+MILESTONES = (50, 90, 100)
+WEEKDAYS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+
+OVERVIEW_SNAPSHOT = 'sales:overview'
+
+# Size of the curve's SVG viewBox
+CURVE_WIDTH, CURVE_HEIGHT = 100, 40
+
+
+def booking_times(event):
+    """Seconds since the epoch of ``event``'s bookings, sorted."""
+    tickets = Ticket.objects.filter(event=event).order_by('booked_at').values_list('booked_at', flat=True)
+    tickets = tickets.iterator(chunk_size=settings.EXPORT_CHUNK_SIZE)
+    return np.fromiter((moment.timestamp() for moment in tickets), dtype=np.float64)
+
+
+def all_bookings():
+    """``(event ids, seconds since the epoch)`` of every booking, sorted by event then time."""
+    tickets = Ticket.objects.order_by().values_list('event_id', 'booked_at')
+    tickets = tickets.iterator(chunk_size=settings.EXPORT_CHUNK_SIZE)
+    rows = np.fromiter(
+        ((event_id, moment.timestamp()) for event_id, moment in tickets),
+        dtype=[('event', np.int64), ('at', np.float64)],
+    )
+    rows.sort(order=['event', 'at'])
+    return rows['event'], rows['at']
+
+
+def heatmap(seconds):
+    """7 x 24 booking counts by local weekday (Monday first) and hour."""
+    hours = (seconds // 3600).astype(np.int64)
+    distinct, inverse = np.unique(hours, return_inverse=True)
+    offsets = np.array([
+        timezone.localtime(datetime.datetime.fromtimestamp(hour * 3600, datetime.timezone.utc)).utcoffset()
+        .total_seconds()
+        for hour in distinct.tolist()
+    ], dtype=np.float64)
+    local_hours = ((seconds + offsets[inverse.reshape(-1)]) // 3600).astype(np.int64)
+    # 1970-01-01 was a Thursday
+    weekday = (local_hours // 24 + 3) % 7
+    return np.bincount(weekday * 24 + local_hours % 24, minlength=7 * 24).reshape(7, 24)
+
+
+def heatmap_rows(counts):
+    """Heatmap counts as template rows, each cell with its share of the busiest hour."""
+    peak = int(counts.max())
+    return [
+        {
+            'day': day,
+            'cells': [{'hour': hour, 'count': count, 'level': round(count / peak, 2) if peak else 0}
+                      for hour, count in enumerate(row)],
+        }
+        for day, row in zip(WEEKDAYS, counts.tolist())
+    ]
+
+
+def sell_through(times, capacity):
+    """The cumulative curve and milestone hours of sorted booking ``times``."""
+    sold = len(times)
+    milestones = {}
+    for percent in MILESTONES:
+        needed = math.ceil(capacity * percent / 100)
+        reached = capacity > 0 and sold >= needed
+        milestones[percent] = (times[needed - 1] - times[0]) / 3600 if reached else None
+    if not sold:
+        return {'curve': [], 'curve_points': '', 'milestones': milestones}
+
+    grid = np.linspace(times[0], times[-1], CURVE_POINTS)
+    counts = np.searchsorted(times, grid, side='right')
+    scale = max(capacity, sold)
+    x = np.linspace(0, CURVE_WIDTH, CURVE_POINTS)
+    y = CURVE_HEIGHT - counts / scale * CURVE_HEIGHT
+    return {
+        'curve': [
+            {'at': datetime.datetime.fromtimestamp(at, datetime.timezone.utc), 'sold': count}
+            for at, count in zip(grid.tolist(), counts.tolist())
+        ],
+        'curve_points': ' '.join(f'{px:.1f},{py:.1f}' for px, py in zip(x.tolist(), y.tolist())),
+        'milestones': milestones,
+    }
+
+
+def event_sales(event):
+    """``{'sold', 'capacity', 'curve', 'curve_points', 'milestones', 'heatmap'}`` for one event."""
+    times = booking_times(event)
+    return {
+        'sold': len(times),
+        'capacity': event.available_tickets,
+        **sell_through(times, event.available_tickets),
+        'heatmap': heatmap_rows(heatmap(times)),
+    }
+
+
+def cached_event_sales(event):
+    version = event.updated_at.strftime('%Y%m%d%H%M%S%f')
+    # A cancellation plus a new booking leaves the count as it was, but moves the latest booking
+    tickets = Ticket.objects.filter(event=event).aggregate(count=Count('id'), last=Max('booked_at'))
+    last = tickets['last'].timestamp() if tickets['last'] else 0
+    key = f"sales:event:{event.pk}:{version}:{tickets['count']}:{last}"
+    data = cache.get(key)
+    if data is None:
+        data = event_sales(event)
+        cache.set(key, data, timeout=settings.SALES_CACHE_TIMEOUT)
+    return data
+
+
+def category_demand(event_ids, seconds):
+    """Per-category demand from bookings sorted by event then time, busiest fill rate first."""
+    events = list(Event.objects.order_by('id').values_list('id', 'available_tickets', 'seats_remaining', 'category'))
+    ids, capacity, remaining = np.array([event[:3] for event in events], dtype=np.int64).reshape(-1, 3).T
+    categories = np.array([event[3] for event in events], dtype=object)
+
+    booked_ids, starts, sold_counts = np.unique(event_ids, return_index=True, return_counts=True)
+    # Bookings of events deleted since are dropped
+    positions = np.searchsorted(ids, booked_ids).clip(max=max(len(ids) - 1, 0))
+    known = ids[positions] == booked_ids if len(ids) else np.zeros(len(booked_ids), bool)
+    sold = np.zeros(len(ids), dtype=np.int64)
+    first = np.zeros(len(ids), dtype=np.int64)
+    sold[positions[known]] = sold_counts[known]
+    first[positions[known]] = starts[known]
+
+    # Hours from an event's first booking to the one that sold half its seats
+    half = -(-capacity // 2)
+    reached = (capacity > 0) & (sold >= half)
+    hours_to_half = np.full(len(ids), np.nan)
+    hours_to_half[reached] = (seconds[first[reached] + half[reached] - 1] - seconds[first[reached]]) / 3600
+
+    rows = []
+    for category, label in Event.CATEGORY_CHOICES:
+        mask = categories == category
+        if not mask.any():
+            continue
+        seats, tickets = int(capacity[mask].sum()), int(sold[mask].sum())
+        times = hours_to_half[mask & reached]
+        rows.append({
+            'category': category,
+            'label': label,
+            'events': int(mask.sum()),
+            'capacity': seats,
+            'sold': tickets,
+            'fill_rate': tickets / seats if seats else None,
+            'sold_out_share': float(((remaining <= 0) & (capacity > 0))[mask].mean()),
+            'median_hours_to_half': float(np.median(times)) if len(times) else None,
+        })
+    rows.sort(key=lambda row: (row['fill_rate'] is None, -(row['fill_rate'] or 0), row['category']))
+    return rows
+
+
+def overview():
+    """``{'categories', 'heatmap'}`` across all events."""
+    event_ids, seconds = all_bookings()
+    return {
+        'categories': category_demand(event_ids, seconds),
+        'heatmap': heatmap_rows(heatmap(seconds)),
+    }
+
+
+def refresh_overview():
+    """Recompute the overview and store it as the dashboard snapshot."""
+    return snapshots.store(OVERVIEW_SNAPSHOT, overview())
+
+
+def stored_overview():
+    """The last stored overview with its ``computed_at``, or None before the first refresh."""
+    return snapshots.load(OVERVIEW_SNAPSHOT)
@@ -0,0 +1,300 @@
+"""
+Full-text event search.
+
+Events are indexed on title, description, location and department name in a
+side table kept next to ``mainapp_event``:
+
+* SQLite: an FTS5 table ``mainapp_event_fts`` (porter stemming, rowid = event
+  id), ranked with ``bm25``.
+* PostgreSQL: ``mainapp_event_search`` holding a weighted ``tsvector`` per
+  event behind a GIN index, ranked with ``ts_rank``.
+
+Other backends fall back to ``icontains`` over the same fields. The index is
+updated from signals whenever an event or department is saved or deleted;
+``rebuild()`` (the ``rebuild_search_index`` command) repairs it after bulk
+writes that bypass signals. ``search_events()`` is the one API callers use:
+it filters a queryset to the matches and annotates each with a ``rank``
+(higher is better) so results can be ordered and keyset-paginated.
+
+Users get a type-ahead index over username, email, enrollment number and
+name, queried with ``search_users()``. On SQLite it is an FTS5 table with
+prefix indexes (``mainapp_customuser_fts``) maintained by the same signals;
+on PostgreSQL the columns carry ``pg_trgm`` GIN indexes, so plain
+``icontains`` lookups are index scans and nothing extra has to be kept up to
+date.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Case, FloatField, Q, Value, When
+from django.db.models.expressions import RawSQL
+
+SQLITE_TABLE = 'mainapp_event_fts'
+POSTGRES_TABLE = 'mainapp_event_search'
+SQLITE_USER_TABLE = 'mainapp_customuser_fts'
+
+# Fields an index entry is built from; saves touching none of them skip reindexing
+INDEXED_FIELDS = {'title', 'description', 'location', 'department'}
+USER_INDEXED_FIELDS = ('username', 'email', 'enrollment_no', 'first_name', 'last_name')
+
+# Ids per statement when (re)indexing, below SQLite's bound-parameter limit
+BATCH_SIZE = 500
+
+# Column weights: title, description, location, department
+SQLITE_WEIGHTS = (10.0, 1.0, 2.0, 2.0)
+# Column weights, in USER_INDEXED_FIELDS order
+SQLITE_USER_WEIGHTS = (4.0, 2.0, 4.0, 1.0, 1.0)
+
+POSTGRES_DOCUMENT = (
+    "setweight(to_tsvector('english', e.title), 'A') || "
+    "setweight(to_tsvector('english', d.name), 'B') || "
+    "setweight(to_tsvector('english', e.location), 'B') || "
+    "setweight(to_tsvector('english', e.description), 'C')"
+)
+
+
+def _terms(query):
+    return re.findall(r'\w+', query.lower())[:16]
+
+
+def _prefix_match(terms):
+    """FTS5 query matching every term, the last one as a prefix (type-ahead)."""
+    return (' '.join(f'"{term}"' for term in terms[:-1]) + f' "{terms[-1]}"*').strip()
+
+
+class _SQLiteBackend:
+    def index(self, cursor, ids):
+        placeholders = ', '.join(['%s'] * len(ids))
+        cursor.execute(f'DELETE FROM {SQLITE_TABLE} WHERE rowid IN ({placeholders})', ids)
+        cursor.execute(
+            f'INSERT INTO {SQLITE_TABLE} (rowid, title, description, location, department) '
+            f'SELECT e.id, e.title, e.description, e.location, d.name '
+            f'FROM mainapp_event e JOIN mainapp_department d ON d.id = e.department_id '
+            f'WHERE e.id IN ({placeholders})',
+            ids,
+        )
+
+    def remove(self, cursor, ids):
+        placeholders = ', '.join(['%s'] * len(ids))
+        cursor.execute(f'DELETE FROM {SQLITE_TABLE} WHERE rowid IN ({placeholders})', ids)
+
+    def rebuild(self, cursor):
+        cursor.execute(f'DELETE FROM {SQLITE_TABLE}')
+        cursor.execute(
+            f'INSERT INTO {SQLITE_TABLE} (rowid, title, description, location, department) '
+            f'SELECT e.id, e.title, e.description, e.location, d.name '
+            f'FROM mainapp_event e JOIN mainapp_department d ON d.id = e.department_id'
+        )
+
+    def search(self, queryset, terms):
+        weights = ', '.join(str(w) for w in SQLITE_WEIGHTS)
+        return queryset.extra(
+            tables=[SQLITE_TABLE],
+            where=[f'{SQLITE_TABLE}.rowid = mainapp_event.id', f'{SQLITE_TABLE} MATCH %s'],
+            params=[_prefix_match(terms)],
+        ).annotate(rank=RawSQL(f'-bm25({SQLITE_TABLE}, {weights})', [], output_field=FloatField()))
+
+    def index_users(self, cursor, ids):
+        columns = ', '.join(USER_INDEXED_FIELDS)
+        placeholders = ', '.join(['%s'] * len(ids))
+        cursor.execute(f'DELETE FROM {SQLITE_USER_TABLE} WHERE rowid IN ({placeholders})', ids)
+        cursor.execute(
+            f'INSERT INTO {SQLITE_USER_TABLE} (rowid, {columns}) '
+            f'SELECT id, {columns} FROM mainapp_customuser WHERE id IN ({placeholders})',
+            ids,
+        )
+
+    def remove_users(self, cursor, ids):
+        placeholders = ', '.join(['%s'] * len(ids))
+        cursor.execute(f'DELETE FROM {SQLITE_USER_TABLE} WHERE rowid IN ({placeholders})', ids)
+
+    def rebuild_users(self, cursor):
+        columns = ', '.join(USER_INDEXED_FIELDS)
+        cursor.execute(f'DELETE FROM {SQLITE_USER_TABLE}')
+        cursor.execute(f'INSERT INTO {SQLITE_USER_TABLE} (rowid, {columns}) SELECT id, {columns} FROM mainapp_customuser')
+
+    def search_users(self, queryset, terms, candidates=None):
+        weights = ', '.join(str(w) for w in SQLITE_USER_WEIGHTS)
+        match = _prefix_match(terms)
+        if not candidates:
+            return queryset.extra(
+                tables=[SQLITE_USER_TABLE],
+                where=[f'{SQLITE_USER_TABLE}.rowid = mainapp_customuser.id', f'{SQLITE_USER_TABLE} MATCH %s'],
+                params=[match],
+            ).annotate(rank=RawSQL(f'-bm25({SQLITE_USER_TABLE}, {weights})', [], output_field=FloatField()))
+        # Matching is cheap but ranking every match of a short prefix is not:
+        # rank only the first few matches, in one pass over the index
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid, -bm25({SQLITE_USER_TABLE}, {weights}) FROM {SQLITE_USER_TABLE} '
+                f'WHERE {SQLITE_USER_TABLE} MATCH %s LIMIT %s',
+                [match, candidates],
+            )
+            ranks = cursor.fetchall()
+        if not ranks:
+            return queryset.none().annotate(rank=Value(0.0, output_field=FloatField()))
+        cases = ' '.join(['WHEN %s THEN %s'] * len(ranks))
+        return queryset.filter(id__in=[pk for pk, _ in ranks]).annotate(rank=RawSQL(
+            f'CASE mainapp_customuser.id {cases} END', [value for pair in ranks for value in pair],
+            output_field=FloatField(),
+        ))
+
+
+class _LookupUsersMixin:
+    """User search as plain lookups; on PostgreSQL these hit the trigram indexes."""
+
+    def index_users(self, cursor, ids):
+        pass
+
+    def remove_users(self, cursor, ids):
+        pass
+
+    def rebuild_users(self, cursor):
+        pass
+
+    def search_users(self, queryset, terms, candidates=None):
+        for term in terms:
+            queryset = queryset.filter(
+                Q(username__icontains=term) | Q(email__icontains=term) | Q(enrollment_no__icontains=term) |
+                Q(first_name__icontains=term) | Q(last_name__icontains=term)
+            )
+        first = terms[0]
+        return queryset.annotate(rank=Case(
+            When(Q(username__iexact=first) | Q(enrollment_no__iexact=first), then=Value(2.0)),
+            When(Q(username__istartswith=first) | Q(enrollment_no__istartswith=first) |
+                 Q(email__istartswith=first), then=Value(1.0)),
+            default=Value(0.0),
+            output_field=FloatField(),
+        ))
+
+
+class _PostgresBackend(_LookupUsersMixin):
+    def index(self, cursor, ids):
+        cursor.execute(
+            f'INSERT INTO {POSTGRES_TABLE} (event_id, document) '
+            f'SELECT e.id, {POSTGRES_DOCUMENT} '
+            f'FROM mainapp_event e JOIN mainapp_department d ON d.id = e.department_id '
+            f'WHERE e.id = ANY(%s) '
+            f'ON CONFLICT (event_id) DO UPDATE SET document = EXCLUDED.document',
+            [list(ids)],
+        )
+
+    def remove(self, cursor, ids):
+        cursor.execute(f'DELETE FROM {POSTGRES_TABLE} WHERE event_id = ANY(%s)', [list(ids)])
+
+    def rebuild(self, cursor):
+        cursor.execute(f'TRUNCATE {POSTGRES_TABLE}')
+        cursor.execute(
+            f'INSERT INTO {POSTGRES_TABLE} (event_id, document) '
+            f'SELECT e.id, {POSTGRES_DOCUMENT} '
+            f'FROM mainapp_event e JOIN mainapp_department d ON d.id = e.department_id'
+        )
+
+    def search(self, queryset, terms):
+        tsquery = ' & '.join(terms[:-1] + [f'{terms[-1]}:*'])
+        return queryset.extra(
+            tables=[POSTGRES_TABLE],
+            where=[
+                f'{POSTGRES_TABLE}.event_id = mainapp_event.id',
+                f"{POSTGRES_TABLE}.document @@ to_tsquery('english', %s)",
+            ],
+            params=[tsquery],
+        ).annotate(rank=RawSQL(
+            f"ts_rank({POSTGRES_TABLE}.document, to_tsquery('english', %s))", [tsquery], output_field=FloatField()
+        ))
+
+
+class _FallbackBackend(_LookupUsersMixin):
+    def index(self, cursor, ids):
+        pass
+
+    def remove(self, cursor, ids):
+        pass
+
+    def rebuild(self, cursor):
+        pass
+
+    def search(self, queryset, terms):
+        for term in terms:
+            queryset = queryset.filter(
+                Q(title__icontains=term) | Q(description__icontains=term) |
+                Q(location__icontains=term) | Q(department__name__icontains=term)
+            )
+        return queryset.annotate(rank=Value(0.0, output_field=FloatField()))
+
+
+_BACKENDS = {'sqlite': _SQLiteBackend(), 'postgresql': _PostgresBackend()}
+
+
+def backend():
+    return _BACKENDS.get(connection.vendor, _FallbackBackend())
+
+
+def _batches(ids):
+    ids = list(ids)
+    for start in range(0, len(ids), BATCH_SIZE):
+        yield ids[start:start + BATCH_SIZE]
+
+
+def index_events(ids):
+    """(Re)index the events with these ids."""
+    with connection.cursor() as cursor:
+        for batch in _batches(ids):
+            backend().index(cursor, batch)
+
+
+def remove_events(ids):
+    with connection.cursor() as cursor:
+        for batch in _batches(ids):
+            backend().remove(cursor, batch)
+
+
+def rebuild():
+    """Reindex every event from scratch."""
+    with connection.cursor() as cursor:
+        backend().rebuild(cursor)
+
+
+def search_events(queryset, query):
+    """
+    Narrow ``queryset`` to events matching every word of ``query``, annotated
+    with ``rank`` (higher is more relevant). Order by ``('-rank', 'id')``.
+    """
+    terms = _terms(query)
+    if not terms:
+        return queryset.annotate(rank=Value(0.0, output_field=FloatField()))
+    return backend().search(queryset, terms)
+
+
+def index_users(ids):
+    """(Re)index the users with these ids."""
+    with connection.cursor() as cursor:
+        for batch in _batches(ids):
+            backend().index_users(cursor, batch)
+
+
+def remove_users(ids):
+    with connection.cursor() as cursor:
+        for batch in _batches(ids):
+            backend().remove_users(cursor, batch)
+
+
+def rebuild_users():
+    """Reindex every user from scratch."""
+    with connection.cursor() as cursor:
+        backend().rebuild_users(cursor)
+
+
+def search_users(queryset, query, candidates=None):
+    """
+    Narrow ``queryset`` to users matching every word of ``query`` in their
+    username, email, enrollment number or name, the last word as a prefix.
+    Annotated with ``rank`` like ``search_events()``.
+
+    For type-ahead, ``candidates`` bounds how many matches get ranked; short
+    prefixes then return good matches quickly rather than the very best ones.
+    """
+    terms = _terms(query)
+    if not terms:
+        return queryset.annotate(rank=Value(0.0, output_field=FloatField()))
+    return backend().search_users(queryset, terms, candidates)
@@ -0,0 +1,138 @@
+from django.db import models
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import images, search, stats, waitlist
+from .booking import release_seat, take_seat
+from .models import CustomUser, Department, Event, Ticket
+
+
+def _has_waitlist(event_id):
+    return Event.objects.filter(pk=event_id, waitlist_tail__gt=models.F('waitlist_served')).exists()
+
+
+@receiver(post_delete, sender=Ticket)
+def release_ticket_seat(sender, instance, **kwargs):
+    release_seat(instance.event_id)
+    stats.tickets_added(instance.event, -1)
+    if _has_waitlist(instance.event_id):
+        waitlist.schedule_promotion(instance.event_id)
+
+
+@receiver(post_save, sender=Ticket)
+def count_ticket(sender, instance, created, **kwargs):
+    # Every ticket holds one seat of its event, however it was saved: the
+    # booking engine claims it up front, anything else takes it here
+    if created:
+        if not instance.__dict__.pop('_seat_claimed', False):
+            take_seat(instance.event_id)
+        stats.tickets_added(instance.event)
+    else:
+        moved_from = getattr(instance, '_loaded_event_id', instance.event_id)
+        if moved_from == instance.event_id:
+            return
+        previous = Event.objects.filter(pk=moved_from).first()
+        release_seat(moved_from)
+        take_seat(instance.event_id)
+        if previous is not None:
+            stats.tickets_added(previous, -1)
+        stats.tickets_added(instance.event)
+        if _has_waitlist(moved_from):
+            waitlist.schedule_promotion(moved_from)
+    instance._loaded_event_id = instance.event_id
+
+
+@receiver(post_save, sender=Event)
+def promote_on_capacity_raise(sender, instance, created, **kwargs):
+    if not created and getattr(instance, '_capacity_raised', False) and _has_waitlist(instance.pk):
+        waitlist.schedule_promotion(instance.pk)
+
+
+@receiver(post_save, sender=Event)
+def index_event(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or search.INDEXED_FIELDS.intersection(update_fields):
+        search.index_events([instance.pk])
+
+
+@receiver(post_delete, sender=Event)
+def unindex_event(sender, instance, **kwargs):
+    search.remove_events([instance.pk])
+
+
+@receiver(post_save, sender=Department)
+def reindex_department_events(sender, instance, created, **kwargs):
+    if not created:
+        search.index_events(instance.events.values_list('id', flat=True))
+
+
+@receiver(post_save, sender=Department)
+def touch_department_events(sender, instance, created, **kwargs):
+    # Cached event cards show the department name
+    if not created:
+        instance.events.update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=CustomUser)
+def index_user(sender, instance, update_fields=None, **kwargs):
+    # Skips the last_login-only save made on every login
+    if update_fields is None or set(search.USER_INDEXED_FIELDS).intersection(update_fields):
+        search.index_users([instance.pk])
+
+
+@receiver(post_delete, sender=CustomUser)
+def unindex_user(sender, instance, **kwargs):
+    search.remove_users([instance.pk])
+
+
+@receiver(post_save, sender=Event)
+def count_event(sender, instance, created, **kwargs):
+    stats.event_saved(instance, created)
+
+
+@receiver(post_delete, sender=Event)
+def uncount_event(sender, instance, **kwargs):
+    stats.event_removed(instance)
+
+
+@receiver(post_save, sender=CustomUser)
+def count_user(sender, instance, created, **kwargs):
+    stats.user_saved(instance, created)
+
+
+@receiver(post_delete, sender=CustomUser)
+def uncount_user(sender, instance, **kwargs):
+    stats.user_removed(instance)
+
+
+@receiver(post_delete, sender=Department)
+def uncount_department(sender, instance, **kwargs):
+    stats.department_removed(instance.pk)
+
+
+def _saves_field(update_fields, field):
+    # A save limited to other fields (e.g. last_login on each login) can't have changed the image
+    return update_fields is None or field in update_fields
+
+
+@receiver(pre_save, sender=Event)
+def digest_event_image(sender, instance, update_fields=None, **kwargs):
+    if not _saves_field(update_fields, 'image'):
+        return
+    if images.update_digest(instance, 'image', 'image_digest'):
+        instance._new_image_digest = instance.image_digest
+
+
+@receiver(pre_save, sender=CustomUser)
+def digest_profile_image(sender, instance, update_fields=None, **kwargs):
+    if not _saves_field(update_fields, 'profile_image'):
+        return
+    if images.update_digest(instance, 'profile_image', 'profile_image_digest'):
+        instance._new_image_digest = instance.profile_image_digest
+
+
+@receiver(post_save, sender=Event)
+@receiver(post_save, sender=CustomUser)
+def render_image_variants(sender, instance, **kwargs):
+    # Scheduled after the row is written so the renderer can find the original
+    images.schedule(instance.__dict__.pop('_new_image_digest', None))
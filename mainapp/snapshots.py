@@ -0,0 +1,31 @@
+"""
+Precomputed dashboard payloads, shared by every worker.
+
+The default cache is per process unless ``REDIS_URL`` is set, so a payload a
+cron command put there would never reach the Gunicorn workers. Snapshots are
+``Snapshot`` rows instead: ``store()`` upserts one, ``load()`` reads it back
+in one primary-key query. Payloads must be JSON-serializable; their
+``computed_at`` is kept in its own column and added back on load.
+"""
+from datetime import timedelta
+
+from django.utils import timezone
+
+from .models import Snapshot
+
+
+def store(name, data):
+    """Save ``data`` as snapshot ``name``; returns it with its ``computed_at``."""
+    computed_at = timezone.now()
+    Snapshot.objects.update_or_create(name=name, defaults={'data': data, 'computed_at': computed_at})
+    return {'computed_at': computed_at, **data}
+
+
+def load(name, max_age=None):
+    """Snapshot ``name`` with its ``computed_at``, or None if missing or older than ``max_age`` seconds."""
+    row = Snapshot.objects.filter(name=name).first()
+    if row is None:
+        return None
+    if max_age is not None and row.computed_at < timezone.now() - timedelta(seconds=max_age):
+        return None
+    return {'computed_at': row.computed_at, **row.data}
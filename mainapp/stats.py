@@ -0,0 +1,206 @@
+"""
+Materialized dashboard statistics.
+
+The dashboards used to count users, events and tickets on every page load.
+Instead ``StatCounter`` holds one row per bucket -- the ``total``, each
+department, event category and user role, and each event day -- with its
+user, event and ticket counts. Signals and the bulk ticket paths adjust the
+counters with relative UPDATEs as rows come and go, and ``snapshot()`` reads
+everything a dashboard needs in a single query.
+
+"Upcoming events" is the sum of the event-day buckets from today on, so an
+event counts as upcoming until the end of its day.
+
+Writes that bypass signals (``QuerySet.update()``, ``bulk_create`` of users or
+events, raw SQL) are not seen; ``rebuild()`` recounts everything and
+``verify()`` reports drift. Both are exposed by the ``rebuild_stats`` command.
+"""
+from collections import defaultdict
+
+from django.db import IntegrityError, models, transaction
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import CustomUser, Event, StatCounter, Ticket
+
+COUNTS = ('users', 'events', 'tickets')
+
+
+class Snapshot:
+    """Dashboard numbers as of one read of the counter table."""
+
+    def __init__(self, rows, today):
+        self._rows = {(row.scope, row.key): row for row in rows}
+        self.upcoming_events = sum(
+            row.events for (scope, key), row in self._rows.items() if scope == 'day' and key >= today
+        )
+
+    def get(self, scope, key, count):
+        row = self._rows.get((scope, str(key)))
+        return getattr(row, count) if row is not None else 0
+
+    @property
+    def total_users(self):
+        return self.get('total', '', 'users')
+
+    @property
+    def total_events(self):
+        return self.get('total', '', 'events')
+
+    @property
+    def total_bookings(self):
+        return self.get('total', '', 'tickets')
+
+    def breakdown(self, scope):
+        """``{key: {'users': .., 'events': .., 'tickets': ..}}`` for one scope."""
+        return {
+            key: {count: getattr(row, count) for count in COUNTS}
+            for (row_scope, key), row in self._rows.items() if row_scope == scope
+        }
+
+
+def snapshot():
+    today = timezone.localdate().isoformat()
+    rows = list(StatCounter.objects.exclude(scope='day', key__lt=today))
+    if not any(row.scope == 'total' for row in rows):
+        # First use (or the table was cleared): count once
+        rebuild()
+        rows = list(StatCounter.objects.exclude(scope='day', key__lt=today))
+    return Snapshot(rows, today)
+
+
+def _bump(scope, key, **deltas):
+    deltas = {count: delta for count, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    key = '' if key is None else str(key)
+    changes = {count: models.F(count) + delta for count, delta in deltas.items()}
+    if StatCounter.objects.filter(scope=scope, key=key).update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            StatCounter.objects.create(scope=scope, key=key, **deltas)
+    except IntegrityError:
+        # Created by a concurrent request in the meantime
+        StatCounter.objects.filter(scope=scope, key=key).update(**changes)
+
+
+def _event_buckets(department_id, category, day):
+    buckets = [('total', ''), ('department', department_id), ('category', category)]
+    return buckets, ('day', day.isoformat() if day else None)
+
+
+def tickets_added(event, count=1):
+    """``count`` tickets of ``event`` were created (negative: deleted)."""
+    buckets, _ = _event_buckets(event.department_id, event.category, None)
+    for scope, key in buckets:
+        _bump(scope, key, tickets=count)
+
+
+def event_saved(event, created):
+    current = event.stats_buckets()
+    previous = None if created else getattr(event, '_loaded_stats', None)
+    if current == previous or current is None:
+        return
+    booked = 0
+    if previous is not None:
+        # Moved to another department, category or day; rare enough to count
+        booked = Ticket.objects.filter(event=event).count()
+        event_removed(event, previous, booked=booked)
+    buckets, day = _event_buckets(*current)
+    for scope, key in buckets:
+        _bump(scope, key, events=1, tickets=booked)
+    if day[1]:
+        _bump(*day, events=1)
+    event._loaded_stats = current
+
+
+def event_removed(event, buckets=None, booked=0):
+    """Take ``event`` out of ``buckets`` (default: where it is now) with ``booked`` tickets."""
+    buckets, day = _event_buckets(*(buckets or event.stats_buckets()))
+    for scope, key in buckets:
+        _bump(scope, key, events=-1, tickets=-booked)
+    if day[1]:
+        _bump(*day, events=-1)
+
+
+def user_saved(user, created):
+    current = user.stats_buckets()
+    previous = None if created else getattr(user, '_loaded_stats', None)
+    if current == previous or current is None:
+        return
+    if previous is not None:
+        user_removed(user, previous)
+    department_id, role = current
+    _bump('total', '', users=1)
+    _bump('department', department_id, users=1)
+    _bump('role', role, users=1)
+    user._loaded_stats = current
+
+
+def user_removed(user, buckets=None):
+    department_id, role = buckets or user.stats_buckets()
+    _bump('total', '', users=-1)
+    _bump('department', department_id, users=-1)
+    _bump('role', role, users=-1)
+
+
+def department_removed(department_id):
+    """Its users were detached (``SET_NULL``) without signals; move their count."""
+    row = StatCounter.objects.filter(scope='department', key=str(department_id)).first()
+    if row is not None:
+        _bump('department', '', users=row.users)
+        row.delete()
+
+
+def count():
+    """The true counters, computed from the base tables."""
+    counters = defaultdict(lambda: dict.fromkeys(COUNTS, 0))
+
+    def add(scope, rows, count):
+        for key, n in rows:
+            counters[(scope, '' if key is None else str(key))][count] += n
+
+    users = CustomUser.objects.order_by()
+    add('total', [('', users.count())], 'users')
+    add('department', users.values_list('department_id').annotate(n=models.Count('pk')), 'users')
+    add('role', users.values_list('role').annotate(n=models.Count('pk')), 'users')
+
+    events = Event.objects.order_by()
+    add('total', [('', events.count())], 'events')
+    add('department', events.values_list('department_id').annotate(n=models.Count('pk')), 'events')
+    add('category', events.values_list('category').annotate(n=models.Count('pk')), 'events')
+    days = events.annotate(day=TruncDate('date')).values_list('day').annotate(n=models.Count('pk'))
+    add('day', [(day.isoformat(), n) for day, n in days if day], 'events')
+
+    tickets = Ticket.objects.order_by()
+    add('total', [('', tickets.count())], 'tickets')
+    add('department', tickets.values_list('event__department_id').annotate(n=models.Count('pk')), 'tickets')
+    add('category', tickets.values_list('event__category').annotate(n=models.Count('pk')), 'tickets')
+    return counters
+
+
+def verify():
+    """``[(scope, key, stored, actual)]`` for every counter row that has drifted."""
+    actual = count()
+    stored = {(row.scope, row.key): row for row in StatCounter.objects.all()}
+    drift = []
+    for bucket in sorted(set(actual) | set(stored)):
+        want = actual.get(bucket, dict.fromkeys(COUNTS, 0))
+        row = stored.get(bucket)
+        have = {c: getattr(row, c) for c in COUNTS} if row is not None else dict.fromkeys(COUNTS, 0)
+        if want != have:
+            drift.append((bucket[0], bucket[1], have, want))
+    return drift
+
+
+@transaction.atomic
+def rebuild():
+    """Recount every counter from the base tables; returns the number of rows."""
+    counters = count()
+    counters.setdefault(('total', ''), dict.fromkeys(COUNTS, 0))
+    StatCounter.objects.all().delete()
+    StatCounter.objects.bulk_create([
+        StatCounter(scope=scope, key=key, **values) for (scope, key), values in counters.items()
+    ])
+    return len(counters)
@@ -0,0 +1,11 @@
+from django import template
+
+from mainapp import fragments
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def event_cards(context, events, template_name):
+    """Render ``events`` with the card ``template_name`` through the fragment cache."""
+    return fragments.render_cards(events, template_name, context['request'].user)
@@ -0,0 +1,25 @@
+from django import template
+from django.urls import reverse
+from django.utils.html import format_html
+
+register = template.Library()
+
+
+@register.simple_tag
+def image_variant(image, digest, variant, alt='', css=''):
+    """
+    ``<picture>`` serving ``variant`` of ``image`` (see ``mainapp.images``) as
+    WebP with a JPEG fallback; the original if its digest is not known yet.
+    """
+    if not image:
+        return ''
+    if not digest:
+        return format_html('<img src="{}" alt="{}" class="{}" loading="lazy">', image.url, alt, css)
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}">'
+        '<img src="{}" alt="{}" class="{}" loading="lazy"></picture>',
+        reverse('image_variant', args=[digest, variant, 'webp']),
+        reverse('image_variant', args=[digest, variant, 'jpg']),
+        alt,
+        css,
+    )
@@ -1,3 +1,1673 @@
-from django.test import TestCase
+import csv
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import close_old_connections, connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from . import (
+    admission, analytics, api, booking, checkin, exports, forecasts, fragments, gate_snapshot, images, qr,
+    recommendations, sales, search, stats, ticket_codes, uploads, waitlist,
+)
+from .models import (
+    BookingCurve, CustomUser, Department, Event, IdempotencyKey, QRRenderJob, Recommendation, SellOutForecast,
+    Snapshot, StatCounter, SystemLog, Ticket, WaitlistEntry,
+)
+
+TEST_MEDIA_ROOT = tempfile.mkdtemp(prefix='unishowtime-media-')
+
+
+def tearDownModule():
+    shutil.rmtree(TEST_MEDIA_ROOT, ignore_errors=True)
+
+
+def make_event(department, creator, **kwargs):
+    defaults = {
+        'title': 'Spring Music Festival',
+        'description': 'Annual music festival.',
+        'date': timezone.now() + timedelta(days=7),
+        'location': 'Main Auditorium',
+        'available_tickets': 10,
+        'department': department,
+        'created_by': creator,
+        'category': 'concert',
+    }
+    defaults.update(kwargs)
+    return Event.objects.create(**defaults)
+
+
+def make_students(count, department=None, prefix='booker'):
+    return CustomUser.objects.bulk_create([
+        CustomUser(
+            username=f'{prefix}{i}',
+            email=f'{prefix}{i}@unishowtime.com',
+            password=make_password(None),
+            role='student',
+            enrollment_no=f'{prefix[:2].upper()}{i:05d}',
+            department=department,
+        )
+        for i in range(count)
+    ])
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT)
+class BookingEngineTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.department = Department.objects.create(name='Test Faculty', code='TST')
+        cls.admin = CustomUser.objects.create_user('organizer', password='x', role='admin')
+        cls.students = make_students(3, cls.department)
+
+    def test_new_event_starts_with_full_capacity(self):
+        event = make_event(self.department, self.admin, available_tickets=5)
+        self.assertEqual(event.seats_remaining, 5)
+        self.assertEqual(event.tickets_left(), 5)
+
+    def test_booking_decrements_counter(self):
+        event = make_event(self.department, self.admin, available_tickets=2)
+        result = booking.book(event, self.students[0])
+        self.assertEqual(result.status, booking.BOOKED)
+        event.refresh_from_db()
+        self.assertEqual(event.tickets_left(), 1)
+
+    def test_duplicate_booking_returns_existing_ticket(self):
+        event = make_event(self.department, self.admin, available_tickets=2)
+        first = booking.book(event, self.students[0])
+        second = booking.book(event, self.students[0])
+        self.assertEqual(second.status, booking.DUPLICATE)
+        self.assertEqual(second.ticket, first.ticket)
+        event.refresh_from_db()
+        self.assertEqual(event.tickets_left(), 1)
+
+    def test_sold_out(self):
+        event = make_event(self.department, self.admin, available_tickets=1)
+        booking.book(event, self.students[0])
+        result = booking.book(event, self.students[1])
+        self.assertEqual(result.status, booking.SOLD_OUT)
+        self.assertEqual(Ticket.objects.filter(event=event).count(), 1)
+
+    def test_deleting_ticket_releases_seat(self):
+        event = make_event(self.department, self.admin, available_tickets=1)
+        booking.book(event, self.students[0]).ticket.delete()
+        event.refresh_from_db()
+        self.assertEqual(event.tickets_left(), 1)
+
+    def test_admin_cannot_edit_counters(self):
+        superuser = CustomUser.objects.create_superuser('counterboss', password='x', role='superadmin')
+        self.client.force_login(superuser)
+        event = make_event(self.department, self.admin)
+        for url in (reverse('admin:mainapp_event_add'), reverse('admin:mainapp_event_change', args=[event.pk])):
+            response = self.client.get(url)
+            for field in ('seats_remaining', 'waitlist_tail', 'waitlist_served', 'image_digest'):
+                self.assertNotContains(response, f'name="{field}"')
+
+    def test_tickets_created_outside_the_engine_hold_a_seat(self):
+        event, other = (make_event(self.department, self.admin, available_tickets=2) for _ in range(2))
+        ticket = Ticket.objects.create(event=event, user=self.students[0])
+        event.refresh_from_db()
+        self.assertEqual(event.tickets_left(), 1)
+
+        ticket = Ticket.objects.get(pk=ticket.pk)
+        ticket.event = other
+        ticket.save()
+        event.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual((event.tickets_left(), other.tickets_left()), (2, 1))
+
+        ticket.delete()
+        other.refresh_from_db()
+        self.assertEqual(other.tickets_left(), 2)
+
+    def test_retried_key_replays_first_result(self):
+        event = make_event(self.department, self.admin, available_tickets=2)
+        first = booking.book(event, self.students[0], idempotency_key='k1')
+        with self.assertNumQueries(1):
+            retry = booking.book(event, self.students[0], idempotency_key='k1')
+        self.assertTrue(retry.replayed)
+        self.assertEqual((retry.status, retry.ticket), (booking.BOOKED, first.ticket))
+
+    def test_expired_key_books_again(self):
+        event = make_event(self.department, self.admin, available_tickets=1)
+        booking.book(event, self.students[0], idempotency_key='k1')
+        IdempotencyKey.objects.update(created_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(booking.purge_idempotency_keys(), 1)
+        result = booking.book(event, self.students[1], idempotency_key='k1')
+        self.assertEqual(result.status, booking.SOLD_OUT)
+        self.assertFalse(result.replayed)
+
+    def test_key_of_cancelled_ticket_or_other_event_books_again(self):
+        event, other = (make_event(self.department, self.admin, available_tickets=2) for _ in range(2))
+        booking.book(event, self.students[0], idempotency_key='k1').ticket.delete()
+        result = booking.book(event, self.students[0], idempotency_key='k1')
+        self.assertEqual((result.status, result.replayed), (booking.BOOKED, False))
+        result = booking.book(other, self.students[0], idempotency_key='k1')
+        self.assertEqual((result.status, result.replayed, result.ticket.event), (booking.BOOKED, False, other))
+
+    def test_resubmitted_form_after_cancelling(self):
+        event = make_event(self.department, self.admin, available_tickets=2)
+        self.client.force_login(self.students[0])
+        url = reverse('book_ticket', args=[event.id])
+        self.client.post(url, {'idempotency_key': 'abc'})
+        Ticket.objects.get(event=event).delete()
+        response = self.client.post(url, {'idempotency_key': 'abc'})
+        ticket = Ticket.objects.get(event=event)
+        self.assertRedirects(response, reverse('qr_view', args=[ticket.id]), fetch_redirect_response=False)
+
+    def test_double_submitted_form_shows_the_same_ticket(self):
+        event = make_event(self.department, self.admin, available_tickets=2)
+        self.client.force_login(self.students[0])
+        url = reverse('book_ticket', args=[event.id])
+        first = self.client.post(url, {'idempotency_key': 'abc'})
+        second = self.client.post(url, {'idempotency_key': 'abc'})
+        ticket = Ticket.objects.get(event=event)
+        self.assertRedirects(first, reverse('qr_view', args=[ticket.id]), fetch_redirect_response=False)
+        self.assertRedirects(second, reverse('qr_view', args=[ticket.id]), fetch_redirect_response=False)
+        event.refresh_from_db()
+        self.assertEqual(event.tickets_left(), 1)
+
+    def test_capacity_change_keeps_bookings(self):
+        event = make_event(self.department, self.admin, available_tickets=3)
+        booking.book(event, self.students[0])
+        stale = Event.objects.get(pk=event.pk)
+        booking.book(event, self.students[1])
+        stale.available_tickets = 5
+        stale.save()
+        event.refresh_from_db()
+        self.assertEqual(event.tickets_left(), 3)
+
+    def test_recount_seats(self):
+        event = make_event(self.department, self.admin, available_tickets=3)
+        booking.book(event, self.students[0])
+        Event.objects.filter(pk=event.pk).update(seats_remaining=0)
+        booking.recount_seats()
+        event.refresh_from_db()
+        self.assertEqual(event.tickets_left(), 2)
+
+    def test_book_ticket_view(self):
+        event = make_event(self.department, self.admin, available_tickets=1)
+        self.client.force_login(self.students[0])
+        response = self.client.post(reverse('book_ticket', args=[event.id]))
+        ticket = Ticket.objects.get(event=event)
+        self.assertRedirects(response, reverse('qr_view', args=[ticket.id]), fetch_redirect_response=False)
+
+        self.client.force_login(self.students[1])
+        response = self.client.post(reverse('book_ticket', args=[event.id]))
+        self.assertRedirects(response, reverse('event_details', args=[event.id]), fetch_redirect_response=False)
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT, TICKET_QR_MODE='file')
+class QRRenderQueueTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.department = Department.objects.create(name='Test Faculty', code='TST')
+        cls.admin = CustomUser.objects.create_user('organizer', password='x', role='admin')
+        cls.students = make_students(3, cls.department)
+        cls.event = make_event(cls.department, cls.admin)
+
+    def test_booking_leaves_qr_pending(self):
+        ticket = booking.book(self.event, self.students[0]).ticket
+        self.assertEqual(ticket.qr_status, 'pending')
+        self.assertFalse(ticket.qr_code)
+        self.assertEqual(ticket.qr_job.status, 'PENDING')
+
+    def test_process_batch_renders_pending_jobs(self):
+        for student in self.students:
+            booking.book(self.event, student)
+        self.assertEqual(qr.process_batch(batch_size=2), 2)
+        self.assertEqual(qr.process_batch(batch_size=2), 1)
+        self.assertEqual(qr.process_batch(batch_size=2), 0)
+        self.assertFalse(Ticket.objects.exclude(qr_status='ready').exists())
+        self.assertFalse(QRRenderJob.objects.exclude(status='COMPLETED').exists())
+
+    def test_jobs_of_a_dead_worker_are_reclaimed(self):
+        first, second = (booking.book(self.event, student).ticket for student in self.students[:2])
+        self.assertEqual(len(qr.claim_jobs(10)), 2)
+        self.assertEqual(qr.claim_jobs(10), [])
+        QRRenderJob.objects.update(updated_at=timezone.now() - qr.CLAIM_TIMEOUT - timedelta(seconds=1))
+        QRRenderJob.objects.filter(ticket=second).update(attempts=qr.MAX_ATTEMPTS)
+        self.assertEqual([job.ticket_id for job in qr.claim_jobs(10)], [first.pk])
+        second.refresh_from_db()
+        self.assertEqual((second.qr_job.status, second.qr_status), ('FAILED', 'failed'))
+
+    def test_qr_view_renders_on_demand(self):
+        ticket = booking.book(self.event, self.students[0]).ticket
+        self.client.force_login(self.students[0])
+        response = self.client.get(reverse('qr_view', args=[ticket.id]))
+        self.assertEqual(response.status_code, 200)
+        ticket.refresh_from_db()
+        self.assertTrue(ticket.qr_ready)
+        self.assertEqual(qr.process_batch(), 0)
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT, TICKET_QR_MODE='stateless')
+class StatelessQRTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.department = Department.objects.create(name='Test Faculty', code='TST')
+        cls.admin = CustomUser.objects.create_user('organizer', password='x', role='admin')
+        cls.student = make_students(1, cls.department)[0]
+        cls.event = make_event(cls.department, cls.admin)
+
+    def test_booking_stores_nothing(self):
+        ticket = booking.book(self.event, self.student).ticket
+        self.assertTrue(ticket.qr_ready)
+        self.assertFalse(ticket.qr_code)
+        self.assertFalse(QRRenderJob.objects.exists())
+
+    def test_qr_image_is_cacheable(self):
+        ticket = booking.book(self.event, self.student).ticket
+        url = reverse('qr_image', args=[qr.ticket_token(ticket)])
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertIn('immutable', response['Cache-Control'])
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_forged_token_is_rejected(self):
+        ticket = booking.book(self.event, self.student).ticket
+        with self.settings(SECRET_KEY='someone-else'):
+            token = qr.ticket_token(ticket)
+        response = self.client.get(reverse('qr_image', args=[token]))
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT, ADMISSION_CONTROL=False)
+class ListingQueryCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.department = Department.objects.create(name='Test Faculty', code='TST')
+        cls.superuser = CustomUser.objects.create_superuser('root', password='x', role='admin')
+        cls.student = make_students(1, cls.department)[0]
+
+    def add_events(self, count):
+        for i in range(count):
+            event = make_event(self.department, self.superuser, title=f'Event {i}')
+            booking.book(event, self.student)
+            past = make_event(self.department, self.superuser, date=timezone.now() - timedelta(days=7))
+            booking.book(past, self.student)
+
+    def count_queries(self, user, url, rows):
+        self.add_events(rows)
+        self.client.force_login(user)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return len(queries)
+
+    def assertConstantQueries(self, user, url):
+        few = self.count_queries(user, url, 2)
+        many = self.count_queries(user, url, 20)
+        self.assertEqual(few, many, f'{url} runs a query per row')
+
+    def test_admin_dashboard(self):
+        self.assertConstantQueries(self.superuser, reverse('admin_dashboard'))
+
+    def test_filter_events(self):
+        self.assertConstantQueries(self.superuser, reverse('filter_events'))
+
+    def test_student_dashboard(self):
+        self.assertConstantQueries(self.student, reverse('student_dashboard'))
+
+    def test_user_details(self):
+        self.assertConstantQueries(self.superuser, reverse('admin_user_details', args=[self.student.id]))
+        self.assertConstantQueries(self.superuser, reverse('admin_user_details', args=[self.superuser.id]))
+
+    def test_event_changelist(self):
+        self.assertConstantQueries(self.superuser, reverse('admin:mainapp_event_changelist'))
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT, LISTING_PAGE_SIZE=3)
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.department = Department.objects.create(name='Test Faculty', code='TST')
+        cls.superuser = CustomUser.objects.create_superuser('root', password='x', role='superadmin')
+        make_students(7, cls.department)
+        same_day = timezone.now() + timedelta(days=3)
+        for i in range(8):
+            make_event(cls.department, cls.superuser, title=f'Event {i}', date=same_day + timedelta(days=i // 3))
+        SystemLog.objects.bulk_create([
+            SystemLog(level='INFO', log_type='ADMIN', event=f'Log {i}', details='') for i in range(8)
+        ])
+
+    def setUp(self):
+        self.client.force_login(self.superuser)
+
+    def walk(self, url, headers=None):
+        seen, cursor, queries = [], None, []
+        while True:
+            params = {'cursor': cursor} if cursor else {}
+            with CaptureQueriesContext(connection) as captured:
+                data = self.client.get(url, params, headers=headers or {}).json()
+            queries.append(len(captured))
+            seen.extend(int(pk) for pk in re.findall(r'data-pk="(\d+)"', data['html']))
+            cursor = data['next_cursor']
+            if cursor is None:
+                break
+        self.assertEqual(len(seen), len(set(seen)))
+        self.assertEqual(len(set(queries)), 1, 'later pages cost more queries than the first')
+        return seen
+
+    def test_events_follow_listing_order(self):
+        seen = self.walk(reverse('filter_events'))
+        expected = list(Event.objects.order_by('-date', '-id').values_list('id', flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_users_follow_listing_order(self):
+        seen = self.walk(reverse('filter_users'))
+        self.assertEqual(seen, list(CustomUser.objects.order_by('id').values_list('id', flat=True)))
+
+    def test_logs_follow_listing_order(self):
+        seen = self.walk(reverse('admin_logs'), {'X-Requested-With': 'XMLHttpRequest'})
+        self.assertEqual(seen, list(SystemLog.objects.order_by('-timestamp', '-id').values_list('id', flat=True)))
+
+    def test_page_size_is_capped(self):
+        data = self.client.get(reverse('filter_users'), {'limit': 1000}).json()
+        self.assertEqual(data['html'].count('data-pk='), 3)
+        data = self.client.get(reverse('filter_users'), {'limit': 2}).json()
+        self.assertEqual(data['html'].count('data-pk='), 2)
+
+    def test_tampered_cursor_is_rejected(self):
+        response = self.client.get(reverse('filter_events'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT)
+class EventSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.department = Department.objects.create(name='Robotics Faculty', code='ROB')
+        cls.other = Department.objects.create(name='Arts Faculty', code='ART')
+        cls.superuser = CustomUser.objects.create_superuser('root', password='x', role='superadmin')
+        cls.festival = make_event(cls.other, cls.superuser, title='Spring Music Festival')
+        cls.talk = make_event(
+            cls.other, cls.superuser, title='Guest Lecture', description='A talk on music theory.', location='Hall 2'
+        )
+        cls.robots = make_event(
+            cls.department, cls.superuser, title='Bot Wars', description='Robot combat.', location='Open Air Theatre'
+        )
+
+    def matches(self, query):
+        return list(search.search_events(Event.objects.all(), query).order_by('-rank', 'id'))
+
+    def test_searches_every_indexed_field(self):
+        self.assertEqual(self.matches('festivals'), [self.festival])
+        self.assertEqual(self.matches('hall'), [self.talk])
+        self.assertEqual(self.matches('robotics'), [self.robots])
+        self.assertEqual(self.matches('open theatre'), [self.robots])
+        self.assertEqual(self.matches('nothing here'), [])
+
+    def test_title_matches_rank_first(self):
+        self.assertEqual(self.matches('music'), [self.festival, self.talk])
+
+    def test_last_word_is_a_prefix(self):
+        self.assertEqual(self.matches('spring mus'), [self.festival])
+
+    def test_index_follows_saves_and_deletes(self):
+        self.festival.title = 'Winter Gala'
+        self.festival.save()
+        self.assertEqual(self.matches('gala'), [self.festival])
+        self.assertEqual(self.matches('spring'), [])
+
+        self.department.name = 'Engineering Faculty'
+        self.department.save()
+        self.assertEqual(self.matches('engineering'), [self.robots])
+
+        self.robots.delete()
+        self.assertEqual(self.matches('engineering'), [])
+
+    def test_rebuild(self):
+        Event.objects.filter(pk=self.talk.pk).update(title='Renamed Without Signals')
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self.matches('renamed'), [self.talk])
+
+    @override_settings(LISTING_PAGE_SIZE=1)
+    def test_filter_events_pages_ranked_results(self):
+        self.client.force_login(self.superuser)
+        first = self.client.get(reverse('filter_events'), {'search': 'music'}).json()
+        self.assertIn(f'data-pk="{self.festival.id}"', first['html'])
+        second = self.client.get(reverse('filter_events'), {'search': 'music', 'cursor': first['next_cursor']}).json()
+        self.assertIn(f'data-pk="{self.talk.id}"', second['html'])
+        self.assertIsNone(second['next_cursor'])
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT, USER_AUTOCOMPLETE_LIMIT=2)
+class UserLookupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create_user('organizer', password='x', role='admin')
+        cls.alice = CustomUser.objects.create_user(
+            'alice99', email='alice.wong@uni.edu', password='x', first_name='Alice', last_name='Wong',
+            enrollment_no='CS2021007',
+        )
+        cls.bob = CustomUser.objects.create_user(
+            'bwong', email='bob@uni.edu', password='x', first_name='Bob', last_name='Wong', enrollment_no='EE2022001',
+        )
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def suggest(self, query):
+        response = self.client.get(reverse('api_user_autocomplete'), {'q': query})
+        self.assertEqual(response.status_code, 200)
+        return [result['username'] for result in response.json()['results']]
+
+    def test_matches_every_indexed_field_by_prefix(self):
+        self.assertEqual(self.suggest('ali'), ['alice99'])
+        self.assertEqual(self.suggest('alice.wong@un'), ['alice99'])
+        self.assertEqual(self.suggest('cs2021'), ['alice99'])
+        self.assertEqual(self.suggest('bob wo'), ['bwong'])
+        self.assertEqual(sorted(self.suggest('wong')), ['alice99', 'bwong'])
+        self.assertEqual(self.suggest('carol'), [])
+
+    def test_results_are_capped(self):
+        CustomUser.objects.create_user('wongfan', password='x')
+        self.assertEqual(len(self.suggest('wong')), 2)
+
+    def test_index_follows_saves_and_deletes(self):
+        self.bob.enrollment_no = 'ME2023005'
+        self.bob.save()
+        self.assertEqual(self.suggest('me2023'), ['bwong'])
+        self.assertEqual(self.suggest('ee2022'), [])
+        self.bob.delete()
+        self.assertEqual(self.suggest('me2023'), [])
+
+    def test_students_are_refused(self):
+        self.client.force_login(self.alice)
+        self.assertEqual(self.client.get(reverse('api_user_autocomplete'), {'q': 'bob'}).status_code, 403)
+
+    def test_filter_users_uses_index(self):
+        data = self.client.get(reverse('filter_users'), {'search': 'EE2022'}).json()
+        self.assertIn(f'data-pk="{self.bob.id}"', data['html'])
+        self.assertNotIn(f'data-pk="{self.alice.id}"', data['html'])
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT, ADMISSION_CONTROL=False)
+class DashboardStatsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.department = Department.objects.create(name='Test Faculty', code='TST')
+        cls.other = Department.objects.create(name='Other Faculty', code='OTH')
+        cls.superuser = CustomUser.objects.create_superuser('root', password='x', role='superadmin')
+        cls.students = [
+            CustomUser.objects.create_user(f'counted{i}', password='x', department=cls.department) for i in range(3)
+        ]
+
+    def assertInSync(self):
+        self.assertEqual(stats.verify(), [])
+
+    def test_counters_follow_changes(self):
+        stats.rebuild()
+        event = make_event(self.department, self.superuser, available_tickets=5)
+        past = make_event(self.other, self.superuser, category='seminar', date=timezone.now() - timedelta(days=3))
+        booking.book(event, self.students[0])
+        booking.issue_bulk(event, CustomUser.objects.filter(pk__in=[s.pk for s in self.students[1:]]))
+        self.assertInSync()
+
+        event.department = self.other
+        event.category = 'seminar'
+        event.date = timezone.now() + timedelta(days=30)
+        event.save()
+        self.students[0].department = self.other
+        self.students[0].role = 'admin'
+        self.students[0].save()
+        self.assertInSync()
+
+        Ticket.objects.filter(event=event).first().delete()
+        past.delete()
+        self.students[1].delete()
+        self.department.delete()
+        self.assertInSync()
+
+        counters = stats.snapshot()
+        self.assertEqual(counters.total_bookings, 1)
+        self.assertEqual(counters.total_events, 1)
+        self.assertEqual(counters.upcoming_events, 1)
+        self.assertEqual(counters.get('category', 'seminar', 'tickets'), 1)
+
+    def test_dashboards_read_counters_in_one_query(self):
+        make_event(self.department, self.superuser)
+        stats.snapshot()
+        analytics.refresh()
+        self.client.force_login(self.superuser)
+        for url in (reverse('admin_dashboard'), reverse('superadmin_dashboard')):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            counting = [q['sql'] for q in queries if 'COUNT(' in q['sql'].upper()]
+            self.assertEqual(counting, [])
+            self.assertEqual(sum('mainapp_statcounter' in q['sql'] for q in queries), 1)
+        self.assertEqual(response.context['total_users'], 4)
+        counted = {d.id: d.users_count for d in response.context['departments']}
+        self.assertEqual(counted[self.department.id], 3)
+
+    def test_rebuild_stats_command(self):
+        stats.rebuild()
+        StatCounter.objects.filter(scope='total').update(tickets=99)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_stats', '--check', stdout=StringIO())
+        call_command('rebuild_stats', stdout=StringIO())
+        self.assertInSync()
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT, ADMISSION_CONTROL=False, EVENT_CARD_EXACT_TICKETS=3,
+                   EVENT_CARD_TICKET_STEP=5)
+class FragmentCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.department = Department.objects.create(name='Test Faculty', code='TST')
+        cls.admin = CustomUser.objects.create_user('cardadmin', password='x', role='admin')
+        cls.students = make_students(9, cls.department, prefix='carder')
+
+    def setUp(self):
+        cache.clear()
+        self.event = make_event(self.department, self.admin, available_tickets=12)
+        self.client.force_login(self.admin)
+
+    def listing(self):
+        return self.client.get(reverse('filter_events')).json()['html']
+
+    def test_cards_are_reused_until_the_event_changes(self):
+        self.assertIn('10+ tickets left', self.listing())
+        self.listing()
+        self.assertEqual(fragments.counters(), {'hits': 1, 'misses': 1, 'hit_ratio': 0.5})
+
+        self.event.title = 'Autumn Music Festival'
+        self.event.save()
+        self.assertIn('Autumn Music Festival', self.listing())
+        self.assertEqual(fragments.counters()['misses'], 2)
+
+    def test_ticket_count_invalidates_only_across_display_thresholds(self):
+        self.listing()
+        booking.book(self.event, self.students[0])
+        booking.book(self.event, self.students[1])
+        self.assertIn('10+ tickets left', self.listing())
+        self.assertEqual(fragments.counters()['hits'], 1)
+
+        booking.book(self.event, self.students[2])
+        self.assertIn('5+ tickets left', self.listing())
+        for student in self.students[3:]:
+            booking.book(self.event, student)
+        self.assertIn('3 tickets left', self.listing())
+        self.assertEqual(fragments.counters(), {'hits': 1, 'misses': 3, 'hit_ratio': 0.25})
+
+    def test_cards_vary_by_role(self):
+        student = CustomUser.objects.create_user('cardstudent', password='x', role='student')
+        staff_card = fragments.render_cards([self.event], 'dashboard/partials/event_card.html', self.admin)
+        student_card = fragments.render_cards([self.event], 'dashboard/partials/event_card.html', student)
+        self.assertIn('Manage', staff_card)
+        self.assertIn('Book Now', student_card)
+        self.assertEqual(fragments.counters()['misses'], 2)
+
+    def test_department_rename_refreshes_student_cards(self):
+        student = CustomUser.objects.create_user('cardstudent', password='x', role='student')
+        self.client.force_login(student)
+        self.assertContains(self.client.get(reverse('student_dashboard')), 'Test Faculty')
+        self.department.name = 'Renamed Faculty'
+        self.department.save()
+        self.assertContains(self.client.get(reverse('student_dashboard')), 'Renamed Faculty')
+
+    def test_counters_endpoint_is_staff_only(self):
+        self.listing()
+        response = self.client.get(reverse('api_fragment_cache_stats'))
+        self.assertEqual(response.json()['misses'], 1)
+        self.client.force_login(self.students[0])
+        self.assertEqual(self.client.get(reverse('api_fragment_cache_stats')).status_code, 403)
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT, ADMISSION_CONTROL=False)
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.department = Department.objects.create(name='Test Faculty', code='TST')
+        cls.admin = CustomUser.objects.create_user('etagadmin', password='x', role='admin')
+        cls.student, cls.other = make_students(2, cls.department, prefix='etagger')
+
+    def setUp(self):
+        self.event = make_event(self.department, self.admin)
+
+    def revalidate(self, url, **params):
+        """GET ``url`` twice; returns the second, conditional, response and its queries."""
+        etag = self.client.get(url, params)['ETag']
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+        return response, queries
+
+    def test_event_details_not_modified(self):
+        self.client.force_login(self.student)
+        url = reverse('event_details', args=[self.event.id])
+        response, queries = self.revalidate(url)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        # Session, user and the validator
+        self.assertEqual(len(queries), 3)
+
+        booking.book(self.event, self.other)
+        etag = self.client.get(url)['ETag']
+        booking.book(self.event, self.student)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_event_details_tags_are_per_user(self):
+        url = reverse('event_details', args=[self.event.id])
+        self.client.force_login(self.student)
+        etag = self.client.get(url)['ETag']
+        self.client.force_login(self.other)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_event_listing_not_modified(self):
+        self.client.force_login(self.admin)
+        url = reverse('filter_events')
+        response, queries = self.revalidate(url, category='concert')
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(queries), 3)
+
+        ticket = booking.book(self.event, self.student).ticket
+        etag = self.client.get(url)['ETag']
+        ticket.delete()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_student_dashboard_not_modified(self):
+        self.client.force_login(self.student)
+        url = reverse('student_dashboard')
+        response, queries = self.revalidate(url)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(queries), 3)
+
+        # Other students' bookings do not change this page; the student's own do
+        etag = self.client.get(url)['ETag']
+        booking.book(self.event, self.other)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        booking.book(self.event, self.student)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        etag = self.client.get(url)['ETag']
+        self.event.location = 'Open Air Theatre'
+        self.event.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT, ADMISSION_CONTROL=False)
+class ListingApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.department = Department.objects.create(name='Test Faculty', code='TST')
+        cls.admin = CustomUser.objects.create_user('apiadmin', password='x', role='admin')
+        cls.student, cls.other = make_students(2, cls.department, prefix='apier')
+        cls.events = [
+            make_event(cls.department, cls.admin, title=f'Event {i}', date=timezone.now() + timedelta(days=i))
+            for i in range(5)
+        ]
+
+    def get(self, name, **params):
+        return self.client.get(reverse(name), params)
+
+    def test_events_are_projected_and_paginated(self):
+        self.client.force_login(self.student)
+        titles = []
+        cursor = ''
+        while True:
+            body = self.get('api_v1_events', fields='title,tickets_left', limit=2, cursor=cursor).json()
+            self.assertTrue(all(set(row) == {'title', 'tickets_left'} for row in body['results']))
+            titles += [row['title'] for row in body['results']]
+            cursor = body['next_cursor']
+            if not cursor:
+                break
+        self.assertEqual(titles, [f'Event {i}' for i in reversed(range(5))])
+
+        found = self.get('api_v1_events', search='event 3').json()['results']
+        self.assertEqual(set(found[0]), set(api.EVENT_DEFAULT_FIELDS))
+
+    def test_bad_requests(self):
+        self.client.force_login(self.admin)
+        self.assertEqual(self.get('api_v1_events', fields='title,password').status_code, 400)
+        self.assertEqual(self.get('api_v1_users', fields='password').status_code, 400)
+        self.assertEqual(self.get('api_v1_events', department='x').status_code, 400)
+        self.assertEqual(self.get('api_v1_tickets', cursor='garbage').status_code, 400)
+
+    def test_access(self):
+        self.assertEqual(self.get('api_v1_events').status_code, 401)
+        self.client.force_login(self.student)
+        self.assertEqual(self.get('api_v1_users').status_code, 403)
+
+        booking.book(self.events[0], self.student)
+        booking.book(self.events[0], self.other)
+        mine = self.get('api_v1_tickets', fields='username,event').json()['results']
+        self.assertEqual(mine, [{'username': self.student.username, 'event': 'Event 0'}])
+        self.client.force_login(self.admin)
+        self.assertEqual(len(self.get('api_v1_tickets', event=self.events[0].id).json()['results']), 2)
+        users = self.get('api_v1_users', role='student', fields='username,department').json()['results']
+        self.assertIn({'username': self.other.username, 'department': 'Test Faculty'}, users)
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT, ADMISSION_CONTROL=False, EXPORT_CHUNK_SIZE=2)
+class AttendeeExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.department = Department.objects.create(name='Test Faculty', code='TST')
+        cls.admin = CustomUser.objects.create_user('exportadmin', password='x', role='admin')
+        cls.event = make_event(cls.department, cls.admin)
+        cls.students = make_students(3, cls.department, prefix='exporter')
+        cls.students[2].first_name = '=HYPERLINK("http://evil")'
+        cls.students[2].department = None
+        cls.students[2].save()
+        for student in cls.students:
+            booking.book(cls.event, student)
+
+    def test_streams_every_attendee(self):
+        self.client.force_login(self.admin)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('export_attendees', args=[self.event.id]))
+            self.assertTrue(response.streaming)
+            chunks = list(response.streaming_content)
+        self.assertIn('attendees_event_', response['Content-Disposition'])
+        self.assertEqual(len([q for q in queries if 'mainapp_ticket' in q['sql']]), 1)
+
+        text = b''.join(chunks).decode('utf-8-sig')
+        rows = list(csv.reader(text.splitlines()))
+        self.assertEqual(rows[0], list(exports.HEADER))
+        self.assertEqual([row[0] for row in rows[1:]], [s.enrollment_no for s in self.students])
+        self.assertEqual(rows[1][5], 'Test Faculty')
+        self.assertEqual(rows[3][2], "'=HYPERLINK(\"http://evil\")")
+        self.assertEqual(rows[3][5], '')
+        # Header, then one chunk per EXPORT_CHUNK_SIZE rows
+        self.assertEqual(len(chunks), 3)
+
+    def test_staff_only(self):
+        self.client.force_login(self.students[0])
+        self.assertEqual(self.client.get(reverse('export_attendees', args=[self.event.id])).status_code, 403)
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT, ADMISSION_CONTROL=False)
+class DepartmentAnalyticsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.department = Department.objects.create(name='Test Faculty', code='TST')
+        cls.empty = Department.objects.create(name='Quiet Faculty', code='QFT')
+        cls.superuser = CustomUser.objects.create_superuser('analyst', password='x', role='superadmin')
+        cls.students = make_students(4, cls.department, prefix='analysed')
+        held = make_event(cls.department, cls.superuser, category='seminar', date=timezone.now() - timedelta(days=2))
+        upcoming = make_event(cls.department, cls.superuser)
+        make_event(cls.department, cls.superuser, category='seminar', date=timezone.now() + timedelta(days=3))
+        for student in cls.students:
+            booking.book(held, student)
+        booking.book(upcoming, cls.students[0])
+        Ticket.objects.filter(event=held, user__in=cls.students[:3]).update(checked_in_at=timezone.now())
+
+    def setUp(self):
+        cache.clear()
+
+    def test_rollup(self):
+        with self.assertNumQueries(2):
+            rollup = {row['code']: row for row in analytics.department_rollup()}
+        row = rollup['TST']
+        self.assertEqual((row['users'], row['events'], row['active_events'], row['bookings']), (4, 3, 2, 5))
+        self.assertEqual(row['attendance_rate'], 0.75)
+        self.assertEqual(
+            row['top_categories'],
+            [{'category': 'seminar', 'events': 2, 'bookings': 4}, {'category': 'concert', 'events': 1, 'bookings': 1}],
+        )
+        self.assertEqual((rollup['QFT']['events'], rollup['QFT']['attendance_rate']), (0, None))
+
+    def test_query_count_does_not_grow_with_departments(self):
+        for i in range(5):
+            department = Department.objects.create(name=f'Extra {i}', code=f'EX{i}')
+            make_event(department, self.superuser)
+        with self.assertNumQueries(2):
+            analytics.department_rollup()
+
+    def test_dashboard_reads_the_snapshot(self):
+        call_command('refresh_department_analytics', stdout=StringIO())
+        make_event(self.empty, self.superuser)
+        self.client.force_login(self.superuser)
+        response = self.client.get(reverse('superadmin_dashboard'))
+        quiet = next(d for d in response.context['departments'] if d.id == self.empty.id)
+        self.assertEqual(quiet.analytics['active_events'], 0)
+        with override_settings(DEPARTMENT_ANALYTICS_SNAPSHOT=False):
+            response = self.client.get(reverse('superadmin_dashboard'))
+        quiet = next(d for d in response.context['departments'] if d.id == self.empty.id)
+        self.assertEqual(quiet.analytics['active_events'], 1)
+
+    def test_snapshot_is_shared_through_the_database(self):
+        call_command('refresh_department_analytics', stdout=StringIO())
+        # Another process: nothing in its cache
+        cache.clear()
+        with self.assertNumQueries(1):
+            data = analytics.snapshot()
+        self.assertEqual(next(row for row in data['departments'] if row['code'] == 'TST')['bookings'], 5)
+        Snapshot.objects.update(computed_at=timezone.now() - timedelta(hours=1))
+        self.assertGreater(analytics.snapshot()['computed_at'], timezone.now() - timedelta(minutes=1))
+
+    def test_department_details(self):
+        self.client.force_login(self.superuser)
+        response = self.client.get(reverse('department_details', args=[self.department.id]))
+        self.assertEqual(response.context['analytics']['bookings'], 5)
+        self.assertContains(response, '75%')
+
+
+def make_jpeg(size=(1600, 1200), color=(200, 40, 40)):
+    buffer = BytesIO()
+    Image.new('RGB', size, color).save(buffer, format='JPEG')
+    return SimpleUploadedFile('photo.jpg', buffer.getvalue(), content_type='image/jpeg')
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT, IMAGE_VARIANTS_EAGER=False)
+class ImageVariantTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.department = Department.objects.create(name='Test Faculty', code='TST')
+        cls.admin = CustomUser.objects.create_user('imageadmin', password='x', role='admin')
+
+    def setUp(self):
+        cache.clear()
+        self.upload = make_jpeg()
+        self.event = make_event(self.department, self.admin, image=self.upload)
+
+    def variant(self, variant, fmt, digest=None):
+        return self.client.get(reverse('image_variant', args=[digest or self.event.image_digest, variant, fmt]))
+
+    def test_digest_follows_the_upload(self):
+        self.upload.seek(0)
+        self.assertEqual(self.event.image_digest, hashlib.sha256(self.upload.read()).hexdigest())
+        self.event.title = 'Renamed'
+        self.event.save()
+        self.assertEqual(Event.objects.get(pk=self.event.pk).image_digest, self.event.image_digest)
+        self.event.image = None
+        self.event.save()
+        self.assertEqual(self.event.image_digest, '')
+
+    def test_saves_of_other_fields_skip_the_digest(self):
+        user = CustomUser.objects.create_user('pictured', password='x', profile_image=make_jpeg())
+        CustomUser.objects.filter(pk=user.pk).update(profile_image_digest='')
+        user.refresh_from_db()
+        with mock.patch.object(images, 'file_digest') as file_digest:
+            self.client.login(username='pictured', password='x')
+            self.event.save(update_fields=['title'])
+        file_digest.assert_not_called()
+
+    def test_variants_render_lazily_once(self):
+        response = self.variant('card', 'webp')
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        self.assertIn('immutable', response['Cache-Control'])
+        with Image.open(BytesIO(b''.join(response.streaming_content))) as image:
+            self.assertEqual(image.size, (800, 600))
+
+        with mock.patch.object(images, 'render') as render:
+            self.assertEqual(self.variant('card', 'webp').status_code, 200)
+        render.assert_not_called()
+
+        with Image.open(BytesIO(b''.join(self.variant('avatar', 'jpg').streaming_content))) as image:
+            self.assertEqual((image.format, image.size), ('JPEG', (192, 192)))
+
+    def test_unknown_variants(self):
+        self.assertEqual(self.variant('huge', 'webp').status_code, 404)
+        self.assertEqual(self.variant('card', 'gif').status_code, 404)
+        self.assertEqual(self.variant('card', 'webp', digest='0' * 64).status_code, 404)
+
+    def test_listing_uses_variants(self):
+        student = CustomUser.objects.create_user('imagestudent', password='x', role='student')
+        self.client.force_login(student)
+        response = self.client.get(reverse('student_dashboard'))
+        self.assertContains(response, reverse('image_variant', args=[self.event.image_digest, 'card', 'webp']))
+        self.assertNotContains(response, self.event.image.url)
+
+    def test_eager_rendering_waits_for_commit(self):
+        with override_settings(IMAGE_VARIANTS_EAGER=True), \
+                mock.patch.object(images, '_executor') as executor, \
+                self.captureOnCommitCallbacks(execute=True):
+            make_event(self.department, self.admin, image=make_jpeg(color=(0, 0, 255)))
+        executor.submit.assert_called_once()
+
+    def test_backfill_command(self):
+        Event.objects.filter(pk=self.event.pk).update(image_digest='')
+        call_command('generate_image_variants', '--workers=1', stdout=StringIO())
+        digest = Event.objects.get(pk=self.event.pk).image_digest
+        self.assertEqual(digest, self.event.image_digest)
+        for variant in images.VARIANTS:
+            for fmt in images.FORMATS:
+                self.assertTrue(default_storage.exists(images.variant_name(digest, variant, fmt)))
+
+
+
+def make_png(size, mode='RGB'):
+    buffer = BytesIO()
+    Image.new(mode, size).save(buffer, format='PNG')
+    return SimpleUploadedFile('drawing.png', buffer.getvalue(), content_type='image/png')
+
+
+@override_settings(IMAGE_UPLOAD_MAX_EDGE=400)
+class UploadLimitTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.field = uploads.BoundedImageField()
+
+    def assertRejected(self, upload, code):
+        with self.assertRaises(ValidationError) as raised:
+            self.field.clean(upload)
+        self.assertEqual(raised.exception.code, code)
+        self.assertEqual(uploads.counters()['rejected'], 1)
+
+    def test_small_images_are_stored_as_uploaded(self):
+        upload = make_jpeg(size=(400, 300))
+        self.assertIs(self.field.clean(upload), upload)
+        stats = uploads.counters()
+        self.assertEqual((stats['processed'], stats['downscaled'], stats['peak_max']), (1, 0, 0))
+
+    @override_settings(IMAGE_UPLOAD_MAX_BYTES=1024)
+    def test_large_files_are_rejected(self):
+        self.assertRejected(make_jpeg(), 'file_too_large')
+
+    @override_settings(IMAGE_UPLOAD_MAX_PIXELS=1_000_000)
+    def test_too_many_pixels_are_rejected_from_the_header(self):
+        upload = make_png((2000, 1000))
+        with mock.patch.object(Image.Image, 'load') as load:
+            self.assertRejected(upload, 'too_many_pixels')
+        load.assert_not_called()
+
+    def test_jpeg_is_decoded_at_reduced_scale(self):
+        shrunk = self.field.clean(make_jpeg(size=(1600, 1200)))
+        with Image.open(shrunk) as image:
+            self.assertEqual((image.format, image.size), ('JPEG', (400, 300)))
+        self.assertEqual(shrunk.name, 'photo.jpg')
+        stats = uploads.counters()
+        self.assertEqual((stats['processed'], stats['downscaled']), (1, 1))
+        # draft() decoded at 1/2 scale: 800x600 plus the 400x300 result
+        self.assertEqual(stats['peak_max'], (800 * 600 + 400 * 300) * 4)
+
+    def test_other_formats_are_reduced_before_resampling(self):
+        with mock.patch.object(Image.Image, 'reduce', autospec=True, side_effect=Image.Image.reduce) as reduce:
+            shrunk = self.field.clean(make_png((2000, 1000), mode='L'))
+        reduce.assert_called_once_with(mock.ANY, 2)
+        with Image.open(shrunk) as image:
+            self.assertEqual((image.format, image.size), ('PNG', (400, 200)))
+
+    def test_stats_endpoint(self):
+        self.field.clean(make_jpeg(size=(1600, 1200)))
+        self.field.clean(make_jpeg(size=(200, 200)))
+        url = reverse('api_upload_stats')
+        self.client.force_login(CustomUser.objects.create_user('uploadstudent', password='x'))
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.client.force_login(CustomUser.objects.create_user('uploadadmin', password='x', role='admin'))
+        stats = self.client.get(url).json()
+        self.assertEqual((stats['processed'], stats['downscaled'], stats['rejected']), (2, 1, 0))
+        self.assertEqual(stats['peak_mean'], stats['peak_max'] // 2)
+
+
+
+class RecommendationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        arts = Department.objects.create(name='Arts Faculty', code='ART')
+        science = Department.objects.create(name='Science Faculty', code='SCI')
+        admin = CustomUser.objects.create_user('recommender', password='x', role='admin')
+        cls.alice, cls.bob = make_students(2, arts, prefix='alice')
+        cls.carol, = make_students(1, science, prefix='carol')
+        cls.dave, = make_students(1, prefix='dave')
+        past = timezone.now() - timedelta(days=30)
+        held_concert = make_event(science, admin, category='concert', date=past)
+        held_seminar = make_event(arts, admin, category='seminar', date=past)
+        cls.concert = make_event(science, admin, category='concert')
+        cls.seminar = make_event(science, admin, category='seminar')
+        cls.talk = make_event(arts, admin, category='other')
+        cls.play = make_event(science, admin, category='stage_event')
+        for event, user in [(held_concert, cls.alice), (held_concert, cls.bob), (cls.play, cls.bob),
+                            (held_seminar, cls.carol)]:
+            Ticket.objects.create(event=event, user=user)
+
+    def picks(self, user):
+        return list(Recommendation.objects.filter(user=user).order_by('rank').values_list('event_id', flat=True))
+
+    def test_scores_combine_department_categories_and_co_attendance(self):
+        recommendations.refresh()
+        # Bob went to the same concert and booked the play; Alice likes concerts
+        # and shares Bob's department, which runs the talk
+        self.assertEqual(self.picks(self.alice), [self.play.pk, self.concert.pk, self.talk.pk])
+        self.assertEqual(self.picks(self.carol)[0], self.seminar.pk)
+        self.assertNotIn(self.play.pk, self.picks(self.bob))
+        self.assertEqual(self.picks(self.dave), [])
+
+    def test_blocks_do_not_change_the_result(self):
+        recommendations.refresh()
+        expected = list(Recommendation.objects.order_by('user_id', 'rank').values_list('user_id', 'event_id', 'score'))
+        with mock.patch.object(recommendations, 'CHUNK', 2):
+            recommendations.refresh()
+        result = list(Recommendation.objects.order_by('user_id', 'rank').values_list('user_id', 'event_id', 'score'))
+        self.assertEqual([row[:2] for row in result], [row[:2] for row in expected])
+        for got, want in zip(result, expected):
+            self.assertAlmostEqual(got[2], want[2], places=5)
+
+    def test_top_n_read_is_one_query_and_skips_new_bookings(self):
+        recommendations.refresh()
+        Ticket.objects.create(event=self.play, user=self.alice)
+        with self.assertNumQueries(1):
+            events = recommendations.for_student(self.alice, 2)
+            titles = [(event.pk, event.department.code) for event in events]
+        self.assertEqual(titles, [(self.concert.pk, 'SCI'), (self.talk.pk, 'ART')])
+
+    def test_dashboard_section(self):
+        self.client.force_login(self.alice)
+        url = reverse('student_dashboard')
+        response = self.client.get(url)
+        self.assertNotContains(response, 'Recommended for You')
+        call_command('refresh_recommendations', stdout=StringIO())
+        refreshed = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(refreshed.status_code, 200)
+        self.assertContains(refreshed, 'Recommended for You')
+
+
+
+class SalesTests(TestCase):
+    # A Monday
+    OPENED = datetime(2026, 1, 5, 10, tzinfo=dt_timezone.utc)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.department = Department.objects.create(name='Test Faculty', code='TST')
+        cls.superuser = CustomUser.objects.create_superuser('salesboss', password='x', role='superadmin')
+        students = make_students(5, cls.department, prefix='buyer')
+        cls.concert = make_event(cls.department, cls.superuser, available_tickets=4)
+        cls.seminar = make_event(cls.department, cls.superuser, category='seminar', available_tickets=10)
+        for student, hours in zip(students, (0, 1, 3, 10)):
+            ticket = booking.book(cls.concert, student).ticket
+            Ticket.objects.filter(pk=ticket.pk).update(booked_at=cls.OPENED + timedelta(hours=hours))
+        booking.book(cls.seminar, students[4])
+
+    def setUp(self):
+        cache.clear()
+
+    def test_event_sell_through(self):
+        data = sales.event_sales(self.concert)
+        self.assertEqual((data['sold'], data['capacity']), (4, 4))
+        self.assertEqual(data['milestones'], {50: 1.0, 90: 10.0, 100: 10.0})
+        self.assertEqual(len(data['curve']), sales.CURVE_POINTS)
+        self.assertEqual((data['curve'][0]['sold'], data['curve'][-1]['sold']), (1, 4))
+        self.assertEqual(data['curve'][0]['at'], self.OPENED)
+        monday = data['heatmap'][0]
+        self.assertEqual(monday['day'], 'Mon')
+        self.assertEqual([cell['hour'] for cell in monday['cells'] if cell['count']], [10, 11, 13, 20])
+        self.assertEqual(sum(cell['count'] for row in data['heatmap'][1:] for cell in row['cells']), 0)
+
+    @override_settings(TIME_ZONE='Asia/Kolkata')
+    def test_heatmap_is_in_local_time(self):
+        hours = sales.heatmap(sales.booking_times(self.concert))
+        # UTC+5:30
+        self.assertEqual(hours[0].nonzero()[0].tolist(), [15, 16, 18])
+        self.assertEqual(hours[1].nonzero()[0].tolist(), [1])
+
+    def test_event_sales_are_cached_until_the_next_booking(self):
+        sales.cached_event_sales(self.seminar)
+        with self.assertNumQueries(1):
+            self.assertEqual(sales.cached_event_sales(self.seminar)['sold'], 1)
+        booking.book(self.seminar, CustomUser.objects.create_user('latebuyer', password='x'))
+        self.seminar.refresh_from_db()
+        self.assertEqual(sales.cached_event_sales(self.seminar)['sold'], 2)
+
+    def test_cancel_then_book_recomputes(self):
+        before = sales.cached_event_sales(self.concert)
+        Ticket.objects.filter(event=self.concert).order_by('booked_at').first().delete()
+        ticket = booking.book(self.concert, CustomUser.objects.create_user('replacement', password='x')).ticket
+        Ticket.objects.filter(pk=ticket.pk).update(booked_at=self.OPENED + timedelta(hours=20))
+        self.concert.refresh_from_db()
+        after = sales.cached_event_sales(self.concert)
+        self.assertEqual(after['sold'], before['sold'])
+        self.assertEqual(after['curve'][0]['at'], self.OPENED + timedelta(hours=1))
+
+    def test_category_demand(self):
+        with self.assertNumQueries(2):
+            data = sales.overview()
+        concert, seminar = data['categories']
+        self.assertEqual(
+            (concert['category'], concert['sold'], concert['fill_rate'], concert['sold_out_share']),
+            ('concert', 4, 1.0, 1.0),
+        )
+        self.assertEqual(concert['median_hours_to_half'], 1.0)
+        self.assertEqual((seminar['category'], seminar['fill_rate'], seminar['median_hours_to_half']),
+                         ('seminar', 0.1, None))
+        self.assertEqual(sum(cell['count'] for row in data['heatmap'] for cell in row['cells']), 5)
+
+    def test_pages(self):
+        self.client.force_login(self.superuser)
+        response = self.client.get(reverse('admin_event_details', args=[self.concert.pk]))
+        self.assertContains(response, 'Time to 50%')
+        self.assertContains(response, '<polyline points="0.0,30.0')
+        response = self.client.get(reverse('superadmin_dashboard'))
+        self.assertContains(response, 'Booking Demand')
+        self.assertContains(response, 'Not computed yet')
+        call_command('refresh_sales_overview', stdout=StringIO())
+        # The page reads the stored overview; the bookings are never fetched
+        with mock.patch('mainapp.sales.all_bookings') as all_bookings:
+            response = self.client.get(reverse('superadmin_dashboard'))
+        all_bookings.assert_not_called()
+        self.assertContains(response, '<td class="py-2 text-white">Concert</td>', html=False)
+
+
+class ForecastTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.now = timezone.now()
+        cls.department = Department.objects.create(name='Test Faculty', code='TST')
+        cls.admin = CustomUser.objects.create_user('forecaster', password='x', role='admin')
+        cls.students = make_students(12, cls.department, prefix='fan')
+        # Three held concerts, each selling its 4 seats 100, 30, 10 and 2 hours before it started
+        for n in range(3):
+            held = make_event(cls.department, cls.admin, available_tickets=4, date=cls.now - timedelta(days=10 + n))
+            for student, hours in zip(cls.students, (100, 30, 10, 2)):
+                cls.book(held, student, held.date - timedelta(hours=hours))
+        cls.hot = make_event(cls.department, cls.admin, available_tickets=8, date=cls.now + timedelta(hours=48))
+        cls.big = make_event(cls.department, cls.admin, available_tickets=100, date=cls.now + timedelta(hours=48))
+        for event in (cls.hot, cls.big):
+            for student in cls.students[4:6]:
+                booking.book(event, student)
+
+    @staticmethod
+    def book(event, student, at):
+        ticket = booking.book(event, student).ticket
+        Ticket.objects.filter(pk=ticket.pk).update(booked_at=at)
+
+    def test_curves_are_folded_incrementally(self):
+        now = timezone.now()
+        self.assertEqual(forecasts.fold_curves(now), 3)
+        curve = BookingCurve.objects.get()
+        self.assertEqual((curve.category, curve.events, curve.fill), ('concert', 3, 3.0))
+        self.assertEqual(curve.shares[:8], [3.0, 3.0, 2.25, 2.25, 1.5, 1.5, 0.75, 0.75])
+        self.assertEqual(forecasts.fold_curves(now), 0)
+
+        # Only the event held since the last run is read
+        late = make_event(self.department, self.admin, available_tickets=4, date=now + timedelta(hours=1))
+        self.book(late, self.students[0], now)
+        self.assertEqual(forecasts.fold_curves(now + timedelta(hours=2)), 1)
+        self.assertEqual(BookingCurve.objects.get().events, 4)
+        self.assertEqual(forecasts.fold_curves(rebuild=True, now=now + timedelta(hours=2)), 4)
+        self.assertEqual(BookingCurve.objects.get().events, 4)
+
+    def test_folding_does_not_depend_on_existing_curves(self):
+        # Nothing held had sold a ticket, so no curve was stored; the next run must not re-read it all
+        Ticket.objects.all().delete()
+        now = timezone.now()
+        self.assertEqual(forecasts.fold_curves(now), 3)
+        self.assertFalse(BookingCurve.objects.exists())
+        self.assertEqual(forecasts.fold_curves(now + timedelta(minutes=1)), 0)
+
+    def test_changed_held_events_are_refolded(self):
+        now = timezone.now()
+        forecasts.fold_curves(now)
+        held = Event.objects.filter(date__lt=now).order_by('date').first()
+
+        # Recategorised after it was folded
+        held.category = 'seminar'
+        held.save()
+        later = timezone.now() + timedelta(seconds=1)
+        self.assertEqual(forecasts.fold_curves(later), 3)
+        self.assertEqual(
+            sorted(BookingCurve.objects.values_list('category', 'events')), [('concert', 2), ('seminar', 1)]
+        )
+
+        # Moved to the future: its tickets leave the curves
+        held.date = later + timedelta(days=1)
+        held.save()
+        latest = timezone.now() + timedelta(seconds=2)
+        self.assertEqual(forecasts.fold_curves(latest), 2)
+        self.assertEqual(list(BookingCurve.objects.values_list('category', 'events')), [('concert', 2)])
+        self.assertEqual(forecasts.fold_curves(latest), 0)
+
+    def test_forecasts(self):
+        self.assertEqual(forecasts.refresh(self.now), 2)
+        hot = SellOutForecast.objects.get(event=self.hot)
+        # A quarter usually sells by 48 hours out; the rest (6 seats) sells out 1 hour before the start
+        self.assertEqual((hot.sold, hot.expected_attendance), (2, 8))
+        self.assertAlmostEqual((self.hot.date - hot.sell_out_at).total_seconds(), 3600, delta=1)
+        big = SellOutForecast.objects.get(event=self.big)
+        self.assertEqual((big.sold, big.expected_attendance, big.sell_out_at), (2, 77, None))
+        self.assertEqual([forecast.event for forecast in forecasts.upcoming(10)], [self.hot, self.big])
+
+    def test_only_stale_forecasts_are_recomputed(self):
+        forecasts.refresh(self.now)
+        self.assertEqual(forecasts.refresh(self.now + timedelta(minutes=1)), 0)
+        booking.book(self.big, self.students[6])
+        self.assertEqual(forecasts.refresh(self.now + timedelta(minutes=2)), 1)
+        self.assertEqual(SellOutForecast.objects.get(event=self.big).sold, 3)
+        self.assertEqual(forecasts.refresh(self.now + timedelta(hours=2)), 2)
+
+    def test_dashboard(self):
+        call_command('forecast_sell_outs', stdout=StringIO())
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('admin_dashboard'))
+        self.assertContains(response, 'Sell-out Forecasts')
+        self.assertContains(response, 'Not expected to sell out')
+        self.assertContains(response, '2 / 8')
+
+
+class TicketCodeTests(SimpleTestCase):
+    def test_round_trip(self):
+        for ticket_id, event_id in [(1, 1), (127, 128), (2 ** 40, 70000)]:
+            code = ticket_codes.encode(ticket_id, event_id)
+            self.assertEqual(ticket_codes.decode(code), ticket_codes.TicketCode(ticket_id, event_id))
+
+    def test_code_is_compact_and_alphanumeric(self):
+        code = ticket_codes.encode(123456, 789)
+        self.assertLessEqual(len(code), 24)
+        self.assertRegex(code, r'^[A-Z2-7]+$')
+        self.assertEqual(ticket_codes.decode(code.lower()).ticket_id, 123456)
+
+    def test_tampered_codes_are_rejected(self):
+        code = ticket_codes.encode(5, 6)
+        flipped = code[:3] + ('A' if code[3] != 'A' else 'B') + code[4:]
+        for bad in [flipped, code[:-2], '', 'not a code!', ticket_codes.encode(5, 6) + 'AA']:
+            with self.assertRaises(ticket_codes.InvalidTicketCode):
+                ticket_codes.decode(bad)
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT, TICKET_QR_MODE='file')
+class BulkIssueTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.department = Department.objects.create(name='Test Faculty', code='TST')
+        cls.admin = CustomUser.objects.create_user('organizer', password='x', role='admin')
+        cls.students = make_students(6, cls.department)
+
+    def test_issue_to_department_within_capacity(self):
+        event = make_event(self.department, self.admin, available_tickets=4)
+        booking.book(event, self.students[0])
+        users = booking.select_recipients(department=self.department, role='student')
+        result = booking.issue_bulk(event, users, batch_size=2)
+
+        self.assertEqual(result.issued, 3)
+        self.assertEqual(result.skipped_existing, 1)
+        self.assertEqual(result.skipped_sold_out, 2)
+        event.refresh_from_db()
+        self.assertEqual(event.seats_remaining, 0)
+        self.assertEqual(Ticket.objects.filter(event=event).count(), 4)
+
+        self.assertEqual(qr.render_tickets([t.pk for t in result.tickets]), 3)
+        self.assertEqual(Ticket.objects.filter(event=event, qr_status='ready').count(), 3)
+
+    def test_waitlist_is_served_before_bulk_issue(self):
+        event = make_event(self.department, self.admin, available_tickets=2)
+        first, _ = (booking.book(event, student).ticket for student in self.students[:2])
+        waitlist.join(event, self.students[2])
+        # The freed seat is back before the background promotion has run
+        with self.captureOnCommitCallbacks(execute=False):
+            first.delete()
+        result = booking.issue_bulk(event, CustomUser.objects.filter(pk__in=[s.pk for s in self.students[3:]]))
+        self.assertEqual((result.promoted, result.issued, result.skipped_sold_out), (1, 0, 3))
+        self.assertTrue(Ticket.objects.filter(event=event, user=self.students[2]).exists())
+
+    def test_enrollment_csv(self):
+        header = ['name,enrollment_no', f'A,{self.students[1].enrollment_no}', f'B,{self.students[2].enrollment_no}']
+        self.assertEqual(booking.read_enrollment_numbers(header),
+                         [self.students[1].enrollment_no, self.students[2].enrollment_no])
+        self.assertEqual(booking.read_enrollment_numbers(['X1', '', 'X2 ']), ['X1', 'X2'])
+
+    def test_bulk_issue_view(self):
+        event = make_event(self.department, self.admin, available_tickets=10)
+        self.client.force_login(self.admin)
+        response = self.client.post(reverse('bulk_issue_tickets', args=[event.id]), {
+            'department': self.department.id, 'role': 'student',
+        })
+        self.assertRedirects(response, reverse('admin_event_details', args=[event.id]), fetch_redirect_response=False)
+        self.assertEqual(Ticket.objects.filter(event=event).count(), 6)
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT, WAITLIST_PROMOTE_IN_BACKGROUND=False)
+class WaitlistTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.department = Department.objects.create(name='Test Faculty', code='TST')
+        cls.admin = CustomUser.objects.create_user('organizer', password='x', role='admin')
+        cls.students = make_students(6, cls.department)
+
+    def setUp(self):
+        self.event = make_event(self.department, self.admin, available_tickets=1)
+        self.holder = booking.book(self.event, self.students[0]).ticket
+        self.entries = [waitlist.join(self.event, s) for s in self.students[1:5]]
+
+    def test_place_in_line(self):
+        self.assertEqual([e.place_in_line for e in self.entries], [1, 2, 3, 4])
+        self.assertIsNone(waitlist.join(self.event, self.students[0]))
+        self.assertEqual(waitlist.join(self.event, self.students[1]).pk, self.entries[0].pk)
+
+        waitlist.leave(self.entries[1])
+        entry = WaitlistEntry.objects.select_related('event').get(pk=self.entries[3].pk)
+        self.assertEqual(entry.place_in_line, 3)
+
+    def test_cancellation_promotes_first_in_line(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.holder.delete()
+        ticket = Ticket.objects.get(event=self.event)
+        self.assertEqual(ticket.user, self.students[1])
+        entry = WaitlistEntry.objects.select_related('event').get(pk=self.entries[1].pk)
+        self.assertEqual(entry.place_in_line, 1)
+
+    def test_capacity_raise_promotes_in_one_batch(self):
+        self.event.refresh_from_db()
+        self.event.available_tickets = 4
+        with self.captureOnCommitCallbacks(execute=True):
+            self.event.save()
+        self.assertEqual(Ticket.objects.filter(event=self.event).count(), 4)
+        self.assertEqual(WaitlistEntry.objects.filter(status='promoted').count(), 3)
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.seats_remaining, 0)
+        self.assertEqual(WaitlistEntry.objects.select_related('event').get(pk=self.entries[3].pk).place_in_line, 1)
+
+    def test_freed_seat_is_held_for_the_waitlist(self):
+        # Promotion has not run yet: the seat is back but belongs to the front of the line
+        with self.captureOnCommitCallbacks(execute=False):
+            self.holder.delete()
+        self.assertEqual(booking.book(self.event, self.students[5]).status, booking.SOLD_OUT)
+        self.assertIsNotNone(waitlist.join(self.event, self.students[5]))
+        waitlist.promote(self.event.id)
+        self.assertEqual(Ticket.objects.get(event=self.event).user, self.students[1])
+
+    def test_join_needs_a_sold_out_event(self):
+        event = make_event(self.department, self.admin, available_tickets=2)
+        self.assertIsNone(waitlist.join(event, self.students[1]))
+        event.refresh_from_db()
+        self.assertEqual((event.waitlist_tail, WaitlistEntry.objects.filter(event=event).count()), (0, 0))
+
+    def test_leave_uses_current_position(self):
+        stale = WaitlistEntry.objects.select_related('event').get(pk=self.entries[2].pk)
+        waitlist.leave(self.entries[0])
+        waitlist.leave(stale)
+        entry = WaitlistEntry.objects.select_related('event').get(pk=self.entries[3].pk)
+        self.assertEqual((entry.position, entry.place_in_line), (2, 2))
+
+    def test_waitlist_views(self):
+        self.client.force_login(self.students[5])
+        response = self.client.post(reverse('book_ticket', args=[self.event.id]))
+        self.assertRedirects(response, reverse('event_details', args=[self.event.id]), fetch_redirect_response=False)
+        self.client.post(reverse('join_waitlist', args=[self.event.id]))
+        response = self.client.get(reverse('event_details', args=[self.event.id]))
+        self.assertContains(response, "You're #5 on the waitlist")
+
+
+@override_settings(
+    MEDIA_ROOT=TEST_MEDIA_ROOT,
+    ADMISSION_STATE_PATH=os.path.join(TEST_MEDIA_ROOT, 'admission.sqlite3'),
+    ADMISSION_RATE=0.01,
+    ADMISSION_BURST=0,
+)
+class AdmissionControlTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.department = Department.objects.create(name='Test Faculty', code='TST')
+        cls.admin = CustomUser.objects.create_user('organizer', password='x', role='admin')
+        cls.students = make_students(2, cls.department)
+
+    def setUp(self):
+        self.event = make_event(self.department, self.admin)
+        admission.reset(self.event.id)
+        self.url = reverse('book_ticket', args=[self.event.id])
+
+    def test_slots_follow_rate_after_burst(self):
+        with self.settings(ADMISSION_RATE=2, ADMISSION_BURST=1):
+            slots = [admission.reserve(self.event.id, now=1000).slot for _ in range(4)]
+        self.assertEqual(slots, [1000, 1000, 1000.5, 1001])
+
+    def test_per_event_rate(self):
+        admission.set_rate(self.event.id, 4)
+        self.assertEqual(admission.reserve(self.event.id, now=1000).rate, 4)
+        admission.set_rate(self.event.id)
+        self.assertEqual(admission.reserve(self.event.id, now=1000).rate, 0.01)
+
+    def test_waiting_room_is_served_without_queries(self):
+        self.client.force_login(self.students[0])
+        self.assertEqual(self.client.post(self.url).status_code, 302)
+
+        waiting = self.client_class()
+        waiting.force_login(self.students[1])
+        response = waiting.post(self.url, {'idempotency_key': 'k'})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '100')
+        self.assertContains(response, 'name="idempotency_key" value="k"', status_code=503)
+
+        # Coming back early keeps the place in line and never reaches the database
+        with self.assertNumQueries(0):
+            response = waiting.post(self.url)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(Ticket.objects.filter(event=self.event).count(), 1)
+
+        with mock.patch('mainapp.admission.time.time', return_value=time.time() + 101):
+            response = waiting.post(self.url)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Ticket.objects.filter(event=self.event).count(), 2)
+
+    def test_only_authenticated_posts_are_queued(self):
+        # Fresh clients never send a queue cookie back
+        for _ in range(3):
+            self.assertEqual(self.client_class().get(self.url).status_code, 302)
+            self.assertEqual(self.client_class().post(self.url).status_code, 302)
+        self.client.force_login(self.students[0])
+        self.assertEqual(self.client.post(reverse('book_ticket', args=[self.event.id + 1000])).status_code, 404)
+        # The first real booking still gets the burst slot
+        self.assertEqual(self.client.post(self.url).status_code, 302)
+        self.assertEqual(Ticket.objects.filter(event=self.event).count(), 1)
+
+    def test_get_neither_books_nor_takes_a_slot(self):
+        self.client.force_login(self.students[0])
+        response = self.client.get(self.url)
+        self.assertRedirects(response, reverse('event_details', args=[self.event.id]), fetch_redirect_response=False)
+        self.assertFalse(Ticket.objects.filter(event=self.event).exists())
+        self.assertNotIn(admission.cookie_name(self.event.id), response.cookies)
+        # The burst slot is still there for the real booking
+        self.assertEqual(self.client.post(self.url).status_code, 302)
+        self.assertEqual(Ticket.objects.filter(event=self.event).count(), 1)
+
+    def test_forged_token_is_requeued(self):
+        self.client.force_login(self.students[0])
+        self.client.cookies[admission.cookie_name(self.event.id)] = 'forged'
+        self.assertEqual(self.client.post(self.url).status_code, 302)
+
+
+class CheckInTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.department = Department.objects.create(name='Test Faculty', code='TST')
+        cls.admin = CustomUser.objects.create_user('organizer', password='x', role='admin')
+        cls.students = make_students(2, cls.department)
+        cls.event = make_event(cls.department, cls.admin)
+        cls.other_event = make_event(cls.department, cls.admin, title='Physics Symposium')
+        cls.ticket = booking.book(cls.event, cls.students[0]).ticket
+
+    def setUp(self):
+        checkin.seen_tickets.clear()
+
+    def test_ticket_is_admitted_once(self):
+        code = ticket_codes.code_for_ticket(self.ticket)
+        first = checkin.check_in(code, staff=self.admin)
+        self.assertEqual(first.status, checkin.ADMITTED)
+        self.assertEqual(first.attendee['username'], self.students[0].username)
+
+        with self.assertNumQueries(0):
+            second = checkin.check_in(code)
+        self.assertEqual(second.status, checkin.ALREADY_USED)
+        self.assertEqual(second.checked_in_at, first.checked_in_at)
+
+    def test_other_process_sees_used_ticket(self):
+        code = ticket_codes.code_for_ticket(self.ticket)
+        checkin.check_in(code)
+        checkin.seen_tickets.clear()
+        self.assertEqual(checkin.check_in(code).status, checkin.ALREADY_USED)
+
+    def test_seen_tickets_are_bounded(self):
+        code = ticket_codes.code_for_ticket(self.ticket)
+        checkin.check_in(code)
+        with mock.patch.object(checkin, 'SEEN_EVENTS', 2):
+            for event_id in range(10_000, 10_005):
+                checkin.seen_tickets.get(event_id, 1)
+            self.assertEqual(len(checkin.seen_tickets), 2)
+        # Evicted, then warmed again from the database
+        self.assertEqual(checkin.check_in(code).status, checkin.ALREADY_USED)
+        later = time.monotonic() + checkin.SEEN_IDLE_SECONDS + 1
+        with mock.patch('mainapp.checkin.time.monotonic', return_value=later):
+            checkin.seen_tickets.get(self.other_event.id, 1)
+        self.assertEqual(len(checkin.seen_tickets), 1)
+
+    def test_rejected_scans(self):
+        self.assertEqual(checkin.check_in('garbage').status, checkin.INVALID)
+        code = ticket_codes.code_for_ticket(self.ticket)
+        self.assertEqual(checkin.check_in(code, gate_event_id=self.other_event.id).status, checkin.WRONG_EVENT)
+        missing = ticket_codes.encode(self.ticket.pk + 1000, self.event.pk)
+        self.assertEqual(checkin.check_in(missing).status, checkin.UNKNOWN)
+
+    def test_checkin_endpoint(self):
+        url = reverse('api_checkin')
+        code = ticket_codes.code_for_ticket(self.ticket)
+        self.client.force_login(self.students[1])
+        self.assertEqual(self.client.post(url, {'code': code}).status_code, 403)
+
+        self.client.force_login(self.admin)
+        response = self.client.post(url, {'code': code, 'event_id': self.event.id},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], checkin.ADMITTED)
+        self.ticket.refresh_from_db()
+        self.assertEqual(self.ticket.checked_in_by, self.admin)
+
+        response = self.client.post(url, {'code': code})
+        self.assertEqual(response.status_code, 409)
+
+        for body in ([], 'x', 1):
+            response = self.client.post(url, body, content_type='application/json')
+            self.assertEqual(response.status_code, 400)
+
+
+class GateSnapshotTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.department = Department.objects.create(name='Test Faculty', code='TST')
+        cls.admin = CustomUser.objects.create_user('organizer', password='x', role='admin')
+        cls.students = make_students(4, cls.department)
+        cls.event = make_event(cls.department, cls.admin)
+        cls.tickets = [booking.book(cls.event, s).ticket for s in cls.students]
+
+    def setUp(self):
+        checkin.seen_tickets.clear()
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+
+    def export(self):
+        path = os.path.join(self.tmpdir, 'event.gate')
+        with open(path, 'wb') as f:
+            checkin.export_gate_snapshot(self.event, f)
+        return path
+
+    def test_snapshot_holds_unused_tickets_only(self):
+        used = ticket_codes.code_for_ticket(self.tickets[0])
+        checkin.check_in(used)
+        with gate_snapshot.GateSnapshot(self.export()) as snapshot:
+            self.assertEqual(snapshot.event_id, self.event.pk)
+            self.assertEqual(len(snapshot), 3)
+            self.assertNotIn(used, snapshot)
+            for ticket in self.tickets[1:]:
+                self.assertIn(ticket_codes.code_for_ticket(ticket), snapshot)
+            self.assertNotIn(ticket_codes.encode(10 ** 6, self.event.pk), snapshot)
+
+    def test_offline_scans_reconcile(self):
+        log = os.path.join(self.tmpdir, 'gate-a.csv')
+        gate = gate_snapshot.OfflineGate(self.export(), log, gate='A')
+        codes = [ticket_codes.code_for_ticket(t) for t in self.tickets]
+        self.assertEqual(gate.scan(codes[0]), gate.ADMITTED)
+        self.assertEqual(gate.scan(codes[0]), gate.ALREADY_USED)
+        self.assertEqual(gate.scan(codes[1].lower()), gate.ADMITTED)
+        self.assertEqual(gate.scan('BOGUS'), gate.INVALID)
+        gate.close()
+
+        checkin.check_in(codes[1])
+        call_command('reconcile_offline_scans', log, stdout=StringIO())
+        checked_in = set(Ticket.objects.filter(checked_in_at__isnull=False).values_list('pk', flat=True))
+        self.assertEqual(checked_in, {self.tickets[0].pk, self.tickets[1].pk})
+
+    def test_snapshot_endpoint(self):
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('gate_snapshot', args=[self.event.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.content), gate_snapshot.HEADER.size + 4 * gate_snapshot.DIGEST_SIZE)
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT)
+class ConcurrencyTests(TransactionTestCase):
+    attempts = 300
+    capacity = 120
+
+    def test_parallel_bookings_never_oversell(self):
+        department = Department.objects.create(name='Test Faculty', code='TST')
+        admin = CustomUser.objects.create_user('organizer', password='x', role='admin')
+        students = make_students(self.attempts, department)
+        event = make_event(department, admin, available_tickets=self.capacity)
+
+        barrier = threading.Barrier(self.attempts)
+        outcomes = []
+        lock = threading.Lock()
+
+        def attempt(student):
+            barrier.wait()
+            try:
+                result = booking.book(event, student)
+                with lock:
+                    outcomes.append(result.status)
+            finally:
+                close_old_connections()
+
+        threads = [threading.Thread(target=attempt, args=(s,)) for s in students]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        event.refresh_from_db()
+        self.assertEqual(len(outcomes), self.attempts)
+        self.assertEqual(outcomes.count(booking.BOOKED), self.capacity)
+        self.assertEqual(outcomes.count(booking.SOLD_OUT), self.attempts - self.capacity)
+        self.assertEqual(Ticket.objects.filter(event=event).count(), self.capacity)
+        self.assertEqual(event.seats_remaining, 0)
+
+    def test_parallel_gate_scans_admit_once(self):
+        department = Department.objects.create(name='Test Faculty', code='TST')
+        admin = CustomUser.objects.create_user('organizer', password='x', role='admin')
+        student = make_students(1, department)[0]
+        event = make_event(department, admin)
+        code = ticket_codes.code_for_ticket(booking.book(event, student).ticket)
+
+        gates = 20
+        barrier = threading.Barrier(gates)
+        outcomes = []
+        lock = threading.Lock()
+
+        def scan():
+            barrier.wait()
+            try:
+                result = checkin.check_in(code)
+                with lock:
+                    outcomes.append(result.status)
+            finally:
+                close_old_connections()
+
+        checkin.seen_tickets.clear()
+        threads = [threading.Thread(target=scan) for _ in range(gates)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(outcomes.count(checkin.ADMITTED), 1)
+        self.assertEqual(outcomes.count(checkin.ALREADY_USED), gates - 1)
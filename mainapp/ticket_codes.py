@@ -0,0 +1,113 @@
+"""
+Compact, signed ticket codes.
+
+A ticket code is the content of a ticket's QR image::
+
+    base32( version | varint(ticket_id) | varint(event_id) | HMAC-SHA256[:8] )
+
+Base32 output only uses characters from the QR alphanumeric set, so a code
+fits in a version 1-2 symbol instead of the version 8+ symbols the old JSON
+payload needed. Verifying the HMAC is pure computation, so gates can reject
+forged codes without a database lookup.
+"""
+import base64
+import hashlib
+import hmac
+from functools import lru_cache
+
+from django.conf import settings
+
+VERSION = 1
+TAG_BYTES = 8
+
+
+class InvalidTicketCode(ValueError):
+    pass
+
+
+class TicketCode:
+    __slots__ = ('ticket_id', 'event_id')
+
+    def __init__(self, ticket_id, event_id):
+        self.ticket_id = ticket_id
+        self.event_id = event_id
+
+    def __repr__(self):
+        return f"<TicketCode ticket={self.ticket_id} event={self.event_id}>"
+
+    def __eq__(self, other):
+        return isinstance(other, TicketCode) and (self.ticket_id, self.event_id) == (other.ticket_id, other.event_id)
+
+    def __hash__(self):
+        return hash((self.ticket_id, self.event_id))
+
+
+@lru_cache(maxsize=None)
+def _key(secret):
+    return hashlib.sha256(b'mainapp.ticket_codes:' + secret.encode()).digest()
+
+
+def _tag(body):
+    return hmac.new(_key(settings.SECRET_KEY), body, hashlib.sha256).digest()[:TAG_BYTES]
+
+
+def _write_varint(value, out):
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return
+
+
+def _read_varint(data, pos):
+    value = shift = 0
+    while pos < len(data):
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, pos
+        shift += 7
+        if shift > 63:
+            break
+    raise InvalidTicketCode("Truncated ticket code")
+
+
+def encode(ticket_id, event_id):
+    """Return the signed code for ``ticket_id`` at ``event_id``."""
+    body = bytearray([VERSION])
+    _write_varint(ticket_id, body)
+    _write_varint(event_id, body)
+    body += _tag(bytes(body))
+    return base64.b32encode(bytes(body)).decode('ascii').rstrip('=')
+
+
+def code_for_ticket(ticket):
+    return encode(ticket.pk, ticket.event_id)
+
+
+def decode(code):
+    """
+    Verify ``code`` and return its TicketCode. Raises InvalidTicketCode for
+    anything malformed or not signed with this installation's SECRET_KEY.
+    """
+    code = code.strip().upper()
+    try:
+        raw = base64.b32decode(code + '=' * (-len(code) % 8))
+    except (ValueError, TypeError):
+        raise InvalidTicketCode("Ticket code is not valid base32")
+    if len(raw) <= TAG_BYTES or raw[0] != VERSION:
+        raise InvalidTicketCode("Unknown ticket code format")
+
+    body, tag = raw[:-TAG_BYTES], raw[-TAG_BYTES:]
+    if not hmac.compare_digest(tag, _tag(body)):
+        raise InvalidTicketCode("Ticket code signature mismatch")
+
+    ticket_id, pos = _read_varint(body, 1)
+    event_id, pos = _read_varint(body, pos)
+    if pos != len(body):
+        raise InvalidTicketCode("Trailing data in ticket code")
+    return TicketCode(ticket_id, event_id)
@@ -0,0 +1,180 @@
+"""
+Memory-bounded processing of uploaded images.
+
+Event images and profile pictures go through ``BoundedImageField``, which,
+before Django's ``ImageField`` decodes anything:
+
+* rejects files over ``IMAGE_UPLOAD_MAX_BYTES``;
+* reads only the image header and rejects more than ``IMAGE_UPLOAD_MAX_PIXELS``
+  pixels, so a decompression bomb (a small file that expands to gigabytes of
+  pixels) is refused without being decoded.
+
+An image larger than ``IMAGE_UPLOAD_MAX_EDGE`` on either side is then shrunk
+before it is stored: JPEGs are decoded straight at 1/2, 1/4 or 1/8 scale
+(``draft``), other formats are cut down by an integer factor (``reduce``)
+before the final resampling, and the result is written to a temporary file
+that storage moves into place. Uploads themselves are streamed to temporary
+files (``FILE_UPLOAD_HANDLERS``), never held in memory.
+
+Each processed upload records its peak pixel memory: the bytes of the pixel
+buffers Pillow held at once (0 for images stored as uploaded, which are
+never decoded here). That is what scales with image size and what can
+exhaust a container; it is logged per downscaled upload and aggregated in
+the cache. ``counters()`` (served at ``api/uploads/stats/``) reports uploads,
+rejections, downscales and the largest and mean peak.
+"""
+import logging
+import os
+
+from django import forms
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.template.defaultfilters import filesizeformat
+from PIL import ExifTags, Image, ImageOps
+
+from . import cache_counters
+
+logger = logging.getLogger(__name__)
+
+# Formats stored as uploaded when shrunk; anything else is stored as PNG
+KEEP_FORMATS = {'JPEG': '.jpg', 'PNG': '.png', 'WEBP': '.webp'}
+
+COUNTER_KEYS = {
+    name: f'uploads:{name}'
+    for name in ('processed', 'rejected', 'downscaled', 'peak_total', 'peak_max')
+}
+
+
+def pixel_bytes(image):
+    """Size of ``image``'s pixel buffer; Pillow keeps multi-band and 32-bit pixels in 4 bytes."""
+    return image.width * image.height * (1 if image.mode in ('1', 'L', 'P') else 4)
+
+
+def _incr(name, n=1):
+    cache_counters.incr(COUNTER_KEYS[name], n)
+
+
+def record(peak, downscaled):
+    _incr('processed')
+    _incr('peak_total', peak)
+    if downscaled:
+        _incr('downscaled')
+    if peak > (cache.get(COUNTER_KEYS['peak_max']) or 0):
+        cache.set(COUNTER_KEYS['peak_max'], peak, timeout=None)
+
+
+def counters():
+    values = cache.get_many(COUNTER_KEYS.values())
+    stats = {name: values.get(key, 0) for name, key in COUNTER_KEYS.items()}
+    peak_total = stats.pop('peak_total')
+    stats['peak_mean'] = peak_total // stats['processed'] if stats['processed'] else None
+    return stats
+
+
+def reset_counters():
+    cache.delete_many(list(COUNTER_KEYS.values()))
+
+
+def header_size(upload):
+    """
+    ``(width, height)`` from the image header, without decoding pixel data;
+    None if unreadable. Raises ``DecompressionBombError`` past Pillow's own
+    (larger) pixel limit.
+    """
+    upload.seek(0)
+    try:
+        with Image.open(upload) as image:
+            return image.size
+    except (OSError, SyntaxError, ValueError):
+        return None
+    finally:
+        upload.seek(0)
+
+
+def downscale(upload, max_edge):
+    """
+    ``upload`` shrunk to fit ``max_edge`` x ``max_edge``, in a temporary file,
+    and the peak pixel memory it took.
+
+    Each step holds its input and output buffers at once; an input is closed
+    as soon as the next step has its output.
+    """
+    upload.seek(0)
+    image = Image.open(upload)
+    try:
+        source_format = image.format
+        # No-op for formats other than JPEG
+        image.draft('RGB', (max_edge, max_edge))
+        image.load()
+        peak = live = pixel_bytes(image)
+        # Integer reduction down to twice the target, then LANCZOS for the rest
+        factor = max(image.size) // (max_edge * 2)
+        if factor >= 2:
+            reduced = image.reduce(factor)
+            peak = max(peak, live + pixel_bytes(reduced))
+            image.close()
+            image, live = reduced, pixel_bytes(reduced)
+        if image.getexif().get(ExifTags.Base.Orientation, 1) != 1:
+            oriented = ImageOps.exif_transpose(image)
+            peak = max(peak, live + pixel_bytes(oriented))
+            image.close()
+            image = oriented
+        image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+        peak = max(peak, live + pixel_bytes(image))
+
+        target_format = source_format if source_format in KEEP_FORMATS else 'PNG'
+        if target_format == 'JPEG' and image.mode not in ('L', 'RGB', 'CMYK'):
+            image = image.convert('RGB')
+        name = os.path.splitext(os.path.basename(upload.name))[0] + KEEP_FORMATS[target_format]
+        shrunk = TemporaryUploadedFile(name, Image.MIME[target_format], 0, None)
+        image.save(shrunk.file, format=target_format, quality=settings.IMAGE_UPLOAD_QUALITY)
+    finally:
+        image.close()
+    shrunk.size = shrunk.file.tell()
+    shrunk.file.seek(0)
+    return shrunk, peak
+
+
+class BoundedImageField(forms.ImageField):
+    """``ImageField`` that refuses oversized images from their header and shrinks large ones."""
+
+    default_error_messages = {
+        'file_too_large': 'Images must be at most %(limit)s; this one is %(size)s.',
+        'too_many_pixels': 'Images must be at most %(limit)s megapixels.',
+    }
+
+    def _reject(self, code, **params):
+        _incr('rejected')
+        raise forms.ValidationError(self.error_messages[code], code=code, params=params)
+
+    def to_python(self, data):
+        if data in self.empty_values:
+            return None
+        if data.size > settings.IMAGE_UPLOAD_MAX_BYTES:
+            self._reject(
+                'file_too_large',
+                limit=filesizeformat(settings.IMAGE_UPLOAD_MAX_BYTES),
+                size=filesizeformat(data.size),
+            )
+        try:
+            size = header_size(data)
+        except Image.DecompressionBombError:
+            self._reject('too_many_pixels', limit=settings.IMAGE_UPLOAD_MAX_PIXELS // 1_000_000)
+        if size and size[0] * size[1] > settings.IMAGE_UPLOAD_MAX_PIXELS:
+            self._reject('too_many_pixels', limit=settings.IMAGE_UPLOAD_MAX_PIXELS // 1_000_000)
+        # Unreadable headers fail here with Django's own invalid_image error
+        checked = super().to_python(data)
+        if max(size) <= settings.IMAGE_UPLOAD_MAX_EDGE:
+            # Stored as uploaded, nothing decoded
+            record(0, downscaled=False)
+            return checked
+        shrunk, peak = downscale(checked, settings.IMAGE_UPLOAD_MAX_EDGE)
+        record(peak, downscaled=True)
+        logger.info(
+            "Downscaled image upload %s (%dx%d, %s) to %s; peak pixel memory %s",
+            data.name, size[0], size[1], filesizeformat(data.size),
+            filesizeformat(shrunk.size), filesizeformat(peak),
+        )
+        shrunk.image = checked.image
+        return shrunk
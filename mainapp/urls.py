@@ -1,6 +1,6 @@
 from django.urls import path
 from django.shortcuts import redirect
-from . import views
+from . import api, views
 
 def home_redirect(request):
     return redirect('dashboard')
@@ -22,9 +22,17 @@ urlpatterns = [
     path('dashboard/', views.dashboard_view, name='dashboard'),
     path('ticket/<int:ticket_id>/qr/', views.qr_view, name='qr_view'),
     path('ticket/<int:ticket_id>/download/', views.qr_download, name='qr_download'),
+    path('qr/<str:token>.png', views.qr_image, name='qr_image'),
+    path('images/<slug:digest>/<slug:variant>.<slug:fmt>', views.image_variant, name='image_variant'),
     path('event/<int:event_id>/', views.event_details, name='event_details'),
     path('event/<int:event_id>/book/', views.book_ticket, name='book_ticket'),
+    path('event/<int:event_id>/waitlist/join/', views.join_waitlist, name='join_waitlist'),
+    path('event/<int:event_id>/waitlist/leave/', views.leave_waitlist, name='leave_waitlist'),
+    path('ticket/<int:ticket_id>/cancel/', views.cancel_ticket, name='cancel_ticket'),
     path('event/<int:event_id>/admin/', views.admin_event_details, name='admin_event_details'),
+    path('event/<int:event_id>/admin/attendees.csv', views.export_attendees, name='export_attendees'),
+    path('event/<int:event_id>/gate-snapshot/', views.gate_snapshot, name='gate_snapshot'),
+    path('event/<int:event_id>/bulk-issue/', views.bulk_issue_tickets, name='bulk_issue_tickets'),
     path('event/<int:event_id>/memories/', views.event_memories, name='event_memories'),
     path('department/<int:department_id>/', views.department_details, name='department_details'),
     path('department/create/', views.create_department, name='create_department'),
@@ -34,4 +42,13 @@ urlpatterns = [
     path('admin/settings/', views.admin_settings, name='admin_settings'),
     path('admin/logs/', views.admin_logs, name='admin_logs'),
     path('admin/backup/', views.admin_backup, name='admin_backup'),
+    # JSON API
+    path('api/checkin/', api.checkin_scan, name='api_checkin'),
+    path('api/users/autocomplete/', api.user_autocomplete, name='api_user_autocomplete'),
+    path('api/cache/fragments/', api.fragment_cache_stats, name='api_fragment_cache_stats'),
+    path('api/uploads/stats/', api.upload_stats, name='api_upload_stats'),
+    path('api/analytics/departments/', api.department_analytics, name='api_department_analytics'),
+    path('api/v1/events/', api.event_list, name='api_v1_events'),
+    path('api/v1/users/', api.user_list, name='api_v1_users'),
+    path('api/v1/tickets/', api.ticket_list, name='api_v1_tickets'),
 ]
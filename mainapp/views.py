@@ -2,16 +2,32 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import HttpResponseForbidden, JsonResponse
+from django.http import HttpResponseBadRequest, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
 from django.template.loader import render_to_string
 from django.utils import timezone
+from django.views.decorators.http import etag
 from django.conf import settings
+from django.core.files.storage import default_storage
 from django.db import models, transaction
 import os
 import json
-
+import uuid
+from io import BytesIO
+
+from . import (
+    analytics, booking, conditional, exports, forecasts, images, qr, recommendations, sales, search, stats, waitlist,
+)
+from .checkin import export_gate_snapshot
+from .pagination import InvalidCursor, page_size, paginate
 from .forms import CustomUserRegisterForm, CustomLoginForm
-from .models import CustomUser, Event, Ticket, Department, SystemLog, SystemBackup
+from .models import CustomUser, Event, Ticket, Department, SystemLog, SystemBackup, WaitlistEntry, ROLE_CHOICES
+
+# Keyset orderings for the paginated dashboard listings (see mainapp.pagination)
+EVENT_LIST_ORDERING = ('-date', '-id')
+EVENT_SEARCH_ORDERING = ('-rank', 'id')
+USER_LIST_ORDERING = ('id',)
+USER_SEARCH_ORDERING = ('-rank', 'id')
+LOG_LIST_ORDERING = ('-timestamp', '-id')
 
 def register_view(request):
     from .models import Department
@@ -63,6 +79,7 @@ def dashboard_view(request):
         return redirect('superadmin_dashboard')
 
 @login_required
+@etag(conditional.student_dashboard_etag)
 def student_dashboard(request):
     if request.user.role != 'student':
         return redirect('dashboard')
@@ -71,32 +88,73 @@ def student_dashboard(request):
     from django.utils import timezone
     from .models import Event, Ticket
     
-    events = Event.objects.filter(date__gte=timezone.now().date())
-    past_events = Event.objects.filter(date__lt=timezone.now().date())
-    attended_events = Ticket.objects.filter(user=request.user)
+    events = Event.objects.filter(date__gte=timezone.now().date()).select_related('department')
+    past_events = Event.objects.filter(date__lt=timezone.now().date()).select_related('department')
+    attended_events = Ticket.objects.filter(user=request.user).select_related('event__department')
+    recommended = recommendations.for_student(request.user, settings.RECOMMENDATIONS_SHOWN)
     
     return render(request, 'dashboard/student_dashboard.html', {
+        'recommended': recommended,
         'events': events,
         'past_events': past_events,
         'attended_events': attended_events
     })
 
 from django.shortcuts import render, get_object_or_404
-from django.http import FileResponse, HttpResponseForbidden
+from django.http import FileResponse, HttpResponse, HttpResponseForbidden, Http404
+from .ticket_codes import InvalidTicketCode
+from django.urls import reverse
+from django.utils.cache import patch_cache_control
 from .models import Ticket
 
 def qr_view(request, ticket_id):
     ticket = get_object_or_404(Ticket, id=ticket_id)
     if ticket.user != request.user:
         return HttpResponseForbidden("You are not allowed to view this QR code.")
-    return render(request, 'mainapp/show_qr.html', {'ticket': ticket})
+    if ticket.stateless_qr:
+        qr_url = reverse('qr_image', args=[qr.ticket_token(ticket)])
+    else:
+        # Render on demand if the qr_worker hasn't reached this ticket yet
+        qr.ensure_ticket_qr(ticket)
+        qr_url = ticket.qr_code.url
+    return render(request, 'mainapp/show_qr.html', {'ticket': ticket, 'qr_url': qr_url})
 
 def qr_download(request, ticket_id):
     ticket = get_object_or_404(Ticket, id=ticket_id)
     if ticket.user != request.user:
         return HttpResponseForbidden("You are not allowed to download this QR code.")
+    if ticket.stateless_qr:
+        return redirect(reverse('qr_image', args=[qr.ticket_token(ticket)]) + '?download=1')
+    qr.ensure_ticket_qr(ticket)
     return FileResponse(ticket.qr_code, as_attachment=True, filename=ticket.qr_code.name.split('/')[-1])
 
+def _qr_image_etag(request, token):
+    return qr.token_etag(token)
+
+@etag(_qr_image_etag)
+def qr_image(request, token):
+    # The signed token is the capability: no session or database lookup needed
+    try:
+        ticket_id, event_id = qr.unsign_token(token)
+    except InvalidTicketCode:
+        raise Http404("Unknown ticket.")
+    response = HttpResponse(qr.render_token_png(token), content_type='image/png')
+    patch_cache_control(response, public=True, max_age=365 * 24 * 60 * 60, immutable=True)
+    if request.GET.get('download'):
+        response['Content-Disposition'] = f'attachment; filename="ticket_{event_id}_{ticket_id}.png"'
+    return response
+
+def image_variant(request, digest, variant, fmt):
+    # Content-addressed: the URL always means the same bytes
+    if variant not in images.VARIANTS or fmt not in images.FORMATS:
+        raise Http404("Unknown image variant.")
+    name = images.ensure_variant(digest, variant, fmt)
+    if name is None:
+        raise Http404("Unknown image.")
+    response = FileResponse(default_storage.open(name, 'rb'), content_type=images.FORMATS[fmt][1])
+    patch_cache_control(response, public=True, max_age=365 * 24 * 60 * 60, immutable=True)
+    return response
+
 from django.shortcuts import render
 from .models import Event, CustomUser
 from django.utils import timezone
@@ -106,26 +164,36 @@ def superadmin_dashboard(request):
     if request.user.role != 'superadmin':
         return redirect('dashboard')
     
-    departments = Department.objects.all()
+    departments = list(Department.objects.all())
     users = CustomUser.objects.all()
     events = Event.objects.all()
     
-    # Calculate statistics
-    total_bookings = Ticket.objects.count()
+    # Precomputed statistics (see mainapp.stats) and the cached per-department
+    # rollup (see mainapp.analytics)
+    counters = stats.snapshot()
+    rollup = analytics.snapshot()
+    department_analytics = {row['id']: row for row in rollup['departments']}
+    for department in departments:
+        department.users_count = counters.get('department', department.id, 'users')
+        department.analytics = department_analytics.get(department.id)
     
     # Filter users by role
     role_filter = request.GET.get('role')
+    total_users = counters.total_users
     if role_filter:
         users = users.filter(role=role_filter)
+        total_users = counters.get('role', role_filter, 'users')
     
     context = {
         'departments': departments,
         'users': users,
         'events': events,
-        'total_departments': departments.count(),
-        'total_users': users.count(),
-        'total_events': events.count(),
-        'total_bookings': total_bookings,
+        'total_departments': len(departments),
+        'total_users': total_users,
+        'total_events': counters.total_events,
+        'total_bookings': counters.total_bookings,
+        'analytics_computed_at': rollup['computed_at'],
+        'sales': sales.stored_overview(),
     }
     
     return render(request, 'dashboard/superadmin_dashboard.html', context)
@@ -148,40 +216,46 @@ def admin_dashboard(request):
     if category_filter:
         events = events.filter(category=category_filter)
         
-    # Calculate statistics
-    total_events = Event.objects.count()
-    total_bookings = Ticket.objects.count()
-    upcoming_events = Event.objects.filter(date__gte=timezone.now()).count()
+    # Precomputed statistics (see mainapp.stats)
+    counters = stats.snapshot()
 
     return render(request, 'dashboard/admin_dashboard.html', {
-        'total_events': total_events,
-        'total_bookings': total_bookings,
-        'upcoming_events': upcoming_events,
-        'events': events,
-        'users': users,
+        'total_events': counters.total_events,
+        'total_bookings': counters.total_bookings,
+        'upcoming_events': counters.upcoming_events,
+        'forecasts': forecasts.upcoming(settings.FORECASTS_SHOWN),
+        'events': paginate(events, EVENT_LIST_ORDERING),
+        'users': paginate(users, USER_LIST_ORDERING),
     })
 
 @login_required
+@etag(conditional.event_listing_etag)
 def filter_events(request):
     if request.user.role not in ['admin', 'superadmin']:
         return HttpResponseForbidden()
     
     category = request.GET.get('category')
-    search = request.GET.get('search', '').strip()
+    query = request.GET.get('search', '').strip()
     events = Event.objects.all()
     
+    ordering = EVENT_LIST_ORDERING
+    
     if category:
         events = events.filter(category=category)
-    if search:
-        events = events.filter(
-            title__icontains=search
-        )
+    if query:
+        events = search.search_events(events, query)
+        ordering = EVENT_SEARCH_ORDERING
+    
+    try:
+        page = paginate(events, ordering, request.GET.get('cursor'), page_size(request))
+    except InvalidCursor:
+        return HttpResponseBadRequest('Invalid cursor.')
     
     html = render_to_string('dashboard/partials/event_list.html', {
-        'events': events
-    })
+        'events': page
+    }, request=request)
     
-    return JsonResponse({'html': html})
+    return JsonResponse({'html': html, 'next_cursor': page.next_cursor})
 
 @login_required
 def filter_users(request):
@@ -189,50 +263,55 @@ def filter_users(request):
         return HttpResponseForbidden()
     
     role = request.GET.get('role')
-    search = request.GET.get('search', '').strip()
+    query = request.GET.get('search', '').strip()
     users = CustomUser.objects.all()
+    ordering = USER_LIST_ORDERING
     
     if role:
         users = users.filter(role=role)
-    if search:
-        users = users.filter(
-            username__icontains=search
-        )
+    if query:
+        users = search.search_users(users, query)
+        ordering = USER_SEARCH_ORDERING
+    
+    try:
+        page = paginate(users, ordering, request.GET.get('cursor'), page_size(request))
+    except InvalidCursor:
+        return HttpResponseBadRequest('Invalid cursor.')
     
     html = render_to_string('dashboard/partials/user_list.html', {
-        'users': users
+        'users': page
     })
     
-    return JsonResponse({'html': html})
+    return JsonResponse({'html': html, 'next_cursor': page.next_cursor})
 
+@etag(conditional.event_details_etag)
 def event_details(request, event_id):
     event = get_object_or_404(Event, id=event_id)
     user_has_ticket = False
     user_ticket = None
+    waitlist_entry = None
     
     if request.user.is_authenticated:
         user_ticket = Ticket.objects.filter(event=event, user=request.user).first()
         user_has_ticket = user_ticket is not None
+        if not user_has_ticket and event.waitlist_tail > event.waitlist_served:
+            waitlist_entry = WaitlistEntry.objects.filter(event=event, user=request.user, status='waiting').first()
     
     context = {
         'event': event,
         'user_has_ticket': user_has_ticket,
-        'user_ticket': user_ticket
+        'user_ticket': user_ticket,
+        'waitlist_entry': waitlist_entry,
+        # Resubmitting this form replays the first booking attempt
+        'booking_key': uuid.uuid4().hex,
     }
     return render(request, 'mainapp/event_detail.html', context)
 
 @login_required
 def book_ticket(request, event_id):
     event = get_object_or_404(Event, id=event_id)
-    
-    # Check if user already has a ticket
-    if Ticket.objects.filter(event=event, user=request.user).exists():
-        messages.error(request, 'You already have a ticket for this event!')
-        return redirect('event_details', event_id=event_id)
-    
-    # Check if tickets are available
-    if event.tickets_left() <= 0:
-        messages.error(request, 'Sorry, this event is sold out!')
+    # Only the booking form books; a GET would bypass the waiting room and CSRF
+    if request.method != 'POST':
         return redirect('event_details', event_id=event_id)
     
     # Handle payment if event is not free
@@ -241,14 +320,63 @@ def book_ticket(request, event_id):
         # For now, we'll just create the ticket
         pass
     
-    # Create ticket
-    ticket = Ticket.objects.create(
-        event=event,
-        user=request.user
-    )
+    key = request.POST.get('idempotency_key', '')[:64] or None
+    result = booking.book(event, request.user, idempotency_key=key)
+    
+    if result.status == booking.DUPLICATE:
+        messages.error(request, 'You already have a ticket for this event!')
+        if result.ticket is not None:
+            return redirect('qr_view', ticket_id=result.ticket.id)
+        return redirect('event_details', event_id=event_id)
+    
+    if result.status == booking.SOLD_OUT:
+        # Also when seats have freed up but are held for the waitlist
+        messages.error(request, 'Sorry, this event is sold out! You can join the waitlist instead.')
+        return redirect('event_details', event_id=event_id)
     
+    if result.ticket is None:
+        return redirect('event_details', event_id=event_id)
     messages.success(request, 'Ticket booked successfully!')
-    return redirect('qr_view', ticket_id=ticket.id)
+    return redirect('qr_view', ticket_id=result.ticket.id)
+
+@login_required
+def cancel_ticket(request, ticket_id):
+    ticket = get_object_or_404(Ticket, id=ticket_id)
+    if ticket.user != request.user:
+        return HttpResponseForbidden("You are not allowed to cancel this ticket.")
+    if request.method != 'POST':
+        return redirect('event_details', event_id=ticket.event_id)
+    if ticket.event.date < timezone.now():
+        messages.error(request, "Tickets for past events can't be cancelled.")
+        return redirect('event_details', event_id=ticket.event_id)
+    
+    # Releasing the seat promotes the waitlist in the background (see signals)
+    ticket.delete()
+    messages.success(request, 'Your ticket has been cancelled.')
+    return redirect('event_details', event_id=ticket.event_id)
+
+@login_required
+def join_waitlist(request, event_id):
+    event = get_object_or_404(Event, id=event_id)
+    if request.method != 'POST':
+        return redirect('event_details', event_id=event_id)
+    
+    entry = waitlist.join(event, request.user)
+    if entry is None and Ticket.objects.filter(event=event, user=request.user).exists():
+        messages.error(request, 'You already have a ticket for this event!')
+    elif entry is None:
+        messages.error(request, 'Tickets are still available, book one directly.')
+    else:
+        messages.success(request, f"You're on the waitlist at position {entry.place_in_line}.")
+    return redirect('event_details', event_id=event_id)
+
+@login_required
+def leave_waitlist(request, event_id):
+    if request.method == 'POST':
+        entry = WaitlistEntry.objects.filter(event_id=event_id, user=request.user, status='waiting').first()
+        if entry is not None and waitlist.leave(entry):
+            messages.success(request, 'You have left the waitlist.')
+    return redirect('event_details', event_id=event_id)
 
 @login_required
 def admin_event_details(request, event_id):
@@ -256,13 +384,80 @@ def admin_event_details(request, event_id):
         return HttpResponseForbidden("You don't have permission to view this page.")
         
     event = get_object_or_404(Event, id=event_id)
-    tickets = Ticket.objects.filter(event=event)
+    tickets = Ticket.objects.filter(event=event).select_related('user')
     
     return render(request, 'mainapp/admin_event_details.html', {
         'event': event,
-        'tickets': tickets
+        'tickets': tickets,
+        'sales': sales.cached_event_sales(event),
+        'departments': Department.objects.all(),
+        'roles': ROLE_CHOICES,
     })
 
+@login_required
+def export_attendees(request, event_id):
+    if request.user.role not in ['admin', 'superadmin']:
+        return HttpResponseForbidden("You don't have permission to view this page.")
+    
+    event = get_object_or_404(Event, id=event_id)
+    response = StreamingHttpResponse(exports.attendee_csv(event), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{exports.attendee_filename(event)}"'
+    return response
+
+@login_required
+def bulk_issue_tickets(request, event_id):
+    if request.user.role not in ['admin', 'superadmin']:
+        return HttpResponseForbidden("You don't have permission to view this page.")
+    if request.method != 'POST':
+        return redirect('admin_event_details', event_id=event_id)
+    
+    event = get_object_or_404(Event, id=event_id)
+    department = None
+    if request.POST.get('department'):
+        department = get_object_or_404(Department, id=request.POST.get('department'))
+    role = request.POST.get('role') or None
+    enrollment_nos = None
+    if request.FILES.get('csv_file'):
+        csv_text = request.FILES['csv_file'].read().decode('utf-8-sig', errors='replace')
+        enrollment_nos = booking.read_enrollment_numbers(csv_text.splitlines())
+    
+    if department is None and role is None and enrollment_nos is None:
+        messages.error(request, 'Choose a department, a role or upload a CSV of enrollment numbers.')
+        return redirect('admin_event_details', event_id=event_id)
+    
+    users = booking.select_recipients(department, role, enrollment_nos)
+    # QR images are rendered by the qr_worker (or on request in stateless mode)
+    result = booking.issue_bulk(event, users)
+    
+    SystemLog.objects.create(
+        level='INFO',
+        log_type='EVENT',
+        event='Bulk Tickets Issued',
+        user=request.user,
+        details=f'{result.issued} tickets issued for {event.title} in {result.elapsed:.2f}s'
+    )
+    promoted = f'Promoted {result.promoted} from the waitlist first. ' if result.promoted else ''
+    messages.success(
+        request,
+        f'{promoted}Issued {result.issued} tickets ({result.per_second:,.0f}/s). '
+        f'Skipped {result.skipped_existing} existing holders and {result.skipped_sold_out} over capacity.'
+    )
+    return redirect('admin_event_details', event_id=event_id)
+
+@login_required
+def gate_snapshot(request, event_id):
+    if request.user.role not in ['admin', 'superadmin']:
+        return HttpResponseForbidden("You don't have permission to view this page.")
+    
+    event = get_object_or_404(Event, id=event_id)
+    buffer = BytesIO()
+    export_gate_snapshot(event, buffer)
+    
+    response = HttpResponse(buffer.getvalue(), content_type='application/octet-stream')
+    response['Content-Disposition'] = f'attachment; filename="event_{event.id}.gate"'
+    response['Cache-Control'] = 'no-store'
+    return response
+
 @login_required
 def event_memories(request, event_id):
     event = get_object_or_404(Event, id=event_id)
@@ -284,7 +479,8 @@ def department_details(request, department_id):
     
     return render(request, 'mainapp/department_details.html', {
         'department': department,
-        'users': users
+        'users': users,
+        'analytics': analytics.department_rollup([department.id])[0],
     })
 
 @login_required
@@ -395,13 +591,22 @@ def admin_logs(request):
             models.Q(user__username__icontains=search_query)
         )
     
+    try:
+        page = paginate(logs.select_related('user'), LOG_LIST_ORDERING, request.GET.get('cursor'), page_size(request))
+    except InvalidCursor:
+        return HttpResponseBadRequest('Invalid cursor.')
+    
     # Handle AJAX request for filtered results
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-        html = render_to_string('dashboard/partials/log_entries.html', {'logs': logs})
-        return JsonResponse({'html': html})
+        html = render_to_string('dashboard/partials/log_entries.html', {
+            'logs': page,
+            'first_page': not request.GET.get('cursor'),
+        })
+        return JsonResponse({'html': html, 'next_cursor': page.next_cursor})
     
     return render(request, 'dashboard/admin_logs.html', {
-        'logs': logs,
+        'logs': page,
+        'first_page': True,
         'log_levels': SystemLog.LOG_LEVELS,
         'log_types': SystemLog.LOG_TYPES
     })
@@ -494,6 +699,8 @@ def admin_backup(request):
                         Event.objects.create(**event)
                     for ticket in data['tickets']:
                         Ticket.objects.create(**ticket)
+                    booking.recount_seats()
+                    stats.rebuild()
                 
                 SystemLog.objects.create(
                     level='INFO',
@@ -605,5 +812,11 @@ def suggest_event(request):
     })
 
 def admin_user_details(request, user_id):
-    user = get_object_or_404(CustomUser, id=user_id)
+    user = get_object_or_404(
+        CustomUser.objects.select_related('department').prefetch_related(
+            models.Prefetch('ticket_set', queryset=Ticket.objects.select_related('event')),
+            'created_events',
+        ),
+        id=user_id,
+    )
     return render(request, 'dashboard/admin_user_details.html', {'user': user})
@@ -0,0 +1,149 @@
+"""
+FIFO waitlist for sold-out events.
+
+Every entry gets the next sequence number from ``Event.waitlist_tail``. Waiting
+entries always form the contiguous range ``(waitlist_served, waitlist_tail]``:
+promotion serves them strictly from the front and leaving renumbers the
+entries behind. A student's place in line is therefore
+``position - waitlist_served``, with no counting query.
+
+Promotion runs whenever seats come back (a ticket is deleted or capacity is
+raised). It moves as many entries as there are free seats in batches, each
+batch being one transaction with a single ``bulk_create``. It is scheduled
+after the triggering transaction commits and runs on a background thread, so
+the request that freed the seats does not wait for it.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, models, transaction
+from django.utils import timezone
+
+from .booking import create_tickets
+from .models import Event, Ticket, WaitlistEntry
+
+logger = logging.getLogger(__name__)
+
+PROMOTION_BATCH_SIZE = 500
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='waitlist')
+
+
+def join(event, user):
+    """
+    Put ``user`` at the back of ``event``'s waitlist; returns the entry, or
+    None if they hold a ticket or the event can still be booked directly.
+    """
+    if Ticket.objects.filter(event=event, user=user).exists():
+        return None
+    entry = WaitlistEntry.objects.filter(event=event, user=user).select_related('event').first()
+    if entry is not None and entry.status == 'waiting':
+        return entry
+
+    with transaction.atomic():
+        Event.objects.filter(pk=event.pk).update(waitlist_tail=models.F('waitlist_tail') + 1)
+        tail, served, seats_remaining = Event.objects.values_list(
+            'waitlist_tail', 'waitlist_served', 'seats_remaining',
+        ).get(pk=event.pk)
+        if seats_remaining > 0 and tail - 1 <= served:
+            # Not sold out and nobody ahead: book_ticket would take this student
+            transaction.set_rollback(True)
+            return None
+        entry, created = WaitlistEntry.objects.get_or_create(
+            event=event, user=user, defaults={'position': tail}
+        )
+        if not created:
+            entry.status = 'waiting'
+            entry.position = tail
+            entry.promoted_at = None
+            entry.ticket = None
+            entry.save()
+    entry.event.refresh_from_db(fields=['waitlist_tail', 'waitlist_served'])
+    return entry
+
+
+def leave(entry):
+    """Take ``entry`` off the waitlist and move everyone behind it up by one."""
+    with transaction.atomic():
+        # Decrementing the tail first takes the event row lock, which
+        # serializes us against joins and promotions.
+        Event.objects.filter(pk=entry.event_id).update(waitlist_tail=models.F('waitlist_tail') - 1)
+        # Re-read under the lock: the in-memory position may be stale
+        position = WaitlistEntry.objects.filter(pk=entry.pk, status='waiting').values_list(
+            'position', flat=True,
+        ).first()
+        if position is None:
+            Event.objects.filter(pk=entry.event_id).update(waitlist_tail=models.F('waitlist_tail') + 1)
+            return False
+        WaitlistEntry.objects.filter(pk=entry.pk).update(status='left')
+        WaitlistEntry.objects.filter(
+            event_id=entry.event_id, status='waiting', position__gt=position
+        ).update(position=models.F('position') - 1)
+    entry.status = 'left'
+    return True
+
+
+def promote(event_id, batch_size=PROMOTION_BATCH_SIZE):
+    """Turn waiting entries into tickets while ``event_id`` has free seats; returns the number promoted."""
+    promoted = 0
+    while True:
+        with transaction.atomic():
+            event = Event.objects.select_for_update().filter(pk=event_id).first()
+            if event is None or event.seats_remaining <= 0:
+                break
+            entries = list(
+                WaitlistEntry.objects.filter(event_id=event_id, status='waiting')
+                .order_by('position')[:min(event.seats_remaining, batch_size)]
+            )
+            if not entries:
+                break
+
+            holders = set(
+                Ticket.objects.filter(event_id=event_id, user_id__in=[e.user_id for e in entries])
+                .values_list('user_id', flat=True)
+            )
+            fresh = [e for e in entries if e.user_id not in holders]
+            claimed = Event.objects.filter(pk=event_id, seats_remaining__gte=len(fresh)).update(
+                seats_remaining=models.F('seats_remaining') - len(fresh),
+                waitlist_served=entries[-1].position,
+            )
+            if not claimed:
+                continue
+
+            tickets = {t.user_id: t for t in create_tickets(event, [e.user_id for e in fresh])}
+            now = timezone.now()
+            for entry in entries:
+                entry.status = 'promoted'
+                entry.promoted_at = now
+                entry.ticket = tickets.get(entry.user_id)
+            WaitlistEntry.objects.bulk_update(entries, ['status', 'promoted_at', 'ticket'])
+            promoted += len(fresh)
+    return promoted
+
+
+def _promote_in_background(event_id):
+    try:
+        promoted = promote(event_id)
+        if promoted:
+            logger.info("Promoted %d waitlisted students for event %s", promoted, event_id)
+    except Exception:
+        logger.exception("Waitlist promotion failed for event %s", event_id)
+    finally:
+        close_old_connections()
+
+
+def schedule_promotion(event_id):
+    """Promote ``event_id``'s waitlist once the current transaction commits."""
+    if getattr(settings, 'WAITLIST_PROMOTE_IN_BACKGROUND', True):
+        transaction.on_commit(lambda: _executor.submit(_promote_in_background, event_id))
+    else:
+        transaction.on_commit(lambda: promote(event_id))
+
+
+def promote_all(batch_size=PROMOTION_BATCH_SIZE):
+    """Sweep every event that has free seats and people waiting."""
+    event_ids = Event.objects.filter(
+        seats_remaining__gt=0, waitlist_tail__gt=models.F('waitlist_served')
+    ).values_list('pk', flat=True)
+    return sum(promote(event_id, batch_size) for event_id in list(event_ids))
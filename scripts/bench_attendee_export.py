@@ -0,0 +1,91 @@
+"""
+Measure the streaming attendee export: time to first byte, total time and
+peak Python memory while streaming, compared with building the whole CSV
+from model instances in memory.
+
+Creates the attendees inside a transaction that is rolled back at the end.
+
+Usage: python scripts/bench_attendee_export.py [attendees]
+"""
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'UniShowTime.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.contrib.auth.hashers import make_password  # noqa: E402
+from django.db import transaction  # noqa: E402
+from django.utils import timezone  # noqa: E402
+
+from mainapp import exports  # noqa: E402
+from mainapp.models import CustomUser, Department, Event, Ticket  # noqa: E402
+
+
+def streamed(event):
+    tracemalloc.start()
+    start = time.perf_counter()
+    chunks = exports.attendee_csv(event)
+    size = len(next(chunks))
+    first = time.perf_counter() - start
+    for chunk in chunks:
+        size += len(chunk)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"  streamed   first chunk {first * 1000:7.2f} ms  total {elapsed:6.2f}s  "
+          f"peak {peak / 2**20:6.1f} MiB  {size / 2**20:.1f} MiB of CSV")
+
+
+def in_memory(event):
+    tracemalloc.start()
+    start = time.perf_counter()
+    lines = [','.join(exports.HEADER)]
+    for ticket in Ticket.objects.filter(event=event).select_related('user__department'):
+        user = ticket.user
+        lines.append(','.join(str(v) for v in (
+            user.enrollment_no, user.username, user.first_name, user.last_name, user.email,
+            user.department.name if user.department else '', ticket.booked_at, ticket.checked_in_at or '',
+        )))
+    body = '\n'.join(lines)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"  in memory  first chunk {elapsed * 1000:7.2f} ms  total {elapsed:6.2f}s  "
+          f"peak {peak / 2**20:6.1f} MiB  {len(body) / 2**20:.1f} MiB of CSV")
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+
+    with transaction.atomic():
+        department = Department.objects.create(name='Bench Faculty', code='BENCHX')
+        admin = CustomUser.objects.create_user('bench-export-admin', password='x', role='admin')
+        event = Event.objects.create(
+            title='Bench concert', description='Export benchmark', date=timezone.now(),
+            location='Main Auditorium', available_tickets=total, department=department, created_by=admin,
+        )
+        password = make_password(None)
+        users = CustomUser.objects.bulk_create([
+            CustomUser(
+                username=f'bench-export-{i}', email=f'bench-export-{i}@uni.edu', enrollment_no=f'BX{i:07d}',
+                first_name='Bench', last_name=f'Attendee {i}', password=password, department=department,
+            )
+            for i in range(total)
+        ], batch_size=5000)
+        Ticket.objects.bulk_create([Ticket(event=event, user=user, qr_status='ready') for user in users],
+                                   batch_size=5000)
+        print(f"{total} attendees")
+        streamed(event)
+        in_memory(event)
+
+        transaction.set_rollback(True)
+
+
+if __name__ == "__main__":
+    main()
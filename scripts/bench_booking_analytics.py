@@ -0,0 +1,147 @@
+"""
+Measure the booking analytics (mainapp.sales) against the same figures
+computed row by row in Python: the all-events overview (category demand and
+heatmap) and one event's sell-through curve. Also times the scheduled
+refresh that stores the overview and the dashboard's read of it.
+
+Creates the events, students and tickets inside a transaction that is rolled
+back at the end. Tickets are every student booking every event, each at a
+random time in the week after the event opened.
+
+Usage: python scripts/bench_booking_analytics.py [tickets]
+"""
+import math
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import timedelta
+from statistics import median
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'UniShowTime.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.contrib.auth.hashers import make_password  # noqa: E402
+from django.db import transaction  # noqa: E402
+from django.utils import timezone  # noqa: E402
+
+from mainapp import sales  # noqa: E402
+from mainapp.models import CustomUser, Department, Event, Ticket  # noqa: E402
+
+EVENTS = 500
+
+
+@contextmanager
+def explicit_booked_at():
+    # bulk_create would otherwise stamp every ticket with the current time
+    field = Ticket._meta.get_field('booked_at')
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+def row_by_row_overview():
+    events = {
+        event_id: (category, capacity)
+        for event_id, category, capacity in Event.objects.values_list('id', 'category', 'available_tickets')
+    }
+    times = defaultdict(list)
+    heatmap = defaultdict(int)
+    for event_id, booked_at in Ticket.objects.values_list('event_id', 'booked_at').iterator(chunk_size=2000):
+        times[event_id].append(booked_at)
+        local = timezone.localtime(booked_at)
+        heatmap[local.weekday(), local.hour] += 1
+    categories = defaultdict(lambda: {'capacity': 0, 'sold': 0, 'hours_to_half': []})
+    for event_id, (category, capacity) in events.items():
+        booked = sorted(times.get(event_id, []))
+        row = categories[category]
+        row['capacity'] += capacity
+        row['sold'] += len(booked)
+        half = math.ceil(capacity / 2)
+        if capacity and len(booked) >= half:
+            row['hours_to_half'].append((booked[half - 1] - booked[0]).total_seconds() / 3600)
+    return {
+        category: (row['sold'] / row['capacity'], median(row['hours_to_half']) if row['hours_to_half'] else None)
+        for category, row in categories.items()
+    }, heatmap
+
+
+def measure(label, function, rounds=1):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        function()
+    print(f"  {label:<28} {(time.perf_counter() - start) / rounds:8.3f} s")
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000_000
+    students = max(total // EVENTS, 1)
+    rng = random.Random(7)
+
+    with transaction.atomic():
+        department = Department.objects.create(name='Bench Faculty', code='BENCHS')
+        admin = CustomUser.objects.create_user('bench-sales-admin', password='x', role='admin')
+        opened = timezone.now() - timedelta(days=90)
+        categories = [code for code, _ in Event.CATEGORY_CHOICES]
+        events = Event.objects.bulk_create([
+            Event(
+                title=f'Bench event {i}', description='Sales benchmark', date=opened + timedelta(days=30),
+                location='Main Auditorium', available_tickets=rng.choice([students, students * 2]),
+                department=department, created_by=admin, category=categories[i % len(categories)],
+            )
+            for i in range(EVENTS)
+        ])
+        password = make_password(None)
+        users = CustomUser.objects.bulk_create([
+            CustomUser(
+                username=f'bench-sales-{i}', email=f'bench-sales-{i}@uni.edu', enrollment_no=f'BS{i:07d}',
+                password=password, department=department,
+            )
+            for i in range(students)
+        ], batch_size=5000)
+
+        start = time.perf_counter()
+        with explicit_booked_at():
+            tickets = (
+                Ticket(
+                    event=event, user=user, qr_status='ready',
+                    booked_at=opened + timedelta(hours=rng.expovariate(1 / 24) % (7 * 24)),
+                )
+                for event in events for user in users
+            )
+            while True:
+                batch = [ticket for _, ticket in zip(range(20000), tickets)]
+                if not batch:
+                    break
+                Ticket.objects.bulk_create(batch)
+        print(f"{EVENTS * students} tickets for {EVENTS} events ({time.perf_counter() - start:.0f} s to create)")
+
+        # One overview split where sales.overview() splits it: repeated fetches vary too much to subtract
+        start = time.perf_counter()
+        event_ids, seconds = sales.all_bookings()
+        fetched = time.perf_counter()
+        sales.category_demand(event_ids, seconds)
+        sales.heatmap_rows(sales.heatmap(seconds))
+        computed = time.perf_counter()
+        print(f"  {'overview, NumPy':<28} {computed - start:8.3f} s")
+        print(f"  {'  of which fetching':<28} {fetched - start:8.3f} s")
+        print(f"  {'  of which computing':<28} {computed - fetched:8.3f} s")
+        measure('overview, NumPy (again)', sales.overview)
+        measure('overview, row by row', row_by_row_overview)
+        measure('refresh_sales_overview', sales.refresh_overview)
+        measure('dashboard read (stored)', sales.stored_overview, rounds=20)
+        measure('one event sell-through', lambda: sales.event_sales(events[0]), rounds=5)
+
+        transaction.set_rollback(True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Compare event search via the full-text index with the old title__icontains scan.
+
+Creates the events inside a transaction that is rolled back at the end, so it
+can be pointed at any database (the configured one by default).
+
+Usage: python scripts/bench_event_search.py [events]
+"""
+import os
+import random
+import sys
+import time
+from datetime import timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'UniShowTime.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.db import transaction  # noqa: E402
+from django.utils import timezone  # noqa: E402
+
+from mainapp import search  # noqa: E402
+from mainapp.models import CustomUser, Department, Event  # noqa: E402
+
+WORDS = (
+    'annual spring autumn music festival seminar workshop hackathon robotics debate poetry drama '
+    'photography startup pitch quiz football cricket chess coding cloud security design film '
+    'dance theatre innovation research symposium career fair alumni meetup webinar lecture'
+).split()
+LOCATIONS = ['Main Auditorium', 'Seminar Hall 2', 'Open Air Theatre', 'Library Lawn', 'Sports Complex']
+QUERIES = ['robotics', 'music festival', 'hack', 'auditorium', 'career fair alumni', 'qqqqqqqqqqq']
+
+
+def vocabulary(rng, size=20000):
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    filler = {''.join(rng.choice(letters) for _ in range(rng.randint(4, 10))) for _ in range(size)}
+    return WORDS + sorted(filler)
+
+
+def sentence(rng, words, length):
+    # Skewed so that the real words are common and most filler is rare
+    return ' '.join(words[int(len(words) * rng.random() ** 2)] for _ in range(length))
+
+
+def timed(label, run, rounds=20):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        count = run()
+    elapsed = (time.perf_counter() - start) / rounds
+    print(f"  {label:<10} {elapsed * 1000:8.2f} ms  {count:>6} rows")
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    rng = random.Random(42)
+    words = vocabulary(rng)
+
+    with transaction.atomic():
+        department = Department.objects.create(name='Benchmark Faculty', code='BENCH')
+        creator = CustomUser.objects.create_user('bench-search', role='admin')
+        now = timezone.now()
+        Event.objects.bulk_create([
+            Event(
+                title=sentence(rng, words, 4).title(),
+                description=sentence(rng, words, 40),
+                location=rng.choice(LOCATIONS),
+                date=now + timedelta(hours=i),
+                department=department,
+                created_by=creator,
+            )
+            for i in range(total)
+        ], batch_size=5000)
+        start = time.perf_counter()
+        search.rebuild()
+        print(f"indexed {Event.objects.count()} events in {time.perf_counter() - start:.2f}s")
+
+        for query in QUERIES:
+            print(f"'{query}'")
+            timed('icontains', lambda: len(Event.objects.filter(title__icontains=query).order_by('-date', '-id')[:50]))
+            timed('fts', lambda: len(search.search_events(Event.objects.all(), query).order_by('-rank', 'id')[:50]))
+
+        transaction.set_rollback(True)
+
+
+if __name__ == "__main__":
+    main()
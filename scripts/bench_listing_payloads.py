@@ -0,0 +1,92 @@
+"""
+Compare the HTML-in-JSON dashboard listings (filter_events, filter_users) with
+the api/v1 JSON listings: bytes per page (raw and gzipped) and latency.
+
+Creates the events and users inside a transaction that is rolled back at the
+end, and drives the views in-process with Django's test client.
+
+Usage: python scripts/bench_listing_payloads.py [rows]
+"""
+import gzip
+import os
+import sys
+import time
+from datetime import timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'UniShowTime.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.contrib.auth.hashers import make_password  # noqa: E402
+from django.db import transaction  # noqa: E402
+from django.test import Client, override_settings  # noqa: E402
+from django.urls import reverse  # noqa: E402
+from django.utils import timezone  # noqa: E402
+
+from mainapp.models import CustomUser, Department, Event  # noqa: E402
+
+CASES = [
+    ('events html', 'filter_events', {}),
+    ('events v1', 'api_v1_events', {}),
+    ('events v1 id,title', 'api_v1_events', {'fields': 'id,title'}),
+    ('users html', 'filter_users', {}),
+    ('users v1', 'api_v1_users', {}),
+    ('users v1 id,username', 'api_v1_users', {'fields': 'id,username'}),
+]
+
+
+def measure(client, label, url, params, rounds=50):
+    body = client.get(url, params).content
+    start = time.perf_counter()
+    for _ in range(rounds):
+        client.get(url, params)
+    elapsed = (time.perf_counter() - start) / rounds
+    print(f"  {label:<22} {len(body):>8} B  {len(gzip.compress(body)):>7} B gz  {elapsed * 1000:7.2f} ms")
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+    with transaction.atomic(), override_settings(ALLOWED_HOSTS=['testserver']):
+        department = Department.objects.create(name='Bench Faculty', code='BENCHL')
+        admin = CustomUser.objects.create_user('bench-listing-admin', password='x', role='admin')
+        now = timezone.now()
+        Event.objects.bulk_create([
+            Event(
+                title=f'Bench event {i}',
+                description='A benchmark event with a description long enough to be truncated on the card. ' * 3,
+                date=now + timedelta(hours=i),
+                location='Main Auditorium',
+                available_tickets=100,
+                seats_remaining=100,
+                department=department,
+                created_by=admin,
+                category='seminar',
+            )
+            for i in range(total)
+        ], batch_size=1000)
+        CustomUser.objects.bulk_create([
+            CustomUser(
+                username=f'bench-listing-{i}',
+                email=f'bench-listing-{i}@uni.edu',
+                enrollment_no=f'BL{i:06d}',
+                password=make_password(None),
+                department=department,
+            )
+            for i in range(total)
+        ], batch_size=1000)
+
+        client = Client()
+        client.force_login(admin)
+        print(f"{total} events, {total} users; one page of each listing")
+        for label, name, params in CASES:
+            measure(client, label, reverse(name), params)
+
+        transaction.set_rollback(True)
+
+
+if __name__ == "__main__":
+    main()
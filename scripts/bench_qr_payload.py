@@ -0,0 +1,73 @@
+"""
+Compare the legacy JSON ticket QR payload with the compact signed ticket code.
+
+Usage: python scripts/bench_qr_payload.py [iterations]
+"""
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from io import BytesIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'UniShowTime.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+import qrcode  # noqa: E402
+
+from mainapp import qr, ticket_codes  # noqa: E402
+
+
+def legacy_payload(ticket_id):
+    return json.dumps({
+        "username": f"student{ticket_id}",
+        "enrollment_no": f"ST{ticket_id:06d}",
+        "event": "Annual Cultural Night and Inter-Faculty Music Festival 2025",
+        "date": str(datetime(2025, 11, 14, 18, 30)),
+        "booked_at": datetime(2025, 10, 1, 9, 15, 42).strftime("%Y-%m-%d %H:%M:%S"),
+    })
+
+
+def legacy_render(data):
+    canvas = BytesIO()
+    qrcode.make(data).save(canvas, format='PNG')
+    return canvas.getvalue()
+
+
+def symbol_version(data):
+    code = qrcode.QRCode(version=None, error_correction=qrcode.constants.ERROR_CORRECT_M)
+    code.add_data(data)
+    code.make(fit=True)
+    return code.version
+
+
+def bench(label, payloads, render):
+    start = time.perf_counter()
+    sizes = [len(render(p)) for p in payloads]
+    elapsed = time.perf_counter() - start
+    print(f"{label:<8} payload {len(payloads[0]):>4} chars  version {symbol_version(payloads[0]):>2}  "
+          f"{elapsed / len(payloads) * 1000:7.2f} ms/image  {sum(sizes) / len(sizes):8.0f} bytes/image")
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    ids = range(100000, 100000 + iterations)
+
+    bench('json', [legacy_payload(i) for i in ids], legacy_render)
+    codes = [ticket_codes.encode(i, 4242) for i in ids]
+    bench('compact', codes, qr.render_png)
+
+    rounds = 100000
+    start = time.perf_counter()
+    for i in range(rounds):
+        ticket_codes.decode(codes[i % len(codes)])
+    elapsed = time.perf_counter() - start
+    print(f"verify   {elapsed / rounds * 1e6:.2f} us/code (no database access)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Time the admin user type-ahead (search.search_users) against an icontains scan.
+
+Creates the users inside a transaction that is rolled back at the end.
+
+Usage: python scripts/bench_user_lookup.py [users]
+"""
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'UniShowTime.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.db import transaction  # noqa: E402
+from django.db.models import Q  # noqa: E402
+
+from mainapp import search  # noqa: E402
+from mainapp.models import CustomUser  # noqa: E402
+
+FIRST_NAMES = ['Aarav', 'Priya', 'Rohan', 'Ananya', 'Vikram', 'Sneha', 'Arjun', 'Kavya', 'Rahul', 'Meera']
+LAST_NAMES = ['Sharma', 'Verma', 'Patel', 'Gupta', 'Singh', 'Iyer', 'Reddy', 'Nair', 'Joshi', 'Mehta']
+QUERIES = ['pri', 'priya sha', 'cs2021', 'cs2021004', 'rohan.g', 'xq']
+
+
+def timed(label, run, rounds=50):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        count = run()
+    elapsed = (time.perf_counter() - start) / rounds
+    print(f"  {label:<10} {elapsed * 1000:8.2f} ms  {count:>3} rows")
+
+
+def scan(query):
+    return CustomUser.objects.filter(
+        Q(username__icontains=query) | Q(email__icontains=query) | Q(enrollment_no__icontains=query) |
+        Q(first_name__icontains=query) | Q(last_name__icontains=query)
+    ).order_by('username')
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    limit = settings.USER_AUTOCOMPLETE_LIMIT
+    rng = random.Random(42)
+
+    with transaction.atomic():
+        users = []
+        for i in range(total):
+            first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            suffix = ''.join(rng.choice(string.ascii_lowercase + string.digits) for _ in range(4))
+            users.append(CustomUser(
+                username=f'{first.lower()}{suffix}{i}',
+                email=f'{first.lower()}.{last.lower()}{i}@uni.edu',
+                first_name=first,
+                last_name=last,
+                enrollment_no=f'{rng.choice(["CS", "EE", "ME"])}{rng.randint(2019, 2024)}{i:05d}',
+                password='!',
+            ))
+        CustomUser.objects.bulk_create(users, batch_size=5000)
+        start = time.perf_counter()
+        search.rebuild_users()
+        print(f"indexed {CustomUser.objects.count()} users in {time.perf_counter() - start:.2f}s")
+
+        for query in QUERIES:
+            print(f"'{query}'")
+            timed('icontains', lambda: len(scan(query)[:limit]))
+            timed('index', lambda: len(search.search_users(
+                CustomUser.objects.all(), query, candidates=settings.USER_AUTOCOMPLETE_CANDIDATES
+            ).order_by('-rank', 'username')[:limit]))
+
+        transaction.set_rollback(True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Load-test the gate check-in endpoint against a running server.
+
+Signs codes for the event's tickets locally (same SECRET_KEY as the server),
+then fires scans from several simulated gates. A share of scans are repeats
+so the already-used path is exercised too.
+
+Usage:
+    python scripts/checkin_load_test.py --event 3 --username admin1 --password Admin@123 \\
+        --url http://127.0.0.1:8000 --scans 5000 --gates 8
+"""
+import argparse
+import http.cookiejar
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'UniShowTime.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from mainapp import ticket_codes  # noqa: E402
+from mainapp.models import Ticket  # noqa: E402
+
+
+def login(base_url, username, password):
+    jar = http.cookiejar.CookieJar()
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(jar))
+    opener.open(f"{base_url}/login/").read()
+    csrftoken = next(c.value for c in jar if c.name == 'csrftoken')
+    form = urllib.parse.urlencode({
+        'username': username, 'password': password, 'csrfmiddlewaretoken': csrftoken,
+    }).encode()
+    request = urllib.request.Request(f"{base_url}/login/", data=form, headers={'Referer': f"{base_url}/login/"})
+    opener.open(request).read()
+    if not any(c.name == 'sessionid' for c in jar):
+        sys.exit("Login failed")
+    csrftoken = next(c.value for c in jar if c.name == 'csrftoken')
+    return opener, csrftoken
+
+
+def gate(opener, csrftoken, url, event_id, codes, latencies, outcomes, lock):
+    for code in codes:
+        body = json.dumps({'code': code, 'event_id': event_id}).encode()
+        request = urllib.request.Request(url, data=body, headers={
+            'Content-Type': 'application/json',
+            'X-CSRFToken': csrftoken,
+            'Referer': url,
+        })
+        start = time.perf_counter()
+        try:
+            with opener.open(request) as response:
+                status = json.load(response)['status']
+        except urllib.error.HTTPError as e:
+            try:
+                status = json.load(e)['status']
+            except (ValueError, KeyError):
+                status = f"http_{e.code}"
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            outcomes[status] += 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--event', type=int, required=True)
+    parser.add_argument('--username', required=True)
+    parser.add_argument('--password', required=True)
+    parser.add_argument('--scans', type=int, default=5000)
+    parser.add_argument('--gates', type=int, default=8)
+    parser.add_argument('--repeat-ratio', type=float, default=0.2,
+                        help='Share of scans that re-scan an already scanned ticket')
+    args = parser.parse_args()
+
+    ticket_ids = list(Ticket.objects.filter(event_id=args.event).values_list('pk', flat=True))
+    if not ticket_ids:
+        sys.exit(f"Event {args.event} has no tickets")
+    codes = [ticket_codes.encode(pk, args.event) for pk in ticket_ids]
+    scans = [random.choice(codes) if random.random() < args.repeat_ratio else codes[i % len(codes)]
+             for i in range(args.scans)]
+
+    latencies, outcomes, lock = [], Counter(), threading.Lock()
+    threads = []
+    for g in range(args.gates):
+        opener, csrftoken = login(args.url, args.username, args.password)
+        threads.append(threading.Thread(target=gate, args=(
+            opener, csrftoken, f"{args.url}/api/checkin/", args.event,
+            scans[g::args.gates], latencies, outcomes, lock,
+        )))
+
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    ms = [x * 1000 for x in latencies]
+    print(f"{len(latencies)} scans from {args.gates} gates in {elapsed:.1f}s "
+          f"({len(latencies) / elapsed * 60:,.0f} scans/min)")
+    print(f"latency ms: p50 {statistics.median(ms):.1f}  p95 {ms[int(len(ms) * 0.95) - 1]:.1f}  "
+          f"p99 {ms[int(len(ms) * 0.99) - 1]:.1f}  max {ms[-1]:.1f}")
+    for status, count in outcomes.most_common():
+        print(f"  {status:<14} {count}")
+
+
+if __name__ == "__main__":
+    main()